@@ -0,0 +1,311 @@
+"""
+Пакетная запись и перенос данных: NDJSON-выгрузка и загрузка постов,
+комментариев, подписок и сообществ с контрольными точками.
+"""
+import json
+import os
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Case, Value, When
+from django.utils.dateparse import parse_datetime
+
+from .feed_cache import bump_feed_generation
+from .follow_graph import follow_graph
+from .models import (Comment, Follow, Group, Post, StoredFile,
+                     TimelineEntry, User, UserStats)
+
+
+# порядок выгрузки: каждая запись ссылается только на уже выгруженные
+RECORD_TYPES = ("group", "post", "comment", "follow")
+
+# размер пачки для запросов вида `__in`
+LOOKUP_CHUNK_SIZE = 500
+
+
+def chunks(values, size=LOOKUP_CHUNK_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def restore_dates(model, field_name, dates):
+    """
+    Вернуть историческое значение полю с auto_now_add после bulk_create,
+    который подставил текущее время: UPDATE … CASE по id на пачку.
+    Поле модели не меняется, поэтому другие потоки не затронуты.
+    `dates` — словарь {id: дата}.
+    """
+    field = model._meta.get_field(field_name)
+    for chunk in chunks(dates.items()):
+        model.objects.filter(pk__in=[pk for pk, _ in chunk]).update(
+            **{field_name: Case(*[When(pk=pk, then=Value(date,
+                                                         output_field=field))
+                                  for pk, date in chunk],
+                                output_field=field)})
+
+
+def rebuild_derived(posts=None, users=None):
+    """
+    Пересчитать то, что при записи поддерживают сигналы и представления.
+    Без аргументов — всё. С аргументами — только для id постов `posts`
+    (счётчики комментариев, картинки, поиск) и пользователей `users`
+    (счётчики профиля, ленты их и их подписчиков).
+    """
+    from .search import get_backend
+
+    if posts is None and users is None:
+        UserStats.objects.reconcile()
+        Post.objects.reconcile_comment_counts()
+        StoredFile.objects.reconcile()
+        TimelineEntry.objects.rebuild()
+        follow_graph.invalidate()
+        get_backend().rebuild()
+        bump_feed_generation()
+        return
+
+    posts, users = set(posts or ()), set(users or ())
+    backend = get_backend()
+    for chunk in chunks(posts):
+        imported = Post.objects.filter(pk__in=chunk)
+        imported.reconcile_comment_counts()
+        StoredFile.objects.reconcile(names=imported.exclude(image="")
+                                     .exclude(image__isnull=True)
+                                     .values_list("image", flat=True))
+        for post in imported.select_related("group"):
+            backend.index(post)
+    readers = set(users)
+    for chunk in chunks(users):
+        UserStats.objects.reconcile(users=chunk)
+        readers.update(Follow.objects.filter(author__in=chunk)
+                       .values_list("user", flat=True))
+    for chunk in chunks(readers):
+        TimelineEntry.objects.rebuild(users=chunk)
+    if users:
+        follow_graph.invalidate()
+    bump_feed_generation()
+
+
+class Checkpoint:
+    """
+    Состояние долгой операции в JSON-файле. Файл заменяется атомарно,
+    поэтому после падения в нём всегда последняя завершённая пачка.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        with open(self.path) as source:
+            return json.load(source)
+
+    def save(self, state):
+        if not self.path:
+            return
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as target:
+            json.dump(state, target)
+        os.replace(temporary, self.path)
+
+    def clear(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class Throughput:
+    """ Счётчик строк по типам и скорость с момента запуска """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.rows = Counter()
+
+    def add(self, record_type, count):
+        self.rows[record_type] += count
+
+    def report(self):
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        total = sum(self.rows.values())
+        parts = [f"{record_type}: {self.rows[record_type]}"
+                 for record_type in RECORD_TYPES if self.rows[record_type]]
+        return (f"{', '.join(parts) or 'нет строк'}; всего {total} за "
+                f"{elapsed:.1f} с ({total / elapsed:.0f} строк/с)")
+
+
+EXPORT_FIELDS = {
+    "group": (Group, ("id", "title", "slug", "description")),
+    "post": (Post, ("id", "text", "pub_date", "author__username",
+                    "group__slug", "image")),
+    "comment": (Comment, ("id", "post", "author__username", "text",
+                          "created")),
+    "follow": (Follow, ("id", "user__username", "author__username")),
+}
+
+
+def export_batches(record_type, after=0, chunk_size=1000):
+    """
+    Записи одного типа пачками по возрастанию id, каждая пачка —
+    отдельный запрос по ключу: память не растёт с размером таблицы,
+    а по id последней строки выгрузку можно продолжить.
+    """
+    model, fields = EXPORT_FIELDS[record_type]
+    names = [field.split("__")[0] for field in fields]
+    rows = model.objects.order_by("pk").values_list(*fields)
+    while True:
+        batch = list(rows.filter(pk__gt=after)[:chunk_size])
+        if not batch:
+            return
+        yield [dict(zip(names, row), type=record_type) for row in batch]
+        after = batch[-1][0]
+
+
+class RecordEncoder(DjangoJSONEncoder):
+    """ Даты с микросекундами: DjangoJSONEncoder обрезает их до миллисекунд """
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def dump_record(record):
+    return json.dumps(record, cls=RecordEncoder, ensure_ascii=False)
+
+
+class ImportConflict(ValueError):
+    """ id из выгрузки занят в базе другой строкой """
+
+
+class Importer:
+    """
+    Загрузка записей пачками. id постов и комментариев сохраняются,
+    пользователи и сообщества сопоставляются по username и slug,
+    недостающие пользователи создаются без пароля. Строка с тем же id
+    и тем же содержимым пропускается, поэтому повтор уже загруженной
+    пачки безопасен. Если id занят другой строкой, загрузка
+    прерывается: иначе пост молча потерялся бы, а комментарии
+    привязались бы к чужому посту.
+    """
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.buffers = defaultdict(list)
+        self.buffered = 0
+        self.throughput = Throughput()
+        # что пересчитать после загрузки: rebuild_derived(**importer.touched)
+        self.touched = {"posts": set(), "users": set()}
+
+    def add(self, record):
+        record_type = record.get("type")
+        if record_type not in RECORD_TYPES:
+            raise ValueError(f"Неизвестный тип записи: {record_type!r}")
+        self.buffers[record_type].append(record)
+        self.buffered += 1
+        return self.buffered >= self.batch_size
+
+    def flush(self):
+        with transaction.atomic():
+            for record_type in RECORD_TYPES:
+                records = self.buffers.pop(record_type, [])
+                if records:
+                    getattr(self, f"_load_{record_type}s")(records)
+                    self.throughput.add(record_type, len(records))
+        self.buffered = 0
+
+    def _users(self, usernames):
+        """ username -> id, недостающие пользователи создаются """
+        usernames = set(usernames)
+        found = {}
+        for chunk in chunks(usernames):
+            found.update(User.objects.filter(username__in=chunk)
+                         .values_list("username", "pk"))
+        missing = usernames - set(found)
+        if missing:
+            User.objects.bulk_create(
+                [User(username=username, password="!")
+                 for username in missing], ignore_conflicts=True)
+            for chunk in chunks(missing):
+                found.update(User.objects.filter(username__in=chunk)
+                             .values_list("username", "pk"))
+        return found
+
+    def _groups(self, slugs):
+        slugs = set(slugs) - {None}
+        found = {}
+        for chunk in chunks(slugs):
+            found.update(Group.objects.filter(slug__in=chunk)
+                         .values_list("slug", "pk"))
+        return found
+
+    def _load_groups(self, records):
+        Group.objects.bulk_create(
+            [Group(title=record["title"], slug=record["slug"],
+                   description=record.get("description") or "")
+             for record in records], ignore_conflicts=True)
+
+    def _new_rows(self, model, rows, fields):
+        """
+        Строки, которых ещё нет в базе. Уже загруженные (совпадают
+        `fields`) пропускаются, чужие строки с тем же id — ошибка.
+        """
+        existing = {}
+        for chunk in chunks(row.pk for row in rows):
+            existing.update((values[0], values[1:]) for values in
+                            model.objects.filter(pk__in=chunk)
+                            .values_list("pk", *fields))
+        for row in rows:
+            if row.pk in existing and existing[row.pk] != tuple(
+                    getattr(row, field) for field in fields):
+                raise ImportConflict(
+                    f"{model.__name__} с id {row.pk} уже есть в "
+                    f"базе и отличается от загружаемого; загружать можно в "
+                    f"пустую базу или повторно ту же выгрузку")
+        return [row for row in rows if row.pk not in existing]
+
+    def _load_posts(self, records):
+        users = self._users(record["author"] for record in records)
+        groups = self._groups(record.get("group") for record in records)
+        posts = self._new_rows(
+            Post,
+            [Post(id=record["id"], text=record["text"],
+                  pub_date=parse_datetime(record["pub_date"]),
+                  author_id=users[record["author"]],
+                  group_id=groups.get(record.get("group")),
+                  image=record.get("image") or None)
+             for record in records],
+            ("author_id", "pub_date", "text"))
+        dates = {post.pk: post.pub_date for post in posts}
+        Post.objects.bulk_create(posts, ignore_conflicts=True)
+        restore_dates(Post, "pub_date", dates)
+        self.touched["posts"].update(dates)
+        self.touched["users"].update(post.author_id for post in posts)
+
+    def _load_comments(self, records):
+        users = self._users(record["author"] for record in records)
+        comments = self._new_rows(
+            Comment,
+            [Comment(id=record["id"], post_id=record["post"],
+                     author_id=users[record["author"]], text=record["text"],
+                     created=parse_datetime(record["created"]))
+             for record in records],
+            ("post_id", "author_id", "created", "text"))
+        dates = {comment.pk: comment.created for comment in comments}
+        Comment.objects.bulk_create(comments, ignore_conflicts=True)
+        restore_dates(Comment, "created", dates)
+        self.touched["posts"].update(comment.post_id for comment in comments)
+
+    def _load_follows(self, records):
+        users = self._users(name for record in records
+                            for name in (record["user"], record["author"]))
+        follows = [Follow(user_id=users[record["user"]],
+                          author_id=users[record["author"]])
+                   for record in records
+                   if record["user"] != record["author"]]
+        Follow.objects.bulk_create(follows, ignore_conflicts=True)
+        self.touched["users"].update(
+            user_id for follow in follows
+            for user_id in (follow.user_id, follow.author_id))
@@ -0,0 +1,70 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+
+CARD_KEY = "post_card:{id}:{version}:{is_author}"
+HITS_KEY = "post_card:hits"
+MISSES_KEY = "post_card:misses"
+SAVED_KEY = "post_card:saved_us"
+
+
+def _count(key, delta=1):
+    """
+    Общий счётчик в кеше: две записи на каждую карточку, поэтому
+    только при включённой POST_CARD_CACHE_STATS
+    """
+    if not settings.POST_CARD_CACHE_STATS:
+        return
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # счётчик вытеснили между add и incr
+        cache.set(key, delta, timeout=None)
+
+
+def render_card(post, user=None):
+    """
+    Карточка post_item.html из кеша фрагментов.
+    Ключ включает версию поста, поэтому правка поста, новый комментарий
+    или смена сообщества дают новый ключ, а старый просто вытесняется.
+    Ссылка «Редактировать» видна только автору, отсюда два варианта.
+    """
+    is_author = bool(user and user.is_authenticated and
+                     user.pk == post.author_id)
+    key = CARD_KEY.format(id=post.pk, version=post.version,
+                          is_author=int(is_author))
+    cached = cache.get(key)
+    if cached is not None:
+        html, render_us = cached
+        _count(HITS_KEY)
+        _count(SAVED_KEY, render_us)
+        return html
+
+    start = time.perf_counter()
+    html = render_to_string("post_item.html", {"post": post, "user": user})
+    render_us = int((time.perf_counter() - start) * 1000000)
+    cache.set(key, (html, render_us), settings.POST_CARD_CACHE_TIMEOUT)
+    _count(MISSES_KEY)
+    return html
+
+
+def card_stats():
+    """ Попадания, промахи и сэкономленное время рендеринга карточек """
+    counters = cache.get_many([HITS_KEY, MISSES_KEY, SAVED_KEY])
+    hits = counters.get(HITS_KEY, 0)
+    misses = counters.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": hits / total if total else 0.0,
+        "saved_ms": counters.get(SAVED_KEY, 0) / 1000,
+    }
+
+
+def reset_card_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY, SAVED_KEY])
@@ -0,0 +1,114 @@
+"""
+Валидаторы ETag и Last-Modified для условных GET-запросов.
+
+Каждый считается без рендеринга: по поколению лент из кеша, графу
+подписок в памяти и не больше чем одним запросом по индексу. Если валидатор совпал с тем, что прислал
+клиент, condition() отвечает 304 и представление не вызывается.
+"""
+import hashlib
+
+from django.contrib.auth.models import User
+from django.views.decorators.http import condition
+
+from .feed_cache import audience, feed_generation, feed_modified
+from .follow_graph import follow_graph
+from .models import Post
+from .suggestions import suggestions_generation
+
+
+def make_etag(request, *parts):
+    """
+    Общая часть: адрес со всеми параметрами и аудитория. Для
+    авторизованных в тег входит CSRF-cookie: в сохранённой у клиента
+    странице формы с токеном, который после нового входа не подойдёт.
+    """
+    parts = (request.get_full_path(), audience(request),
+             request.META.get("CSRF_COOKIE", "")) + parts
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def first_row(queryset):
+    """ first() без ORDER BY: строка одна, сортировка только мешает плану """
+    return next(iter(queryset.order_by()[:1]), None)
+
+
+def feed_etag(request, *args, **kwargs):
+    """ Ленты и поиск меняются только со сменой поколения """
+    return make_etag(request, feed_generation())
+
+
+def feed_last_modified(request, *args, **kwargs):
+    """
+    Только для анонимных: If-Modified-Since не различает аудиторию,
+    и после входа клиент получил бы 304 на страницу гостя
+    """
+    if request.user.is_authenticated:
+        return None
+    return feed_modified()
+
+
+def profile_etag(request, username):
+    """
+    Лента автора и его счётчики — одним запросом, кнопка подписки —
+    по графу подписок в памяти
+    """
+    row = first_row(User.objects
+                    .filter(username=username)
+                    .values_list("pk", "stats__posts_count",
+                                 "stats__followers_count",
+                                 "stats__following_count"))
+    if row is None:
+        return None
+    following = follow_graph.is_following(request.user.pk, row[0])
+    return make_etag(request, feed_generation(), row, following)
+
+
+def post_etag(request, username, post_id):
+    """
+    Версия поста растёт при правке, новом комментарии и нарезке
+    картинки; счётчики автора выводятся в боковой колонке
+    """
+    row = first_row(Post.objects
+                    .filter(pk=post_id, author__username=username)
+                    .values_list("version", "author__stats__posts_count",
+                                 "author__stats__followers_count",
+                                 "author__stats__following_count"))
+    if row is None:
+        return None
+    return make_etag(request, row)
+
+
+def follow_etag(request):
+    """
+    Лента подписок меняется с поколением и с набором авторов,
+    виджет «кого почитать» — с поколением рекомендаций
+    """
+    authors = follow_graph.following(request.user.pk)
+    return make_etag(request, feed_generation(), suggestions_generation(),
+                     hashlib.md5(authors.tobytes()).hexdigest())
+
+
+def follow_list_etag(request, username):
+    """
+    Состав списков — по графу подписок, счётчики в боковой колонке —
+    одним запросом, как в profile_etag, имена в списке — по поколению:
+    сохранение пользователя его меняет
+    """
+    row = first_row(User.objects
+                    .filter(username=username)
+                    .values_list("pk", "stats__followers_count",
+                                 "stats__following_count"))
+    if row is None:
+        return None
+    rows = (follow_graph.followers(row[0]), follow_graph.following(row[0]))
+    return make_etag(request, feed_generation(), row,
+                     [hashlib.md5(graph_row.tobytes()).hexdigest()
+                      for graph_row in rows])
+
+
+feed_condition = condition(etag_func=feed_etag,
+                           last_modified_func=feed_last_modified)
+profile_condition = condition(etag_func=profile_etag)
+post_condition = condition(etag_func=post_etag)
+follow_condition = condition(etag_func=follow_etag)
+follow_list_condition = condition(etag_func=follow_list_etag)
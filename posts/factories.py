@@ -1,22 +1,214 @@
+import random
+from datetime import timedelta
+from itertools import accumulate, islice
+
 import factory, factory.django
 from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+
+from posts.bulk import restore_dates
+from posts.models import Comment, Follow, Group, Post
+
+
+# строк в одной транзакции; внутри bulk_create делит их с учётом лимитов БД
+BULK_CHUNK_SIZE = 2000
+
+WORDS = ("котики собаки жирафы море горы город книги музыка кино спорт "
+         "кофе утро вечер дождь солнце лето зима работа отпуск друзья").split()
+
+
+def sentence(words=12):
+    return " ".join(random.choices(WORDS, k=words))
+
+
+class BulkModelFactory(factory.django.DjangoModelFactory):
+    """
+    Фабрика, которая умеет вставлять строки пачками.
+    Сигналы post_save при bulk_create не срабатывают: счётчики, ленты
+    и поисковый индекс после вставки пересчитывает
+    posts.bulk.rebuild_derived().
+    """
+
+    class Meta:
+        abstract = True
 
-from posts.models import Group
+    @classmethod
+    def create_bulk(cls, rows, chunk_size=BULK_CHUNK_SIZE):
+        """
+        Вставить объекты по потоку kwargs, держа в памяти не больше
+        одной пачки. Возвращает число вставленных строк.
+        """
+        model = cls._meta.model
+        rows = iter(rows)
+        created = 0
+        while True:
+            batch = [cls.build(**cls._by_id(kwargs))
+                     for kwargs in islice(rows, chunk_size)]
+            if not batch:
+                return created
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+            created += len(batch)
 
+    @classmethod
+    def _by_id(cls, kwargs):
+        """
+        Связь, заданная через `<поле>_id`, не должна строить объект
+        SubFactory: её значение None отбрасывает _adjust_kwargs
+        """
+        for field in cls._meta.model._meta.concrete_fields:
+            if field.is_relation and field.attname in kwargs:
+                kwargs.setdefault(field.name, None)
+        return kwargs
 
-class UserFactory(factory.django.DjangoModelFactory):
+    @classmethod
+    def _adjust_kwargs(cls, **kwargs):
+        for field in cls._meta.model._meta.concrete_fields:
+            if (field.is_relation and field.attname in kwargs
+                    and kwargs.get(field.name) is None):
+                kwargs.pop(field.name, None)
+        return kwargs
+
+
+class UserFactory(BulkModelFactory):
     class Meta:
         model = User
 
     username = factory.Sequence(lambda n: f'ivan-{n}')
     first_name = factory.Sequence(lambda n: f'ivan-{n}')
     email = factory.Sequence(lambda n: f'ivan-{n}@yandex.ru')
+    password = '!'
 
 
-class GroupFactory(factory.django.DjangoModelFactory):
+class GroupFactory(BulkModelFactory):
     class Meta:
         model = Group
 
     title = 'Test title'
     slug = factory.Sequence(lambda x: f'group_{x}')
     description = 'empty'
+
+
+class PostFactory(BulkModelFactory):
+    class Meta:
+        model = Post
+
+    text = factory.LazyFunction(sentence)
+    author = factory.SubFactory(UserFactory)
+
+
+class CommentFactory(BulkModelFactory):
+    class Meta:
+        model = Comment
+
+    text = factory.LazyFunction(lambda: sentence(6))
+    post = factory.SubFactory(PostFactory)
+    author = factory.SubFactory(UserFactory)
+
+
+class FollowFactory(BulkModelFactory):
+    class Meta:
+        model = Follow
+
+    user = factory.SubFactory(UserFactory)
+    author = factory.SubFactory(UserFactory)
+
+
+def zipf_weights(count, exponent=1.0):
+    """ Накопленные веса закона Ципфа: k-й по рангу получает 1 / k^s """
+    return list(accumulate(1 / (rank ** exponent)
+                           for rank in range(1, count + 1)))
+
+
+def new_ids(model, since):
+    """ id строк, вставленных после строки с id `since` """
+    return list(model.objects.filter(pk__gt=since).order_by("pk")
+                .values_list("pk", flat=True))
+
+
+def last_id(model):
+    latest = model.objects.order_by("-pk").values_list("pk", flat=True)
+    return latest.first() or 0
+
+
+def bulk_users(count):
+    since = last_id(User)
+    UserFactory.create_bulk({} for _ in range(count))
+    return new_ids(User, since)
+
+
+def bulk_groups(count):
+    since = last_id(Group)
+    GroupFactory.create_bulk({} for _ in range(count))
+    return new_ids(Group, since)
+
+
+def bulk_posts(count, author_ids, group_ids=(), days=365, exponent=1.0):
+    """
+    Посты с активностью авторов по Ципфу (первые в author_ids пишут
+    больше всех) и датами, равномерно разбросанными за `days` дней.
+    Часть постов без сообщества. Возвращает число постов.
+    """
+    cum_weights = zipf_weights(len(author_ids), exponent)
+    groups = list(group_ids) + [None]
+    now = timezone.now()
+    span = int(timedelta(days=days).total_seconds())
+    # id задаются заранее: по ним после bulk_create возвращаются даты,
+    # заменённые на текущее время из-за auto_now_add. Даты и их
+    # исправление — по пачке, память не растёт с `count`
+    first = last_id(Post) + 1
+    created = 0
+    for start in range(first, first + count, BULK_CHUNK_SIZE):
+        dates = {post_id: now - timedelta(seconds=random.randint(0, span))
+                 for post_id in range(start, min(start + BULK_CHUNK_SIZE,
+                                                 first + count))}
+        with transaction.atomic():
+            created += PostFactory.create_bulk(
+                {"id": post_id,
+                 "author_id": random.choices(author_ids,
+                                             cum_weights=cum_weights)[0],
+                 "group_id": random.choice(groups)}
+                for post_id in dates)
+            restore_dates(Post, "pub_date", dates)
+    statements = connection.ops.sequence_reset_sql(no_style(), [Post])
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+    return created
+
+
+def bulk_comments(count, post_ids, author_ids, exponent=1.0):
+    """ Комментарии: популярность постов и активность авторов по Ципфу """
+    post_weights = zipf_weights(len(post_ids), exponent)
+    author_weights = zipf_weights(len(author_ids), exponent)
+    return CommentFactory.create_bulk(
+        {"post_id": random.choices(post_ids, cum_weights=post_weights)[0],
+         "author_id": random.choices(author_ids,
+                                     cum_weights=author_weights)[0]}
+        for _ in range(count))
+
+
+def bulk_follows(user_ids, mean=20, exponent=1.0, shape=1.5):
+    """
+    Граф подписок со степенным распределением: число подписок читателя
+    распределено по Парето со средним около `mean`, а выбор автора — по
+    Ципфу, поэтому у немногих авторов большинство подписчиков.
+    Повторы и подписки на себя отбрасываются. Возвращает число подписок.
+    """
+    cum_weights = zipf_weights(len(user_ids), exponent)
+    # среднее распределения Парето с минимумом 1 равно shape / (shape - 1)
+    scale = mean * (shape - 1) / shape
+
+    def rows():
+        for user_id in user_ids:
+            wanted = min(int(random.paretovariate(shape) * scale),
+                         len(user_ids) - 1)
+            authors = set(random.choices(user_ids, cum_weights=cum_weights,
+                                         k=wanted))
+            authors.discard(user_id)
+            for author_id in authors:
+                yield {"user_id": user_id, "author_id": author_id}
+
+    return FollowFactory.create_bulk(rows())
@@ -0,0 +1,88 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+GENERATION_KEY = "feed:generation"
+MODIFIED_KEY = "feed:modified"
+
+
+def feed_generation():
+    """
+    Текущее поколение лент. Начальное значение — время, а не 1:
+    если ключ вытеснят, старые страницы не оживут под тем же номером.
+    """
+    return cache.get_or_set(GENERATION_KEY, int(time.time()), timeout=None)
+
+
+def feed_modified():
+    """ Время последней смены поколения, для заголовка Last-Modified """
+    timestamp = cache.get_or_set(MODIFIED_KEY, int(time.time()), timeout=None)
+    return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+def bump_feed_generation():
+    """ Новое поколение: все закешированные страницы лент устаревают """
+    cache.set(MODIFIED_KEY, int(time.time()), timeout=None)
+    try:
+        return cache.incr(GENERATION_KEY)
+    except ValueError:
+        return cache.get_or_set(GENERATION_KEY, int(time.time()),
+                                timeout=None)
+
+
+def bump_feed_generation_on_commit():
+    """
+    Сменить поколение после коммита: до него другие процессы заново
+    закешировали бы старые данные. Одна смена на транзакцию, даже если
+    каскадом удаляются сотни комментариев.
+    """
+    connection = transaction.get_connection()
+    active = set(connection.savepoint_ids)
+    # уже запланированная смена не откатится без отката этой
+    if any(func is bump_feed_generation and savepoints <= active
+           for savepoints, func in connection.run_on_commit):
+        return
+    transaction.on_commit(bump_feed_generation)
+
+
+def audience(request):
+    """
+    Анонимные страницы общие, страницы авторизованных пользователей
+    хранятся отдельно: в них имя в меню и ссылки «Редактировать».
+    """
+    if request.user.is_authenticated:
+        return f"user:{request.user.pk}"
+    return "anon"
+
+
+def feed_cache_key(request):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f"feed:{feed_generation()}:{audience(request)}:{path}"
+
+
+def cache_feed(view):
+    """
+    Кеш страниц ленты по поколению вместо cache_page с коротким сроком:
+    любое сохранение или удаление поста, сообщества и комментария меняет
+    поколение (posts/signals.py), поэтому страницы можно хранить долго и
+    изменения видны сразу.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return view(request, *args, **kwargs)
+
+        key = feed_cache_key(request)
+        response = cache.get(key)
+        if response is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.cookies:
+                cache.set(key, response, settings.FEED_CACHE_TIMEOUT)
+        return response
+    return wrapper
@@ -0,0 +1,208 @@
+"""
+Граф подписок в памяти процесса.
+
+Для каждого пользователя хранятся отсортированные массивы id авторов,
+на которых он подписан, и id его подписчиков. Проверка подписки — bisect
+по массиву, а не запрос к posts_follow.
+
+Граф загружается целиком один раз на процесс, дальше догоняет изменения
+по журналу в кеше: каждая подписка и отписка получает номер (cache.incr)
+и хранится под ним. При обращении процесс применяет записи после
+последней применённой. Если записи уже вытеснены или отставание больше
+FOLLOW_GRAPH_MAX_LAG, граф загружается заново. Заново загружает граф
+один процесс за раз (блокировка через cache.add), остальные пока
+отвечают по старому графу и пробуют при следующем обращении.
+"""
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+CLOCK_KEY = "follow:clock"
+CHANGE_KEY = "follow:change:{number}"
+RELOAD_KEY = "follow:reload"
+
+EMPTY = array("q")
+
+
+def change_key(number):
+    return CHANGE_KEY.format(number=number)
+
+
+def _contains(row, value):
+    position = bisect_left(row, value)
+    return position < len(row) and row[position] == value
+
+
+def _insert(rows, key, value):
+    row = rows.get(key)
+    if row is None:
+        rows[key] = array("q", [value])
+        return
+    position = bisect_left(row, value)
+    if position == len(row) or row[position] != value:
+        row.insert(position, value)
+
+
+def _remove(rows, key, value):
+    row = rows.get(key)
+    if row is None:
+        return
+    position = bisect_left(row, value)
+    if position < len(row) and row[position] == value:
+        del row[position]
+        if not row:
+            del rows[key]
+
+
+def current_clock():
+    """ Номер последней записи журнала; начальное значение — время """
+    return cache.get_or_set(CLOCK_KEY, int(time.time()), timeout=None)
+
+
+class FollowGraph:
+    """
+    Массивы подписок и подписчиков. Массивы, которые возвращают
+    following() и followers(), принадлежат графу и не изменяются
+    вызывающим кодом.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        """ Забыть граф: следующее обращение загрузит его заново """
+        self.following_rows = {}
+        self.follower_rows = {}
+        self.applied = None
+
+    def load(self):
+        """ Все подписки одним проходом по индексу (user, author) """
+        from .models import Follow
+
+        # номер читается до таблицы: всё, что записано в журнал раньше,
+        # уже есть в базе
+        clock = current_clock()
+        following, followers = {}, {}
+        edges = (Follow.objects
+                 .order_by("user", "author")
+                 .values_list("user", "author")
+                 .iterator(chunk_size=settings.FOLLOW_GRAPH_CHUNK_SIZE))
+        for user_id, author_id in edges:
+            row = following.get(user_id)
+            if row is None:
+                row = following[user_id] = array("q")
+            row.append(author_id)
+            row = followers.get(author_id)
+            if row is None:
+                row = followers[author_id] = array("q")
+            # строки идут по возрастанию user, массив остаётся отсортированным
+            row.append(user_id)
+        self.following_rows = following
+        self.follower_rows = followers
+        self.applied = clock
+
+    def apply(self, user_id, author_id, followed):
+        """ Применить одну запись журнала; повтор ничего не меняет """
+        if followed:
+            _insert(self.following_rows, user_id, author_id)
+            _insert(self.follower_rows, author_id, user_id)
+        else:
+            _remove(self.following_rows, user_id, author_id)
+            _remove(self.follower_rows, author_id, user_id)
+
+    def reload(self):
+        """
+        Загрузить граф заново, если сейчас этого не делает другой
+        процесс. Без графа (первое обращение) загрузка обязательна.
+        """
+        if self.applied is None:
+            self.load()
+            return
+        if not cache.add(RELOAD_KEY, True,
+                         settings.FOLLOW_GRAPH_RELOAD_TIMEOUT):
+            return
+        try:
+            self.load()
+        finally:
+            cache.delete(RELOAD_KEY)
+
+    def sync(self):
+        """ Догнать журнал: один cache.get, если изменений не было """
+        clock = cache.get(CLOCK_KEY)
+        if (self.applied is None or clock is None
+                or not self.applied <= clock
+                <= self.applied + settings.FOLLOW_GRAPH_MAX_LAG):
+            self.reload()
+            return
+        if clock == self.applied:
+            return
+        numbers = range(self.applied + 1, clock + 1)
+        changes = cache.get_many([change_key(number) for number in numbers])
+        if len(changes) != len(numbers):
+            # запись вытеснена или ещё не дописана другим процессом
+            self.reload()
+            return
+        for number in numbers:
+            self.apply(*changes[change_key(number)])
+        self.applied = clock
+
+    def record(self, user_id, author_id, followed):
+        """
+        Записать изменение в журнал после записи в базу. Свой процесс
+        применит его при следующем обращении, как и остальные.
+        """
+        self.record_many([(user_id, author_id, followed)])
+
+    def record_many(self, changes):
+        """ Несколько изменений (user_id, author_id, followed) разом """
+        if not changes:
+            return
+        try:
+            last = cache.incr(CLOCK_KEY, len(changes))
+        except ValueError:
+            # журнала нет: все процессы загрузят граф заново
+            current_clock()
+            return
+        first = last - len(changes) + 1
+        cache.set_many({change_key(number): tuple(change)
+                        for number, change in enumerate(changes, first)},
+                       settings.FOLLOW_GRAPH_LOG_TIMEOUT)
+
+    def invalidate(self):
+        """ После массовой записи в обход record(): перезагрузить везде """
+        try:
+            cache.incr(CLOCK_KEY, settings.FOLLOW_GRAPH_MAX_LAG + 1)
+        except ValueError:
+            current_clock()
+
+    def is_following(self, user_id, author_id):
+        if user_id is None:
+            return False
+        with self.lock:
+            self.sync()
+            return _contains(self.following_rows.get(user_id, EMPTY),
+                             author_id)
+
+    def following(self, user_id):
+        """ id авторов, на которых подписан пользователь, по возрастанию """
+        with self.lock:
+            self.sync()
+            return self.following_rows.get(user_id, EMPTY)
+
+    def followers(self, author_id):
+        """ id подписчиков автора по возрастанию """
+        with self.lock:
+            self.sync()
+            return self.follower_rows.get(author_id, EMPTY)
+
+    def followers_count(self, author_id):
+        return len(self.followers(author_id))
+
+
+follow_graph = FollowGraph()
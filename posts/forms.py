@@ -1,6 +1,11 @@
+from concurrent.futures import TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
 from django import forms
+from django.conf import settings
 
 from .models import Post, Group, Comment
+from .uploads import normalize_upload
 
 
 class PostForm(forms.ModelForm):
@@ -12,6 +17,46 @@ class PostForm(forms.ModelForm):
                 "text": "Текст записи",
                 "image": "Картинка"}
 
+    def __init__(self, *args, rejected=(), **kwargs):
+        # поля, файлы которых обработчик загрузки отбросил из-за размера
+        # (uploads.rejected_uploads)
+        super().__init__(*args, **kwargs)
+        self.rejected = rejected
+
+    @staticmethod
+    def too_large():
+        return forms.ValidationError(
+            f"Файл больше {settings.POST_IMAGE_MAX_BYTES / 2**20:.1f} МБ")
+
+    def clean_image(self):
+        """
+        Размер в пикселях известен из заголовка без декодирования.
+        Поворот по EXIF, уменьшение и удаление метаданных — в пуле.
+        """
+        image = self.cleaned_data.get("image")
+        if not image or not hasattr(image, "image"):
+            return image
+        # файл, пришедший в обход LimitedUploadHandler
+        if image.size > settings.POST_IMAGE_MAX_BYTES:
+            raise self.too_large()
+        width, height = image.image.size
+        if width * height > settings.POST_IMAGE_MAX_PIXELS:
+            raise forms.ValidationError(
+                f"Картинка больше {settings.POST_IMAGE_MAX_PIXELS / 10**6:.1f} "
+                "мегапикселей")
+        try:
+            return normalize_upload(image)
+        except (OSError, TimeoutError, BrokenProcessPool):
+            raise forms.ValidationError(
+                "Не удалось обработать картинку, попробуйте другой файл")
+
+    def clean(self):
+        # файл отброшен при разборе запроса: в FILES его нет
+        if "image" in self.rejected:
+            self._errors.pop("image", None)
+            self.add_error("image", self.too_large())
+        return super().clean()
+
     def validate_form(self):
         data = self.cleaned_data["text"]
         if data is None:
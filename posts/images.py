@@ -0,0 +1,125 @@
+"""
+Производные картинок постов: несколько ширин в WebP и JPEG для srcset.
+"""
+import base64
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+
+# формат -> (имя формата Pillow, MIME-тип, расширение)
+FORMATS = {
+    "webp": ("WEBP", "image/webp", "webp"),
+    "jpeg": ("JPEG", "image/jpeg", "jpg"),
+}
+
+
+def derivative_name(source, width, image_format):
+    """ posts/cat.jpg -> posts/cat_320w.webp, рядом с оригиналом """
+    stem, _ = os.path.splitext(source)
+    return f"{stem}_{width}w.{FORMATS[image_format][2]}"
+
+
+def target_widths(source_width):
+    """
+    Ширины из POST_IMAGE_WIDTHS, которые не больше оригинала:
+    увеличенная копия весит больше, а чётче не становится
+    """
+    widths = [width for width in settings.POST_IMAGE_WIDTHS
+              if width <= source_width]
+    return widths or [min(source_width, min(settings.POST_IMAGE_WIDTHS))]
+
+
+def display_size(width):
+    """
+    Размер картинки в карточке: наибольшая копия из target_widths
+    в пропорциях POST_IMAGE_ASPECT. Известен до нарезки копий, поэтому
+    заглушка занимает ровно то же место, что и готовая картинка.
+    """
+    aspect_width, aspect_height = settings.POST_IMAGE_ASPECT
+    width = max(target_widths(width))
+    return width, max(round(width * aspect_height / aspect_width), 1)
+
+
+def placeholder(image):
+    """
+    Размытое превью в несколько сотен байт как data URI: картинка,
+    кадрированная как копии, уменьшается до POST_IMAGE_PLACEHOLDER_WIDTH
+    """
+    aspect_width, aspect_height = settings.POST_IMAGE_ASPECT
+    width = settings.POST_IMAGE_PLACEHOLDER_WIDTH
+    height = max(round(width * aspect_height / aspect_width), 1)
+    image.draft("RGB", (width, height))
+    preview = ImageOps.fit(image.convert("RGB"), (width, height),
+                           Image.BILINEAR)
+    buffer = BytesIO()
+    preview.save(buffer, "JPEG", quality=40, optimize=True)
+    return ("data:image/jpeg;base64,"
+            + base64.b64encode(buffer.getvalue()).decode("ascii"))
+
+
+def describe_image(file):
+    """ (ширина, высота, превью) для полей картинки поста """
+    position = file.tell() if hasattr(file, "tell") else None
+    with Image.open(file) as image:
+        width, height = image.size
+        preview = placeholder(image)
+    if position is not None:
+        file.seek(position)
+    return width, height, preview
+
+
+def encode(image, image_format):
+    pillow_format = FORMATS[image_format][0]
+    buffer = BytesIO()
+    image.save(buffer, pillow_format, quality=settings.POST_IMAGE_QUALITY,
+               optimize=True)
+    return buffer.getvalue()
+
+
+def render_derivatives(image):
+    """
+    Кадрированные по центру копии с пропорциями POST_IMAGE_ASPECT.
+    Возвращает список (формат, ширина, высота, байты).
+    """
+    aspect_width, aspect_height = settings.POST_IMAGE_ASPECT
+    image = image.convert("RGB")
+    rendered = []
+    # от большей ширины к меньшей: каждая копия уменьшается из предыдущей
+    for width in sorted(target_widths(image.width), reverse=True):
+        height = max(round(width * aspect_height / aspect_width), 1)
+        image = ImageOps.fit(image, (width, height), Image.LANCZOS)
+        for image_format in FORMATS:
+            rendered.append((image_format, width, height,
+                             encode(image, image_format)))
+    return rendered
+
+
+def build_derivatives(source):
+    """
+    Нарезать и сохранить производные файла `source` из хранилища.
+    Возвращает список несохранённых ImageDerivative.
+    """
+    from .models import ImageDerivative
+
+    with default_storage.open(source) as original:
+        image = Image.open(original)
+        # JPEG сразу декодируется в масштабе, достаточном для большей копии
+        largest = max(settings.POST_IMAGE_WIDTHS)
+        image.draft("RGB", (largest, round(largest * image.height
+                                           / image.width)))
+        image.load()
+    derivatives = []
+    for image_format, width, height, content in render_derivatives(image):
+        name = derivative_name(source, width, image_format)
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        default_storage.save(name, ContentFile(content))
+        derivatives.append(ImageDerivative(
+            source=source, format=image_format, width=width, height=height,
+            name=name, size=len(content)))
+    return derivatives
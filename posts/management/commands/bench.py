@@ -0,0 +1,250 @@
+import json
+import math
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from posts import factories
+from posts.bulk import rebuild_derived
+from posts.models import Group, Post
+from posts.paginator import CursorPaginator
+
+
+User = get_user_model()
+
+
+def percentile(values, share):
+    """ Процентиль по ближайшему рангу """
+    ordered = sorted(values)
+    rank = max(math.ceil(share * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+class Command(BaseCommand):
+    help = ("Нагрузочный прогон: наполнить базу и измерить задержки, "
+            "число запросов и пиковую память для каждой страницы и "
+            "каждого действия (пост, правка, комментарий, подписки)")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--posts", type=int, default=5000)
+        parser.add_argument("--comments", type=int, default=5000)
+        parser.add_argument("--groups", type=int, default=20)
+        parser.add_argument("--follows-per-user", type=int, default=20,
+                            help="Среднее число подписок пользователя")
+        parser.add_argument("--requests", type=int, default=50,
+                            help="Запросов к каждой странице")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--warm-cache", action="store_true",
+                            help="Не очищать кеш перед каждым запросом")
+        parser.add_argument("--in-place", action="store_true",
+                            help="Наполнять текущую базу, а не тестовую; "
+                                 "изменяющие сценарии тоже пишут в неё")
+        parser.add_argument("--json", metavar="FILE",
+                            help="Записать результаты в JSON ('-' — stdout)")
+
+    def handle(self, *args, **options):
+        old_name = None
+        if not options["in_place"]:
+            old_name = connection.creation.create_test_db(
+                verbosity=0, autoclobber=True)
+        try:
+            random.seed(options["seed"])
+            started = time.perf_counter()
+            dataset = self.seed(options)
+            dataset["seed_seconds"] = round(time.perf_counter() - started, 2)
+            views = self.run_views(dataset.pop("context"), options)
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = {"meta": self.meta(), "dataset": dataset, "views": views}
+        if options["json"] == "-":
+            self.stdout.write(json.dumps(report, indent=2, ensure_ascii=False))
+            return
+        if options["json"]:
+            with open(options["json"], "w") as output:
+                json.dump(report, output, indent=2, ensure_ascii=False)
+        self.print_table(views)
+
+    def meta(self):
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True, text=True, cwd=settings.BASE_DIR,
+            ).stdout.strip() or None
+        except OSError:
+            commit = None
+        return {
+            "commit": commit,
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "cache": settings.CACHES["default"]["BACKEND"],
+        }
+
+    def seed(self, options):
+        user_ids = factories.bulk_users(options["users"])
+        group_ids = factories.bulk_groups(options["groups"])
+        factories.bulk_posts(options["posts"], user_ids, group_ids)
+        post_ids = factories.new_ids(Post, 0)
+        factories.bulk_comments(options["comments"], post_ids, user_ids)
+        follows = factories.bulk_follows(user_ids,
+                                         mean=options["follows_per_user"])
+        rebuild_derived()
+
+        users = list(User.objects.filter(pk__in=user_ids)
+                     .select_related("stats").order_by("pk"))
+        groups = list(Group.objects.filter(pk__in=group_ids))
+        # читатель с наибольшим числом подписок — самая тяжёлая лента
+        reader = max(users, key=lambda user: user.stats.following_count)
+        author = users[0]
+        # на кого читатель ещё не подписан: цели подписки и отписки
+        followed = set(reader.follower.values_list("author", flat=True))
+        strangers = [user for user in users
+                     if user.pk not in followed and user != reader]
+        deep_offset = min(options["posts"] - 1, options["posts"] * 9 // 10)
+        deep_post = Post.objects.order_by("-pub_date", "-id")[deep_offset]
+        deep_cursor = CursorPaginator(Post.objects.all(), 10).encode_cursor(
+            deep_post)
+        return {
+            "users": len(users),
+            "posts": len(post_ids),
+            "comments": options["comments"],
+            "groups": len(groups),
+            "follows": follows,
+            "context": {
+                "reader": reader,
+                "author": author,
+                "strangers": strangers,
+                "group": groups[0],
+                "post": author.posts.first(),
+                "deep_cursor": deep_cursor,
+                "deep_page": deep_offset // 10 + 1,
+            },
+        }
+
+    def scenarios(self, context):
+        """
+        (имя, клиент, метод, адрес, данные). Адрес и данные могут быть
+        функциями номера запроса: подписка каждый раз на другого автора.
+        """
+        author = context["author"].username
+        post = context["post"]
+        post_url = f"/{author}/{post.id}/" if post else None
+        strangers = [user.username for user in context["strangers"]] or \
+            [author]
+
+        def stranger(number):
+            return strangers[number % len(strangers)]
+
+        def on_post(path):
+            return post_url and post_url + path
+
+        return [
+            ("index", "anonymous", "get", "/", None),
+            ("index_deep_cursor", "anonymous", "get",
+             f"/?after={context['deep_cursor']}", None),
+            ("index_deep_page", "anonymous", "get",
+             f"/?page={context['deep_page']}", None),
+            ("group", "anonymous", "get",
+             f"/group/{context['group'].slug}/", None),
+            ("profile", "anonymous", "get", f"/{author}/", None),
+            ("followers", "anonymous", "get", f"/{author}/followers/", None),
+            ("following", "anonymous", "get", f"/{author}/following/", None),
+            ("post", "anonymous", "get", post_url, None),
+            ("post_comments", "anonymous", "get", on_post("comments/"), None),
+            ("post_comments_json", "anonymous", "get",
+             on_post("comments/?format=json"), None),
+            ("follow", "reader", "get", "/follow/", None),
+            ("search", "anonymous", "get",
+             f"/search/?q={factories.WORDS[0]}", None),
+            ("new_post", "reader", "post", "/new/",
+             lambda number: {"text": f"Пост bench {number}"}),
+            ("post_edit", "author", "post", on_post("edit/"),
+             lambda number: {"text": f"Правка bench {number}",
+                             "group": post.group_id or ""}),
+            ("add_comment", "reader", "post",
+             post and f"/{author}/{post.id}/comment",
+             lambda number: {"text": f"Комментарий bench {number}"}),
+            ("profile_follow", "reader", "get",
+             lambda number: f"/{stranger(number)}/follow/", None),
+            ("profile_unfollow", "reader", "get",
+             lambda number: f"/{stranger(number)}/unfollow/", None),
+            ("follow_bulk", "reader", "post", "/follow/bulk/",
+             lambda number: {"username": strangers,
+                             "action": ("follow", "unfollow")[number % 2]}),
+        ]
+
+    def run_views(self, context, options):
+        reader, author = Client(), Client()
+        reader.force_login(context["reader"])
+        author.force_login(context["author"])
+        clients = {"anonymous": Client(), "reader": reader, "author": author}
+        results = {}
+        for name, client, method, url, data in self.scenarios(context):
+            if url is None:
+                continue
+            client = clients[client]
+
+            def send(number):
+                target = url(number) if callable(url) else url
+                payload = data(number) if callable(data) else data
+                response = getattr(client, method)(target, payload)
+                if response.status_code >= 400:
+                    self.stderr.write(f"{name}: {target} вернул "
+                                      f"{response.status_code}")
+                return response
+
+            latencies = []
+            queries = []
+            send(0)  # прогрев импорта шаблонов
+            for number in range(1, options["requests"] + 1):
+                if not options["warm_cache"]:
+                    cache.clear()
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.perf_counter()
+                    send(number)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                queries.append(len(captured.captured_queries))
+
+            if not options["warm_cache"]:
+                cache.clear()
+            tracemalloc.start()
+            send(options["requests"] + 1)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            results[name] = {
+                "url": url(0) if callable(url) else url,
+                "method": method.upper(),
+                "requests": len(latencies),
+                "p50_ms": round(percentile(latencies, 0.50), 3),
+                "p95_ms": round(percentile(latencies, 0.95), 3),
+                "p99_ms": round(percentile(latencies, 0.99), 3),
+                "queries_mean": round(sum(queries) / len(queries), 2),
+                "queries_max": max(queries),
+                "peak_kb": round(peak / 1024, 1),
+            }
+        return results
+
+    def print_table(self, views):
+        header = (f"{'страница':<20}{'p50 мс':>10}{'p95 мс':>10}"
+                  f"{'p99 мс':>10}{'запросов':>10}{'память КБ':>12}")
+        self.stdout.write(header)
+        for name, row in views.items():
+            self.stdout.write(
+                f"{name:<20}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}"
+                f"{row['p99_ms']:>10.2f}{row['queries_mean']:>10.1f}"
+                f"{row['peak_kb']:>12.1f}")
@@ -0,0 +1,182 @@
+import json
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from posts.management.commands.bench import percentile
+from posts.sqlite_cache import SQLiteCache
+from posts.workers import _setup
+
+
+DB_CACHE_TABLE = "bench_cache"
+
+# значения как в проекте: номер поколения, фрагмент карточки, страница
+VALUES = {
+    "int": 1,
+    "card_2kb": "x" * 2 * 1024,
+    "page_32kb": "x" * 32 * 1024,
+}
+
+
+def make_backend(name, location, options):
+    params = {"OPTIONS": dict(options)}
+    if name == "locmem":
+        return LocMemCache("bench", params)
+    if name == "db":
+        return DatabaseCache(DB_CACHE_TABLE, params)
+    return SQLiteCache(location, params)
+
+
+def timed(operation, keys):
+    latencies = []
+    for key in keys:
+        started = time.perf_counter()
+        operation(key)
+        latencies.append((time.perf_counter() - started) * 1e6)
+    return latencies
+
+
+def summary(latencies):
+    return {
+        "p50_us": round(percentile(latencies, 0.5), 1),
+        "p95_us": round(percentile(latencies, 0.95), 1),
+        "p99_us": round(percentile(latencies, 0.99), 1),
+    }
+
+
+def mixed_load(location, options, operations, keys, writes, seed):
+    """
+    Нагрузка одного воркера: чтения и доля записей по общему набору
+    ключей. Выполняется в отдельном процессе.
+    """
+    cache = make_backend("sqlite", location, options)
+    rng = random.Random(seed)
+    value = VALUES["card_2kb"]
+    hits, latencies = 0, []
+    started = time.perf_counter()
+    for _ in range(operations):
+        key = f"card:{rng.randrange(keys)}"
+        operation = time.perf_counter()
+        if rng.random() < writes:
+            cache.set(key, value)
+        else:
+            hits += cache.get(key) is not None
+        latencies.append((time.perf_counter() - operation) * 1e6)
+    return hits, latencies, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = ("Задержки get/set/incr кеша: LocMemCache, DatabaseCache и "
+            "общий SQLiteCache, а также SQLiteCache под нагрузкой "
+            "из нескольких процессов")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--operations", type=int, default=2000,
+                            help="Операций каждого вида")
+        parser.add_argument("--backends", default="locmem,db,sqlite")
+        parser.add_argument("--processes", type=int, default=4,
+                            help="Воркеров в смешанной нагрузке; 0 — без неё")
+        parser.add_argument("--keys", type=int, default=1000,
+                            help="Ключей в смешанной нагрузке")
+        parser.add_argument("--writes", type=float, default=0.1,
+                            help="Доля записей в смешанной нагрузке")
+        parser.add_argument("--json", metavar="FILE",
+                            help="Записать результаты в JSON ('-' — stdout)")
+
+    def handle(self, *args, **options):
+        options_cache = {"MAX_ENTRIES": options["operations"] * 10}
+        names = options["backends"].split(",")
+        old_name = None
+        if "db" in names:
+            old_name = connection.creation.create_test_db(
+                verbosity=0, autoclobber=True)
+            call_command("createcachetable", DB_CACHE_TABLE, verbosity=0)
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                location = os.path.join(directory, "cache.sqlite3")
+                backends = {
+                    name: self.run_backend(
+                        make_backend(name, location, options_cache), options)
+                    for name in names}
+                report = {"operations": options["operations"],
+                          "backends": backends}
+                if options["processes"]:
+                    report["shared"] = self.run_shared(
+                        location, options_cache, options)
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options["json"] == "-":
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        if options["json"]:
+            with open(options["json"], "w") as output:
+                json.dump(report, output, indent=2)
+        self.print_report(report)
+
+    def run_backend(self, cache, options):
+        cache.clear()
+        keys = [f"bench:{i}" for i in range(options["operations"])]
+        rows = {}
+        for name, value in VALUES.items():
+            rows[f"set_{name}"] = summary(
+                timed(lambda key: cache.set(key, value), keys))
+            rows[f"get_{name}"] = summary(timed(cache.get, keys))
+        rows["get_miss"] = summary(
+            timed(cache.get, [f"missing:{key}" for key in keys]))
+        cache.set("counter", 0)
+        rows["incr"] = summary(
+            timed(lambda key: cache.incr("counter"), keys))
+        cache.clear()
+        return rows
+
+    def run_shared(self, location, options_cache, options):
+        """
+        Несколько процессов читают и пишут общий набор ключей: сколько
+        чтений попадает в кеш и как растут задержки от блокировок
+        """
+        processes = options["processes"]
+        with ProcessPoolExecutor(
+                max_workers=processes, mp_context=get_context("spawn"),
+                initializer=_setup,
+                initargs=(os.environ["DJANGO_SETTINGS_MODULE"],)) as executor:
+            results = [executor.submit(
+                mixed_load, location, options_cache, options["operations"],
+                options["keys"], options["writes"], seed)
+                for seed in range(processes)]
+            results = [result.result() for result in results]
+        # запуск процессов не считается: время — самого долгого воркера
+        elapsed = max(seconds for _, _, seconds in results)
+        latencies = [value for _, rows, _ in results for value in rows]
+        reads = len(latencies) * (1 - options["writes"])
+        return dict(summary(latencies),
+                    processes=processes,
+                    ops_per_second=round(len(latencies) / elapsed),
+                    hit_rate=round(sum(hits for hits, _, _ in results) / reads, 3))
+
+    def print_report(self, report):
+        backends = report["backends"]
+        self.stdout.write(f"{'операция':<16}" + "".join(
+            f"{name + ' p50/p99 мкс':>26}" for name in backends))
+        for operation in next(iter(backends.values())):
+            self.stdout.write(f"{operation:<16}" + "".join(
+                f"{rows[operation]['p50_us']:>17.1f}/"
+                f"{rows[operation]['p99_us']:<8.1f}"
+                for rows in backends.values()))
+        shared = report.get("shared")
+        if shared:
+            self.stdout.write(
+                f"\nsqlite, процессов {shared['processes']}: "
+                f"{shared['ops_per_second']} оп/с, "
+                f"p50 {shared['p50_us']} мкс, p99 {shared['p99_us']} мкс, "
+                f"попаданий {shared['hit_rate']:.0%}")
@@ -0,0 +1,101 @@
+import json
+import os
+import random
+from io import BytesIO
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from PIL import Image, ImageFilter, ImageOps
+
+from posts.images import render_derivatives
+
+
+# прежняя карточка: {% thumbnail "960x339" crop="center" %}, качество sorl
+LEGACY_SIZE = (960, 339)
+LEGACY_QUALITY = 95
+
+
+def synthetic_photo(size, seed):
+    """ Градиент с шумом и размытием — сжимается примерно как фотография """
+    rng = random.Random(seed)
+    base = Image.linear_gradient("L").resize(size).convert("RGB")
+    tint = Image.new("RGB", size, tuple(rng.randrange(256) for _ in range(3)))
+    noise = Image.effect_noise(size, 40).convert("RGB")
+    image = Image.blend(Image.blend(base, tint, 0.5), noise, 0.25)
+    return image.filter(ImageFilter.GaussianBlur(1))
+
+
+def legacy_bytes(image):
+    buffer = BytesIO()
+    ImageOps.fit(image.convert("RGB"), LEGACY_SIZE, Image.LANCZOS).save(
+        buffer, "JPEG", quality=LEGACY_QUALITY)
+    return len(buffer.getvalue())
+
+
+def pick(candidates, needed):
+    """ Как браузер по srcset: самая узкая копия не уже нужной ширины """
+    fitting = [item for item in candidates if item[0] >= needed]
+    return min(fitting) if fitting else max(candidates)
+
+
+class Command(BaseCommand):
+    help = ("Байты картинок на страницу ленты: прежняя JPEG-карточка "
+            "960x339 против srcset с WebP для разных экранов")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--images", metavar="DIR",
+                            help="Каталог с фотографиями; по умолчанию "
+                                 "синтетические")
+        parser.add_argument("--per-page", type=int, default=10)
+        parser.add_argument("--source-size", default="2400x1600")
+        parser.add_argument("--viewports", default="360,768,1280")
+        parser.add_argument("--dpr", default="1,2")
+        parser.add_argument("--json", metavar="FILE",
+                            help="Записать результаты в JSON ('-' — stdout)")
+
+    def load_images(self, options):
+        if options["images"]:
+            names = sorted(os.listdir(options["images"]))[:options["per_page"]]
+            return [Image.open(os.path.join(options["images"], name))
+                    for name in names]
+        size = tuple(int(side) for side in options["source_size"].split("x"))
+        return [synthetic_photo(size, seed)
+                for seed in range(options["per_page"])]
+
+    def handle(self, *args, **options):
+        images = self.load_images(options)
+        legacy = sum(legacy_bytes(image) for image in images)
+        rendered = [render_derivatives(image) for image in images]
+        card_width = settings.POST_IMAGE_ASPECT[0]
+
+        rows = []
+        for viewport in (int(value) for value in options["viewports"].split(",")):
+            for dpr in (float(value) for value in options["dpr"].split(",")):
+                needed = min(viewport, card_width) * dpr
+                row = {"viewport": viewport, "dpr": dpr,
+                       "legacy_jpeg": legacy}
+                for image_format in ("webp", "jpeg"):
+                    row[image_format] = sum(
+                        pick([(width, len(content))
+                              for fmt, width, _, content in derivatives
+                              if fmt == image_format], needed)[1]
+                        for derivatives in rendered)
+                row["saved"] = round(1 - row["webp"] / legacy, 3)
+                rows.append(row)
+
+        report = {"images": len(images), "widths": settings.POST_IMAGE_WIDTHS,
+                  "quality": settings.POST_IMAGE_QUALITY, "pages": rows}
+        if options["json"] == "-":
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        if options["json"]:
+            with open(options["json"], "w") as output:
+                json.dump(report, output, indent=2)
+
+        self.stdout.write(f"{'экран':>8}{'dpr':>6}{'было КБ':>10}"
+                          f"{'WebP КБ':>10}{'JPEG КБ':>10}{'экономия':>10}")
+        for row in rows:
+            self.stdout.write(
+                f"{row['viewport']:>8}{row['dpr']:>6}"
+                f"{row['legacy_jpeg'] / 1024:>10.1f}{row['webp'] / 1024:>10.1f}"
+                f"{row['jpeg'] / 1024:>10.1f}{row['saved']:>10.0%}")
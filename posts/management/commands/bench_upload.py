@@ -0,0 +1,91 @@
+import json
+import os
+import resource
+import tempfile
+
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from posts.workers import run_isolated
+
+
+def max_rss_mb(who=resource.RUSAGE_SELF):
+    # в Linux ru_maxrss в килобайтах
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+def measure(path, workers, max_side):
+    """
+    Одна загрузка в свежем процессе: разбор multipart и проверка
+    PostForm. Возвращает прирост пиковой памяти процесса запроса
+    и пиковую память процессов пула.
+    """
+    from django.test import RequestFactory, override_settings
+
+    from posts import workers as pool
+    from posts.forms import PostForm
+
+    with open(path, "rb") as image:
+        request = RequestFactory().post("/new/", {"text": "Фото",
+                                                  "image": image})
+    request.FILES  # тело разбирается во временный файл
+    before = max_rss_mb()
+    with override_settings(POST_IMAGE_WORKERS=workers,
+                           POST_IMAGE_MAX_SIDE=max_side):
+        form = PostForm(request.POST, request.FILES)
+        valid = form.is_valid()
+        for executor in pool._executors.values():
+            executor.shutdown(wait=True)
+    return {
+        "valid": valid,
+        "errors": form.errors.get_json_data(),
+        "request_peak_mb": round(max_rss_mb() - before, 1),
+        "pool_peak_mb": round(max_rss_mb(resource.RUSAGE_CHILDREN), 1),
+    }
+
+
+class Command(BaseCommand):
+    help = ("Пиковая память процесса запроса при загрузке большой "
+            "картинки: обработка в потоке запроса против пула процессов")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", default="8000x6000",
+                            help="Размер исходной картинки")
+        parser.add_argument("--formats", default="JPEG,PNG")
+        parser.add_argument("--max-side", type=int, default=4096)
+        parser.add_argument("--json", metavar="FILE",
+                            help="Записать результаты в JSON ('-' — stdout)")
+
+    def handle(self, *args, **options):
+        size = tuple(int(side) for side in options["size"].split("x"))
+        source = Image.linear_gradient("L").resize(size).convert("RGB")
+        results = []
+        with tempfile.TemporaryDirectory() as directory:
+            for image_format in options["formats"].split(","):
+                path = os.path.join(directory,
+                                    f"source.{image_format.lower()}")
+                source.save(path, image_format)
+                for mode, workers in (("inline", 0), ("pool", 1)):
+                    row = run_isolated(
+                        "posts.management.commands.bench_upload.measure",
+                        path, workers, options["max_side"])
+                    row.update(format=image_format, mode=mode,
+                               file_mb=round(os.path.getsize(path) / 2**20, 1),
+                               decoded_mb=round(size[0] * size[1] * 3 / 2**20))
+                    results.append(row)
+
+        if options["json"] == "-":
+            self.stdout.write(json.dumps(results, indent=2, ensure_ascii=False))
+            return
+        if options["json"]:
+            with open(options["json"], "w") as output:
+                json.dump(results, output, indent=2, ensure_ascii=False)
+
+        self.stdout.write(f"{'формат':<8}{'режим':<8}{'файл МБ':>9}"
+                          f"{'RGB МБ':>8}{'запрос МБ':>11}{'пул МБ':>8}")
+        for row in results:
+            self.stdout.write(
+                f"{row['format']:<8}{row['mode']:<8}{row['file_mb']:>9}"
+                f"{row['decoded_mb']:>8}{row['request_peak_mb']:>11}"
+                f"{row['pool_peak_mb']:>8}"
+                + ("" if row["valid"] else f"  {row['errors']}"))
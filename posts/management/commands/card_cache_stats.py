@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.cards import card_stats, reset_card_stats
+
+
+class Command(BaseCommand):
+    help = "Статистика кеша карточек постов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true",
+                            help="Обнулить счётчики после вывода")
+
+    def handle(self, *args, **options):
+        if not settings.POST_CARD_CACHE_STATS:
+            self.stderr.write("Счётчики выключены: включите "
+                              "POST_CARD_CACHE_STATS на время замеров")
+        stats = card_stats()
+        self.stdout.write(
+            f"Попаданий: {stats['hits']}, промахов: {stats['misses']}, "
+            f"доля попаданий: {stats['hit_ratio']:.1%}, "
+            f"сэкономлено рендеринга: {stats['saved_ms']:.1f} мс")
+        if options["reset"]:
+            reset_card_stats()
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts.thumbnails import describe_stored_images
+
+
+class Command(BaseCommand):
+    help = ("Посчитать размер и превью картинок постов, "
+            "сохранённых до появления этих полей")
+
+    def handle(self, *args, **options):
+        updated, skipped = describe_stored_images()
+        self.stdout.write(
+            f"Постов обновлено: {updated}, файлов пропущено: {skipped}")
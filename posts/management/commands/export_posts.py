@@ -0,0 +1,53 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.bulk import (RECORD_TYPES, Checkpoint, Throughput, dump_record,
+                        export_batches)
+
+
+class Command(BaseCommand):
+    help = ("Выгрузить сообщества, посты, комментарии и подписки в NDJSON: "
+            "одна JSON-запись с полем type на строку")
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="Файл выгрузки ('-' — stdout)")
+        parser.add_argument("--types", nargs="+", choices=RECORD_TYPES,
+                            default=RECORD_TYPES)
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument("--checkpoint", metavar="FILE",
+                            help="Файл контрольной точки; если он есть, "
+                                 "выгрузка дописывается с места остановки")
+
+    def handle(self, *args, **options):
+        checkpoint = Checkpoint(options["checkpoint"])
+        state = checkpoint.load()
+        if options["output"] == "-":
+            if state:
+                raise CommandError("Продолжить можно только выгрузку в файл")
+            output = sys.stdout
+        else:
+            output = open(options["output"], "a" if state else "w")
+
+        throughput = Throughput()
+        types = [record_type for record_type in RECORD_TYPES
+                 if record_type in options["types"]]
+        if state:
+            types = types[types.index(state["type"]):]
+        try:
+            for record_type in types:
+                after = (state["after"]
+                         if state.get("type") == record_type else 0)
+                for batch in export_batches(record_type, after,
+                                            options["chunk_size"]):
+                    output.write("".join(f"{dump_record(record)}\n"
+                                         for record in batch))
+                    output.flush()
+                    checkpoint.save({"type": record_type,
+                                     "after": batch[-1]["id"]})
+                    throughput.add(record_type, len(batch))
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        checkpoint.clear()
+        self.stderr.write(f"Выгружено: {throughput.report()}")
@@ -0,0 +1,80 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection
+
+from posts.bulk import Checkpoint, ImportConflict, Importer, rebuild_derived
+from posts.models import Comment, Follow, Group, Post
+
+
+class Command(BaseCommand):
+    help = ("Загрузить NDJSON, выгруженный export_posts. "
+            "Повторная загрузка тех же строк ничего не дублирует")
+
+    def add_arguments(self, parser):
+        parser.add_argument("input", help="Файл выгрузки ('-' — stdin)")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--checkpoint", metavar="FILE",
+                            help="Файл контрольной точки; если он есть, "
+                                 "уже загруженные строки пропускаются")
+        parser.add_argument("--progress-every", type=int, default=100000,
+                            help="Печатать скорость каждые N строк")
+        parser.add_argument("--no-rebuild", action="store_true",
+                            help="Не пересчитывать счётчики, ленты и "
+                                 "поисковый индекс после загрузки")
+
+    def handle(self, *args, **options):
+        checkpoint = Checkpoint(options["checkpoint"])
+        done = checkpoint.load().get("line", 0)
+        if options["input"] == "-":
+            if done:
+                raise CommandError("Продолжить можно только загрузку файла")
+            source = sys.stdin
+        else:
+            source = open(options["input"])
+
+        importer = Importer(options["batch_size"])
+        line_number = done
+        try:
+            for line_number, line in enumerate(source, start=1):
+                if line_number <= done or not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    full = importer.add(record)
+                except ValueError as error:
+                    raise CommandError(f"Строка {line_number}: {error}")
+                if full:
+                    self.flush(importer, line_number)
+                    checkpoint.save({"line": line_number})
+                if line_number % options["progress_every"] == 0:
+                    self.stderr.write(importer.throughput.report())
+            self.flush(importer, line_number)
+        finally:
+            if source is not sys.stdin:
+                source.close()
+        checkpoint.save({"line": line_number})
+
+        # после вставки с явными id счётчики последовательностей отстают
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [Group, Post, Comment, Follow])
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+        if not options["no_rebuild"]:
+            if done:
+                # строки прошлого запуска этому процессу неизвестны
+                rebuild_derived()
+            else:
+                rebuild_derived(**importer.touched)
+        checkpoint.clear()
+        self.stderr.write(f"Загружено: {importer.throughput.report()}")
+
+    def flush(self, importer, line_number):
+        try:
+            importer.flush()
+        except ImportConflict as error:
+            raise CommandError(f"Пачка до строки {line_number}: {error}")
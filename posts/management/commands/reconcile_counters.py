@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post, UserStats
+
+
+class Command(BaseCommand):
+    help = "Пересчитать денормализованные счётчики, исправив расхождения"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000,
+                            help="Размер пачки при создании недостающих записей")
+
+    def handle(self, *args, **options):
+        created, fixed = UserStats.objects.reconcile(options["batch_size"])
+        self.stdout.write(
+            f"Профили: создано {created}, исправлено {fixed}")
+        fixed = Post.objects.reconcile_comment_counts()
+        self.stdout.write(f"Посты: исправлено счётчиков комментариев {fixed}")
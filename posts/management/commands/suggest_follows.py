@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from posts.suggestions import compute_suggestions
+
+
+class Command(BaseCommand):
+    help = ("Пересчитать рекомендации «кого почитать» для читателей, "
+            "у которых изменились подписки")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true",
+                            help="Пересчитать всех читателей")
+        parser.add_argument("--count", type=int,
+                            help="Рекомендаций на читателя")
+        parser.add_argument("--batch-size", type=int,
+                            help="Читателей в одной транзакции")
+
+    def handle(self, *args, **options):
+        def progress(done, total):
+            if options["verbosity"] > 1:
+                self.stderr.write(f"{done}/{total}")
+
+        stats = compute_suggestions(full=options["full"],
+                                    count=options["count"],
+                                    batch_size=options["batch_size"],
+                                    progress=progress)
+        self.stdout.write(
+            f"Пользователей {stats['users']}, подписок {stats['edges']}, "
+            f"пересчитано {stats['computed']} из {stats['readers']} читателей, "
+            f"удалено устаревших {stats['cleared']} "
+            f"(загрузка {stats['load_seconds']:.1f} с, "
+            f"расчёт {stats['score_seconds']:.1f} с)")
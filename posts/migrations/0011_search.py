@@ -0,0 +1,57 @@
+# Generated by Django 2.2.9 on 2026-10-18 02:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_fts_table(apps, schema_editor):
+    """ Виртуальная таблица FTS5 создаётся только там, где она есть """
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        if not any(row[0] == "ENABLE_FTS5" for row in cursor.fetchall()):
+            return
+        cursor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS posts_post_fts USING "
+            "fts5(text, group_title, tokenize='unicode61 remove_diacritics 2')")
+        cursor.execute(
+            "INSERT INTO posts_post_fts (rowid, text, group_title) "
+            "SELECT p.id, p.text, COALESCE(g.title, '') "
+            "FROM posts_post p LEFT JOIN posts_group g ON g.id = p.group_id")
+
+
+def drop_fts_table(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TABLE IF EXISTS posts_post_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_post_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=100, verbose_name='Слово')),
+                ('weight', models.PositiveIntegerField(default=1, verbose_name='Вес')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='posts.Post', verbose_name='Пост')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='searchterm',
+            index=models.Index(fields=['term', 'post'], name='search_term_post_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='searchterm',
+            index=models.Index(fields=['post'], name='search_post_idx'),
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 2.2.9 on 2026-10-18 02:28
+
+from django.db import migrations, models
+import posts.storage
+
+
+def count_references(apps, schema_editor):
+    """ Ссылки на файлы, загруженные до хеширования имён """
+    Post = apps.get_model("posts", "Post")
+    StoredFile = apps.get_model("posts", "StoredFile")
+    usage = (Post.objects
+             .exclude(image="").exclude(image__isnull=True)
+             .order_by()
+             .values("image")
+             .annotate(total=models.Count("id")))
+    StoredFile.objects.bulk_create(
+        [StoredFile(name=row["image"], refcount=row["total"])
+         for row in usage.iterator()], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_image_derivative'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredFile',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='Файл')),
+                ('refcount', models.IntegerField(default=0, verbose_name='Постов со ссылкой')),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=posts.storage.ContentHashStorage(), upload_to='posts/'),
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,28 @@
-from django.db import models
+from django.conf import settings
+from django.db import connections, models, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
 from django.contrib.auth import get_user_model
 
+from .follow_graph import follow_graph
+from .storage import ContentHashStorage
+
 User = get_user_model()
 
 
 
+def count_subquery(queryset, field):
+    """ Коррелированный COUNT(*) по `field` = pk внешнего запроса """
+    counts = (queryset
+              .filter(**{field: OuterRef("pk")})
+              .order_by()
+              .values(field)
+              .annotate(total=Count("id"))
+              .values("total"))
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+
 class Group(models.Model):
     title = models.CharField(max_length=200, verbose_name="Название сообщества")
     
@@ -17,6 +35,35 @@ class Group(models.Model):
 
 
 
+class PostQuerySet(models.QuerySet):
+    def feed(self):
+        """
+        Посты для карточек post_item.html: автор и сообщество в том же
+        запросе, число комментариев хранится в самом посте.
+        Все ленты строятся от этого метода, чтобы не было N+1.
+        """
+        return self.select_related("author", "group")
+
+    def bump_comment_count(self, delta):
+        """ Атомарно изменить число комментариев; карточка устаревает """
+        return self.update(comment_count=Greatest(F("comment_count") + delta, 0),
+                           version=F("version") + 1)
+
+    def reconcile_comment_counts(self):
+        """ Исправить разошедшиеся счётчики. Возвращает число исправленных """
+        actual = count_subquery(Comment.objects, "post")
+        with transaction.atomic():
+            drifted = (self.annotate(actual_comment_count=actual)
+                       .exclude(comment_count=F("actual_comment_count"))
+                       .values("pk"))
+            return self.filter(pk__in=drifted).update(comment_count=actual)
+
+    def bump_version(self):
+        """ Сбросить кеш карточек: у постов меняется версия содержимого """
+        return self.update(version=F("version") + 1)
+
+
+
 class Post(models.Model):
     text = models.TextField(verbose_name="Текст поста", 
                             help_text="Удиви мир своими идеями!")
@@ -38,11 +85,48 @@ class Post(models.Model):
                               help_text="Выберите сообщество из списка "
                                         "или оставьте это поле пустым")
     
-    image = models.ImageField(upload_to="posts/", blank=True, null=True)
+    image = models.ImageField(upload_to="posts/", blank=True, null=True,
+                              storage=ContentHashStorage())
+
+    # считаются при сохранении картинки (signals.describe_post_image):
+    # карточка знает размер и превью, не открывая файл
+    image_width = models.PositiveIntegerField(null=True, blank=True,
+                                              editable=False)
+    image_height = models.PositiveIntegerField(null=True, blank=True,
+                                               editable=False)
+    image_placeholder = models.TextField(blank=True, default="",
+                                         editable=False)
+
+    # версия карточки в кеше фрагментов, растёт при любом изменении
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    # поддерживается сигналами комментариев: ленты не читают posts_comment
+    comment_count = models.PositiveIntegerField(default=0, editable=False,
+                                                verbose_name="Комментариев")
+
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        # id различает посты, опубликованные в одну и ту же секунду
+        ordering = ("-pub_date", "-id")
+        indexes = [
+            models.Index(fields=["-pub_date", "-id"],
+                         name="post_date_idx"),
+            models.Index(fields=["author", "-pub_date", "-id"],
+                         name="post_author_date_idx"),
+            models.Index(fields=["group", "-pub_date", "-id"],
+                         name="post_group_date_idx"),
+        ]
 
     def __str__(self):
       return self.text
 
+    def save(self, *args, **kwargs):
+        # файл картинки и ссылка на него в StoredFile — одна транзакция:
+        # блокировка из ContentHashStorage.save держится до acquire
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
 
 
 class Comment(models.Model):
@@ -65,11 +149,107 @@ class Comment(models.Model):
   created = models.DateTimeField(auto_now_add=True,
                                 verbose_name="Дата публикации")
 
+  class Meta:
+    ordering = ("created", "id")
+    indexes = [
+        models.Index(fields=["post", "created", "id"],
+                     name="comment_post_created_idx"),
+    ]
+
   def __str__(self):
     return self.text
 
 
 
+class FollowManager(models.Manager):
+    """
+    Подписка и отписка — один оператор без предварительной проверки:
+    INSERT с пропуском конфликтов по уникальной паре (user, author)
+    и DELETE. Повторный или одновременный клик не создаёт дублей, а
+    счётчики, ленты и граф подписок меняются только для строк, которые
+    оператор действительно вставил или удалил (RETURNING).
+    """
+
+    def _returning(self, connection):
+        """ RETURNING есть в PostgreSQL и в SQLite начиная с 3.35 """
+        if connection.vendor == "sqlite":
+            return connection.Database.sqlite_version_info >= (3, 35)
+        return connection.vendor == "postgresql"
+
+    def _execute(self, sql, params, user_id, author_ids, inserting):
+        """
+        Выполнить оператор и вернуть отсортированные id авторов, которых
+        он затронул. Без RETURNING они определяются запросом до оператора:
+        при одновременной записи счётчики могут разойтись, их исправит
+        reconcile_counters.
+        """
+        connection = connections[self.db]
+        if self._returning(connection):
+            with connection.cursor() as cursor:
+                cursor.execute(f"{sql} RETURNING author_id", params)
+                return sorted(row[0] for row in cursor.fetchall())
+        existing = set(self.filter(user_id=user_id, author_id__in=author_ids)
+                       .values_list("author_id", flat=True))
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+        return sorted(set(author_ids) - existing if inserting else existing)
+
+    def follow(self, user_id, author_ids):
+        """ Подписать на авторов; возвращает id новых подписок """
+        author_ids = sorted(set(author_ids) - {user_id})
+        if not author_ids:
+            return []
+        ops = connections[self.db].ops
+        values = ", ".join(["(%s, %s)"] * len(author_ids))
+        sql = (f"{ops.insert_statement(ignore_conflicts=True)} "
+               f"{ops.quote_name(self.model._meta.db_table)} "
+               f"({ops.quote_name('user_id')}, {ops.quote_name('author_id')}) "
+               f"VALUES {values} "
+               f"{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}")
+        params = [value for author_id in author_ids
+                  for value in (user_id, author_id)]
+        with transaction.atomic(using=self.db):
+            followed = self._execute(sql, params, user_id, author_ids,
+                                     inserting=True)
+            self._changed(user_id, followed, True)
+        return followed
+
+    def unfollow(self, user_id, author_ids):
+        """ Отписать от авторов; возвращает id удалённых подписок """
+        author_ids = sorted(set(author_ids))
+        if not author_ids:
+            return []
+        ops = connections[self.db].ops
+        placeholders = ", ".join(["%s"] * len(author_ids))
+        sql = (f"DELETE FROM {ops.quote_name(self.model._meta.db_table)} "
+               f"WHERE {ops.quote_name('user_id')} = %s "
+               f"AND {ops.quote_name('author_id')} IN ({placeholders})")
+        with transaction.atomic(using=self.db):
+            unfollowed = self._execute(sql, [user_id] + author_ids,
+                                       user_id, author_ids, inserting=False)
+            self._changed(user_id, unfollowed, False)
+        return unfollowed
+
+    def _changed(self, user_id, author_ids, followed):
+        """ Счётчики, ленты и граф для изменившихся подписок """
+        if not author_ids:
+            return
+        delta = 1 if followed else -1
+        UserStats.objects.bump(user_id, following_count=delta * len(author_ids))
+        UserStats.objects.filter(user__in=author_ids).update(
+            followers_count=F("followers_count") + delta)
+        if followed:
+            TimelineEntry.objects.backfill(user_id, author_ids)
+        else:
+            TimelineEntry.objects.prune(user_id, author_ids)
+        # в журнал — только после коммита: другие процессы не должны
+        # увидеть подписку, которая может откатиться
+        changes = [(user_id, author_id, followed) for author_id in author_ids]
+        transaction.on_commit(lambda: follow_graph.record_many(changes),
+                              using=self.db)
+
+
+
 class Follow(models.Model):
   user = models.ForeignKey(User,
                 on_delete=models.CASCADE,
@@ -78,4 +258,446 @@ class Follow(models.Model):
   author = models.ForeignKey(User,
                 on_delete=models.CASCADE,
                 related_name="following",
-                verbose_name="Автор")              
+                verbose_name="Автор")
+
+  objects = FollowManager()
+
+  class Meta:
+    constraints = [
+        models.UniqueConstraint(fields=["user", "author"],
+                                name="follow_unique_user_author"),
+    ]
+
+
+
+# авторов в одном запросе `user__in` при поиске популярных подписок
+PULL_AUTHORS_CHUNK_SIZE = 500
+
+
+class TimelineManager(models.Manager):
+    """
+    Материализованные ленты подписок (fan-out-on-write).
+    Посты авторов, у которых больше TIMELINE_FANOUT_LIMIT подписчиков,
+    в ленты не раскладываются и читаются при выдаче (fan-out-on-read).
+    """
+
+    def fan_out(self, post):
+        """ Разложить новый пост по лентам подписчиков автора """
+        stats = UserStats.objects.for_user(post.author)
+        if stats.followers_count > settings.TIMELINE_FANOUT_LIMIT:
+            return
+        followers = (Follow.objects
+                     .filter(author=post.author_id)
+                     .values_list("user", flat=True))
+        self.bulk_create(
+            [self.model(user_id=user_id,
+                        post=post,
+                        author_id=post.author_id,
+                        pub_date=post.pub_date)
+             for user_id in followers],
+            batch_size=settings.TIMELINE_BATCH_SIZE,
+            ignore_conflicts=True)
+
+    def backfill(self, user_id, author_ids):
+        """
+        После подписки добавить в ленту последние посты авторов, кроме
+        популярных. На всех авторов одной подписки приходится не больше
+        TIMELINE_BACKFILL_LIMIT постов: глубже лента обычно не читается.
+        """
+        limit = settings.TIMELINE_FANOUT_LIMIT
+        popular = (UserStats.objects
+                   .filter(user__in=author_ids, followers_count__gt=limit)
+                   .values("user"))
+        posts = (Post.objects
+                 .filter(author__in=author_ids)
+                 .exclude(author__in=popular)
+                 .order_by("-pub_date", "-id")
+                 .values_list("id", "author", "pub_date")
+                 [:settings.TIMELINE_BACKFILL_LIMIT])
+        self.bulk_create(
+            [self.model(user_id=user_id,
+                        post_id=post_id,
+                        author_id=author_id,
+                        pub_date=pub_date)
+             for post_id, author_id, pub_date in posts],
+            batch_size=settings.TIMELINE_BATCH_SIZE,
+            # пост, созданный одновременно с подпиской, разложит и fan_out
+            ignore_conflicts=True)
+
+    def rebuild(self, users=None):
+        """
+        Перестроить ленты по подпискам, например после bulk_create:
+        все или только читателей с id из `users`. Один INSERT … SELECT:
+        подписки соединяются с последними TIMELINE_BACKFILL_LIMIT постами
+        каждого автора, популярные авторы пропускаются.
+        """
+        entries = self.all()
+        if users is not None:
+            users = list(users)
+            entries = entries.filter(user__in=users)
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        entry_table = quote(self.model._meta.db_table)
+        follow_table = quote(Follow._meta.db_table)
+        post_table = quote(Post._meta.db_table)
+        stats_table = quote(UserStats._meta.db_table)
+
+        def of_readers(column):
+            return f"{column} IN ({', '.join(['%s'] * len(users))})"
+
+        params = []
+        ordering = f"{quote('pub_date')} DESC, {quote('id')} DESC"
+        if connection.features.supports_over_clause:
+            # номер поста у своего автора, новые первыми
+            authors = ""
+            if users is not None:
+                authors = (f"WHERE {quote('author_id')} IN "
+                           f"(SELECT {quote('author_id')} FROM {follow_table} "
+                           f"WHERE {of_readers(quote('user_id'))})")
+                params += users
+            posts = (f"(SELECT {quote('id')}, {quote('author_id')}, "
+                     f"{quote('pub_date')}, ROW_NUMBER() OVER "
+                     f"(PARTITION BY {quote('author_id')} ORDER BY {ordering}) "
+                     f"AS position FROM {post_table} {authors}) p "
+                     f"ON p.{quote('author_id')} = f.{quote('author_id')} "
+                     f"AND p.position <= %s")
+        else:
+            # без оконных функций: последние посты автора — подзапрос
+            # по индексу (author, -pub_date) на каждую подписку
+            posts = (f"{post_table} p ON p.{quote('id')} IN "
+                     f"(SELECT {quote('id')} FROM {post_table} "
+                     f"WHERE {quote('author_id')} = f.{quote('author_id')} "
+                     f"ORDER BY {ordering} LIMIT %s)")
+        params.append(settings.TIMELINE_BACKFILL_LIMIT)
+        sql = (f"INSERT INTO {entry_table} ({quote('user_id')}, "
+               f"{quote('post_id')}, {quote('author_id')}, {quote('pub_date')}) "
+               f"SELECT f.{quote('user_id')}, p.{quote('id')}, "
+               f"p.{quote('author_id')}, p.{quote('pub_date')} "
+               f"FROM {follow_table} f JOIN {posts} "
+               f"WHERE f.{quote('author_id')} NOT IN "
+               f"(SELECT {quote('user_id')} FROM {stats_table} "
+               f"WHERE {quote('followers_count')} > %s)")
+        params.append(settings.TIMELINE_FANOUT_LIMIT)
+        if users is not None:
+            sql += f" AND {of_readers('f.' + quote('user_id'))}"
+            params += users
+        with transaction.atomic(using=self.db):
+            entries.delete()
+            if users is None or users:
+                with connection.cursor() as cursor:
+                    cursor.execute(sql, params)
+
+    def prune(self, user_id, author_ids):
+        """ После отписки убрать посты авторов из ленты """
+        self.filter(user=user_id, author__in=author_ids).delete()
+
+    def pull_authors(self, user):
+        """
+        Авторы из подписок, чьи посты читаются при выдаче. Подписки
+        берутся из графа в памяти, счётчики — по первичному ключу, тем
+        же критерием, что и в fan_out
+        """
+        followed = follow_graph.following(user.pk)
+        pull = []
+        limit = settings.TIMELINE_FANOUT_LIMIT
+        for start in range(0, len(followed), PULL_AUTHORS_CHUNK_SIZE):
+            chunk = followed[start:start + PULL_AUTHORS_CHUNK_SIZE].tolist()
+            pull += (UserStats.objects
+                     .filter(user__in=chunk, followers_count__gt=limit)
+                     .values_list("user", flat=True))
+        return pull
+
+    def posts_for(self, user, pull_authors=()):
+        """ Все посты ленты пользователя с учётом авторов fan-out-on-read """
+        materialized = self.filter(user=user).values("post")
+        return Post.objects.feed().filter(models.Q(id__in=materialized) |
+                                   models.Q(author__in=pull_authors))
+
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(User,
+                on_delete=models.CASCADE,
+                related_name="timeline",
+                verbose_name="Читатель")
+    post = models.ForeignKey(Post,
+                on_delete=models.CASCADE,
+                related_name="timeline_entries",
+                verbose_name="Пост")
+    # копии полей поста: лента читается без обращения к posts_post
+    author = models.ForeignKey(User,
+                on_delete=models.CASCADE,
+                related_name="+",
+                verbose_name="Автор")
+    pub_date = models.DateTimeField(verbose_name="Дата публикации")
+
+    objects = TimelineManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "post"],
+                                    name="timeline_unique_user_post"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "-pub_date", "-post"],
+                         name="timeline_user_date_idx"),
+            models.Index(fields=["user", "author"],
+                         name="timeline_user_author_idx"),
+        ]
+
+
+
+class UserStatsManager(models.Manager):
+    """
+    Счётчики профиля меняются атомарно через F(), без COUNT(*) при чтении.
+    Запись создаётся пересчётом при первом обращении к профилю.
+    """
+
+    def actual(self):
+        """ Счётчики, посчитанные заново по таблицам """
+        return {
+            "posts_count": count_subquery(Post.objects, "author"),
+            "followers_count": count_subquery(Follow.objects, "author"),
+            "following_count": count_subquery(Follow.objects, "user"),
+        }
+
+    def rebuild(self, user):
+        actual = self.actual()
+        counts = (User.objects
+                  .filter(pk=user.pk)
+                  .annotate(**actual)
+                  .values(*actual)
+                  .get())
+        stats, _ = self.update_or_create(user=user, defaults=counts)
+        return stats
+
+    def for_user(self, user):
+        try:
+            return user.stats
+        except UserStats.DoesNotExist:
+            return self.rebuild(user)
+
+    def reconcile(self, batch_size=1000, users=None):
+        """
+        Создать недостающие записи и исправить разошедшиеся счётчики —
+        у всех или только у пользователей с id из `users`.
+        Возвращает (создано, исправлено).
+        """
+        scope = models.Q() if users is None else models.Q(pk__in=users)
+        missing = (User.objects
+                   .filter(scope, stats__isnull=True)
+                   .values_list("pk", flat=True)
+                   .iterator(chunk_size=batch_size))
+        created = 0
+        batch = []
+        for user_id in missing:
+            batch.append(self.model(user_id=user_id))
+            if len(batch) >= batch_size:
+                created += len(self.bulk_create(batch))
+                batch = []
+        created += len(self.bulk_create(batch))
+
+        actual = self.actual()
+        drift = models.Q()
+        for field in actual:
+            drift |= ~models.Q(**{field: F(f"actual_{field}")})
+        with transaction.atomic():
+            drifted = (self
+                       .filter(scope)
+                       .annotate(**{f"actual_{field}": expression
+                                    for field, expression in actual.items()})
+                       .filter(drift)
+                       .values("pk"))
+            fixed = self.filter(pk__in=drifted).update(**actual)
+        return created, fixed
+
+    def bump(self, user_id, **deltas):
+        """ Атомарно изменить счётчики: bump(id, posts_count=1) """
+        self.filter(user_id=user_id).update(
+            **{field: F(field) + delta for field, delta in deltas.items()})
+
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(User,
+                on_delete=models.CASCADE,
+                primary_key=True,
+                related_name="stats",
+                verbose_name="Пользователь")
+    posts_count = models.PositiveIntegerField(default=0,
+                verbose_name="Записей")
+    followers_count = models.PositiveIntegerField(default=0,
+                verbose_name="Подписчиков")
+    following_count = models.PositiveIntegerField(default=0,
+                verbose_name="Подписок")
+
+    objects = UserStatsManager()
+
+
+
+class Suggestion(models.Model):
+    """ Рекомендация «кого почитать», посчитанная suggest_follows """
+    user = models.ForeignKey(User,
+                on_delete=models.CASCADE,
+                related_name="suggestions",
+                verbose_name="Читатель")
+    author = models.ForeignKey(User,
+                on_delete=models.CASCADE,
+                related_name="+",
+                verbose_name="Автор")
+    score = models.FloatField(verbose_name="Оценка")
+    rank = models.PositiveSmallIntegerField(verbose_name="Место")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "rank"],
+                                    name="suggestion_unique_user_rank"),
+        ]
+
+
+
+class SuggestionState(models.Model):
+    """ Отпечаток подписок, по которым посчитаны рекомендации читателя """
+    user = models.OneToOneField(User,
+                on_delete=models.CASCADE,
+                primary_key=True,
+                related_name="+",
+                verbose_name="Читатель")
+    digest = models.CharField(max_length=32, verbose_name="Отпечаток подписок")
+    updated = models.DateTimeField(auto_now=True, verbose_name="Посчитано")
+
+
+
+class SearchTerm(models.Model):
+    """ Обратный индекс для поиска на базах без SQLite FTS5 """
+    MAX_LENGTH = 100
+
+    term = models.CharField(max_length=MAX_LENGTH, verbose_name="Слово")
+    post = models.ForeignKey(Post,
+                on_delete=models.CASCADE,
+                related_name="search_terms",
+                verbose_name="Пост")
+    weight = models.PositiveIntegerField(default=1, verbose_name="Вес")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["term", "post"], name="search_term_post_idx"),
+            models.Index(fields=["post"], name="search_post_idx"),
+        ]
+
+
+
+class ImageDerivative(models.Model):
+    """
+    Уменьшенная копия картинки поста для srcset. Привязана к имени
+    исходного файла, а не к посту: одинаковые файлы делят копии.
+    """
+    source = models.CharField(max_length=255,
+                verbose_name="Исходный файл")
+    format = models.CharField(max_length=10, verbose_name="Формат")
+    width = models.PositiveIntegerField(verbose_name="Ширина")
+    height = models.PositiveIntegerField(verbose_name="Высота")
+    name = models.CharField(max_length=255, verbose_name="Файл")
+    size = models.PositiveIntegerField(verbose_name="Размер в байтах")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["source", "format", "width"],
+                                    name="derivative_unique_source"),
+        ]
+
+
+
+class StoredFileManager(models.Manager):
+    """
+    Счётчик ссылок постов на файлы картинок. Файл и его копии для
+    srcset удаляются, когда на него больше не ссылается ни один пост.
+    """
+
+    def acquire(self, name):
+        # строка блокируется: release в соседней транзакции не удалит
+        # файл, на который здесь появляется ссылка
+        with transaction.atomic():
+            if self.select_for_update().filter(name=name).first() is None:
+                _, created = self.get_or_create(
+                    name=name, defaults={"refcount": 1})
+                if created:
+                    return
+            self.filter(name=name).update(refcount=F("refcount") + 1)
+
+    def reserve(self, name):
+        """
+        Перед тем как решить, что файл уже есть на диске: строка
+        блокируется до конца транзакции сохранения поста. Удаление
+        сироты ждёт её и после коммита видит новую ссылку, а если строка
+        уже удалена вместе с файлом, файл пишется заново. UPDATE без
+        изменений, а не select_for_update: SQLite пропускает FOR UPDATE,
+        а UPDATE берёт блокировку записи.
+        """
+        self.filter(name=name).update(refcount=F("refcount"))
+
+    def release(self, name):
+        with transaction.atomic():
+            self.select_for_update().filter(name=name).first()
+            self.filter(name=name).update(refcount=F("refcount") - 1)
+            orphaned = self.filter(name=name, refcount__lte=0).exists()
+        if orphaned:
+            transaction.on_commit(lambda: self._delete_orphan(name))
+
+    def _delete_orphan(self, name):
+        """
+        После коммита: пока шёл коммит, тот же файл мог снова получить
+        ссылку (ContentHashStorage не пишет файл, который уже есть),
+        поэтому счётчик проверяется ещё раз под блокировкой, которую
+        берёт и reserve().
+        """
+        from .thumbnails import delete_image_files
+
+        with transaction.atomic():
+            if self.select_for_update().filter(
+                    name=name, refcount__lte=0).first() is None:
+                return
+            self.filter(name=name).delete()
+            delete_image_files(name)
+
+    def reconcile(self, names=None):
+        """
+        Пересчитать ссылки по таблице постов (после bulk_create сигналы
+        не срабатывают): все или только для файлов `names`.
+        Возвращает (исправлено, удалено).
+        """
+        posts, stored_files = Post.objects.all(), self.all()
+        if names is not None:
+            names = list(names)
+            posts = posts.filter(image__in=names)
+            stored_files = stored_files.filter(name__in=names)
+        usage = dict(posts
+                     .exclude(image="").exclude(image__isnull=True)
+                     .order_by()
+                     .values("image")
+                     .annotate(total=Count("id"))
+                     .values_list("image", "total"))
+        fixed = 0
+        with transaction.atomic():
+            stored = dict(stored_files.values_list("name", "refcount"))
+            for name, total in usage.items():
+                if stored.get(name) != total:
+                    self.update_or_create(name=name,
+                                          defaults={"refcount": total})
+                    fixed += 1
+            orphaned = [name for name in stored if name not in usage]
+            self.filter(name__in=orphaned).delete()
+        from .thumbnails import delete_image_files
+        for name in orphaned:
+            transaction.on_commit(lambda name=name: delete_image_files(name))
+        return fixed, len(orphaned)
+
+
+
+class StoredFile(models.Model):
+    name = models.CharField(max_length=255, primary_key=True,
+                verbose_name="Файл")
+    refcount = models.IntegerField(default=0,
+                verbose_name="Постов со ссылкой")
+
+    objects = StoredFileManager()
@@ -0,0 +1,182 @@
+import base64
+import binascii
+import json
+import heapq
+from collections.abc import Sequence
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+
+class CursorPaginator:
+    """
+    Постраничный вывод по ключу (keyset pagination).
+
+    Вместо OFFSET страница начинается сразу после курсора — значений
+    полей сортировки крайней записи предыдущей страницы. COUNT(*) не
+    выполняется, поэтому стоимость запроса не зависит от глубины страницы.
+    Последнее поле сортировки должно быть уникальным (обычно id).
+    `transform` получает список записей страницы после вычисления курсоров,
+    например чтобы одним запросом выбрать посты по строкам ленты.
+    """
+    is_keyset = True
+
+    def __init__(self, object_list, per_page, ordering=("-pub_date", "-id"),
+                 transform=None):
+        self.ordering = tuple(ordering)
+        self.transform = transform
+        self.object_list = object_list.order_by(*self.ordering)
+        self.per_page = int(per_page)
+        self.fields = [name.lstrip("-") for name in self.ordering]
+        self.descending = [name.startswith("-") for name in self.ordering]
+
+    def encode_cursor(self, obj):
+        """ Непрозрачный токен из значений полей сортировки записи """
+        meta = obj._meta
+        values = [meta.get_field(name).value_to_string(obj)
+                  for name in self.fields]
+        raw = json.dumps(values, separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    def decode_cursor(self, token):
+        """ Значения полей из токена или None, если токен испорчен """
+        if not token:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+            values = json.loads(raw.decode())
+            if not isinstance(values, list) or len(values) != len(self.fields):
+                return None
+            meta = self.object_list.model._meta
+            return [meta.get_field(name).to_python(value)
+                    for name, value in zip(self.fields, values)]
+        except (binascii.Error, ValueError, TypeError,
+                FieldDoesNotExist, ValidationError):
+            return None
+
+    def _seek(self, values, backwards=False):
+        """
+        Условие «строго после курсора» для составного ключа:
+        (a > x) OR (a = x AND b > y) OR ... с учётом направления полей
+        """
+        condition = Q()
+        for i, name in enumerate(self.fields):
+            lookup = "lt" if self.descending[i] != backwards else "gt"
+            step = Q(**{f"{name}__{lookup}": values[i]})
+            for prev_name, prev_value in zip(self.fields[:i], values[:i]):
+                step &= Q(**{prev_name: prev_value})
+            condition |= step
+        return condition
+
+    def _rows(self, values, backwards, limit):
+        """ До `limit` записей строго после курсора или перед ним """
+        queryset = self.object_list
+        if backwards:
+            queryset = queryset.order_by(
+                *[name[1:] if name.startswith("-") else f"-{name}"
+                  for name in self.ordering])
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, backwards))
+        return list(queryset[:limit])
+
+    def get_page(self, after=None, before=None):
+        """
+        Страница после курсора `after` или перед курсором `before`.
+        Без курсора или с испорченным курсором возвращает первую страницу.
+        Выбирается на одну запись больше, чтобы узнать о следующей странице.
+        """
+        limit = self.per_page + 1
+
+        before_values = self.decode_cursor(before)
+        if before_values is not None:
+            rows = self._rows(before_values, backwards=True, limit=limit)
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            return self._page(rows, has_next=True, has_previous=has_previous)
+
+        after_values = self.decode_cursor(after)
+        rows = self._rows(after_values, backwards=False, limit=limit)
+        return self._page(rows[:self.per_page],
+                          has_next=len(rows) > self.per_page,
+                          has_previous=after_values is not None)
+
+    def _page(self, rows, has_next, has_previous):
+        has_next = has_next and bool(rows)
+        next_cursor = self.encode_cursor(rows[-1]) if has_next else None
+        previous_cursor = None
+        if has_previous:
+            previous_cursor = self.encode_cursor(rows[0]) if rows else ""
+        if self.transform is not None:
+            rows = self.transform(rows)
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+
+class MergedCursorPaginator(CursorPaginator):
+    """
+    Несколько источников, отсортированных по одинаковым значениям ключа,
+    как одна лента: каждый читается своим проходом по индексу, страницы
+    сливаются в памяти. Источник — пара (queryset, ordering); имена полей
+    могут различаться, например ("-pub_date", "-post_id") у строк ленты
+    и ("-pub_date", "-id") у постов.
+    """
+
+    def __init__(self, sources, per_page, transform=None):
+        self.sources = [CursorPaginator(queryset, per_page, ordering)
+                        for queryset, ordering in sources]
+        first = self.sources[0]
+        self.ordering = first.ordering
+        self.object_list = first.object_list
+        self.fields = first.fields
+        self.descending = first.descending
+        self.per_page = int(per_page)
+        self.transform = transform
+
+    def _source(self, obj):
+        for source in self.sources:
+            if isinstance(obj, source.object_list.model):
+                return source
+        raise TypeError(f"{obj!r} не относится ни к одному источнику")
+
+    def encode_cursor(self, obj):
+        return self._source(obj).encode_cursor(obj)
+
+    def _key(self, obj):
+        source = self._source(obj)
+        meta = obj._meta
+        return tuple(meta.get_field(name).value_from_object(obj)
+                     for name in source.fields)
+
+    def _rows(self, values, backwards, limit):
+        streams = [source._rows(values, backwards, limit)
+                   for source in self.sources]
+        merged = heapq.merge(*streams, key=self._key,
+                             reverse=self.descending[0] != backwards)
+        return [row for _, row in zip(range(limit), merged)]
+
+
+class CursorPage(Sequence):
+    """ Страница курсорного паджинатора, интерфейс как у Page """
+
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f"<CursorPage of {len(self)} items>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
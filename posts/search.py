@@ -0,0 +1,196 @@
+import base64
+import binascii
+import json
+import re
+from collections import Counter
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Q, Sum
+
+from .models import Post, SearchTerm
+from .paginator import CursorPage
+from .thumbnails import prefetch_images
+
+
+FTS_TABLE = "posts_post_fts"
+# вес совпадения в названии сообщества относительно текста поста
+GROUP_TITLE_WEIGHT = 2
+
+
+def tokenize(text):
+    """ Слова в нижнем регистре, без знаков препинания """
+    return re.findall(r"\w+", (text or "").lower())
+
+
+def fts5_available():
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        return any(row[0] == "ENABLE_FTS5" for row in cursor.fetchall())
+
+
+class SQLiteFTSBackend:
+    """
+    Полнотекстовый индекс SQLite FTS5: строка виртуальной таблицы
+    с rowid = id поста, ранжирование по bm25.
+    """
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+
+    def rebuild(self):
+        self.clear()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, text, group_title) "
+                "SELECT p.id, p.text, COALESCE(g.title, '') "
+                "FROM posts_post p LEFT JOIN posts_group g ON g.id = p.group_id")
+
+    def index(self, post):
+        group_title = post.group.title if post.group_id else ""
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s",
+                           [post.pk])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, text, group_title) "
+                "VALUES (%s, %s, %s)", [post.pk, post.text, group_title])
+
+    def remove(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s",
+                           [post_id])
+
+    def reindex_group(self, group):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {FTS_TABLE} SET group_title = %s WHERE rowid IN "
+                "(SELECT id FROM posts_post WHERE group_id = %s)",
+                [group.title, group.pk])
+
+    def search(self, terms, after=None, limit=10):
+        """
+        (id поста, ранг) по возрастанию ранга (bm25 тем меньше, чем лучше
+        совпадение), при равенстве сначала новые
+        """
+        match = " ".join(f'"{term}"' for term in terms)
+        sql = (f"SELECT rowid, score FROM ("
+               f"SELECT rowid, bm25({FTS_TABLE}, 1.0, {GROUP_TITLE_WEIGHT:.1f})"
+               f" AS score FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)")
+        params = [match]
+        if after is not None:
+            score, post_id = after
+            sql += " WHERE score > %s OR (score = %s AND rowid < %s)"
+            params += [score, score, post_id]
+        sql += " ORDER BY score, rowid DESC LIMIT %s"
+        params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+
+class InvertedIndexBackend:
+    """
+    Запасной вариант для баз без FTS5: обратный индекс в таблице
+    SearchTerm (слово, пост, вес), ранг — сумма весов совпавших слов.
+    """
+
+    def clear(self):
+        SearchTerm.objects.all().delete()
+
+    def rebuild(self):
+        self.clear()
+        posts = Post.objects.select_related("group").iterator(
+            chunk_size=settings.SEARCH_BATCH_SIZE)
+        batch = []
+        for post in posts:
+            batch.extend(self._terms(post))
+            if len(batch) >= settings.SEARCH_BATCH_SIZE:
+                SearchTerm.objects.bulk_create(batch)
+                batch = []
+        SearchTerm.objects.bulk_create(batch)
+
+    def _terms(self, post):
+        weights = Counter(tokenize(post.text))
+        if post.group_id:
+            for term in tokenize(post.group.title):
+                weights[term] += GROUP_TITLE_WEIGHT
+        return [SearchTerm(term=term[:SearchTerm.MAX_LENGTH],
+                           post_id=post.pk, weight=weight)
+                for term, weight in weights.items()]
+
+    def index(self, post):
+        self.remove(post.pk)
+        SearchTerm.objects.bulk_create(self._terms(post))
+
+    def remove(self, post_id):
+        SearchTerm.objects.filter(post_id=post_id).delete()
+
+    def reindex_group(self, group):
+        for post in group.posts.select_related("group").iterator():
+            self.index(post)
+
+    def search(self, terms, after=None, limit=10):
+        """ (id поста, ранг) по убыванию ранга, при равенстве — новые """
+        terms = sorted({term[:SearchTerm.MAX_LENGTH] for term in terms})
+        matches = (SearchTerm.objects
+                   .filter(term__in=terms)
+                   .values("post")
+                   .annotate(score=Sum("weight"), matched=Count("term"))
+                   .filter(matched=len(terms)))
+        if after is not None:
+            score, post_id = after
+            matches = matches.filter(Q(score__lt=score) |
+                                     Q(score=score, post__lt=post_id))
+        # по post_id, а не post: иначе подтянется сортировка модели Post
+        return list(matches.order_by("-score", "-post_id")
+                    .values_list("post", "score")[:limit])
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    if fts5_available():
+        return SQLiteFTSBackend()
+    return InvertedIndexBackend()
+
+
+def encode_cursor(score, post_id):
+    raw = json.dumps([score, post_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        score, post_id = json.loads(raw.decode())
+        return float(score), int(post_id)
+    except (binascii.Error, ValueError, TypeError):
+        return None
+
+
+def search_posts(query, after=None, per_page=10, backend=None):
+    """
+    Страница результатов поиска по релевантности.
+    Курсор — (ранг, id) последнего результата, поэтому глубокие
+    страницы не требуют OFFSET.
+    """
+    backend = backend or get_backend()
+    terms = tokenize(query)
+    if not terms:
+        return CursorPage([], None, None, None)
+
+    after_values = decode_cursor(after)
+    rows = backend.search(terms, after=after_values, limit=per_page + 1)
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    posts = Post.objects.feed().in_bulk([post_id for post_id, _ in rows])
+    next_cursor = encode_cursor(rows[-1][1], rows[-1][0]) if has_next else None
+    previous_cursor = "" if after_values is not None else None
+    return CursorPage(prefetch_images(posts[post_id] for post_id, _ in rows
+                                      if post_id in posts),
+                      None, next_cursor, previous_cursor)
@@ -0,0 +1,211 @@
+import threading
+
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from .feed_cache import bump_feed_generation_on_commit
+from .follow_graph import follow_graph
+from .images import describe_image
+from .models import (Comment, Follow, Group, Post, StoredFile, TimelineEntry,
+                     User, UserStats)
+from .search import get_backend
+
+
+# счётчик обновляется раньше рассылки: fan_out может создать запись
+# статистики пересчётом, и тогда новый пост в ней уже учтён
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.bump(instance.author_id, posts_count=1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    """ Новый пост сразу попадает в ленты подписчиков автора """
+    if created and not raw:
+        TimelineEntry.objects.fan_out(instance)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    UserStats.objects.bump(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, raw=False, **kwargs):
+    """ Счётчик комментариев растёт, карточка поста устаревает """
+    if created and not raw and instance.post_id:
+        Post.objects.filter(pk=instance.post_id).bump_comment_count(1)
+
+
+# id постов, которые сейчас удаляются в этом потоке: их комментарии
+# уходят каскадом, и считать их по одному незачем
+_deleting_posts = threading.local()
+
+
+def deleting_posts():
+    if not hasattr(_deleting_posts, "ids"):
+        _deleting_posts.ids = set()
+    return _deleting_posts.ids
+
+
+@receiver(pre_delete, sender=Post)
+def mark_deleting_post(sender, instance, **kwargs):
+    """
+    Сигналы комментариев приходят уже после удаления поста, поэтому
+    отметка снимается после коммита. После отката она остаётся, и
+    счётчик такого поста исправит reconcile_counters
+    """
+    pk = instance.pk
+    deleting_posts().add(pk)
+    transaction.on_commit(lambda: deleting_posts().discard(pk))
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    if instance.post_id and instance.post_id not in deleting_posts():
+        Post.objects.filter(pk=instance.post_id).bump_comment_count(-1)
+
+
+@receiver(post_save, sender=Group)
+def bump_group_posts(sender, instance, created, raw=False, **kwargs):
+    """ Название сообщества выводится в карточках его постов """
+    if not created and not raw:
+        instance.posts.bump_version()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_feeds(sender, **kwargs):
+    """
+    Ленты и их ETag устаревают при любой записи, откуда бы она ни
+    пришла: представление, админка, скрипт или import_posts
+    """
+    bump_feed_generation_on_commit()
+
+
+def saves_only_login(update_fields):
+    """ Вход пользователя обновляет только last_login """
+    return bool(update_fields) and set(update_fields) <= {"last_login"}
+
+
+@receiver(pre_save, sender=User)
+def remember_username(sender, instance, raw=False, update_fields=None,
+                      **kwargs):
+    """ Прежний username, чтобы после переименования сбросить карточки """
+    instance._previous_username = None
+    if instance.pk and not raw and not saves_only_login(update_fields):
+        instance._previous_username = (User.objects
+                                       .filter(pk=instance.pk)
+                                       .values_list("username", flat=True)
+                                       .first())
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_pages(sender, instance, update_fields=None, raw=False,
+                          **kwargs):
+    """
+    Имена и username выводятся в списках подписок, их ETag строится
+    по поколению. username есть и в карточках постов автора: их ключ
+    содержит версию поста, поэтому при переименовании она растёт
+    """
+    if raw or saves_only_login(update_fields):
+        return
+    previous = getattr(instance, "_previous_username", None)
+    if previous is not None and previous != instance.username:
+        Post.objects.filter(author=instance).bump_version()
+    bump_feed_generation_on_commit()
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, raw=False, **kwargs):
+    if not raw:
+        get_backend().index(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    get_backend().remove(instance.pk)
+
+
+@receiver(post_save, sender=Group)
+def reindex_group(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        get_backend().reindex_group(instance)
+
+
+@receiver(pre_save, sender=Post)
+def remember_image(sender, instance, raw=False, **kwargs):
+    """ Прежнее имя файла, чтобы после сохранения отпустить ссылку на него """
+    instance._previous_image = None
+    if instance.pk and not raw:
+        instance._previous_image = (Post.objects
+                                    .filter(pk=instance.pk)
+                                    .values_list("image", flat=True)
+                                    .first())
+
+
+@receiver(pre_save, sender=Post)
+def describe_post_image(sender, instance, raw=False, **kwargs):
+    """
+    Размер и превью новой картинки. Загрузка через PostForm уже
+    обработана в пуле, остальные (админка, скрипты) читаются здесь.
+    """
+    if raw:
+        return
+    if not instance.image:
+        instance.image_width = instance.image_height = None
+        instance.image_placeholder = ""
+    elif not instance.image._committed:
+        upload = instance.image.file
+        if hasattr(upload, "placeholder"):
+            width, height = upload.image_size
+            preview = upload.placeholder
+        else:
+            width, height, preview = describe_image(upload)
+        instance.image_width, instance.image_height = width, height
+        instance.image_placeholder = preview
+
+
+@receiver(post_save, sender=Post)
+def count_image_reference(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, "_previous_image", None) or None
+    current = instance.image.name or None
+    if current != previous:
+        if current:
+            StoredFile.objects.acquire(current)
+        if previous:
+            StoredFile.objects.release(previous)
+
+
+@receiver(post_delete, sender=Post)
+def release_image(sender, instance, **kwargs):
+    if instance.image:
+        StoredFile.objects.release(instance.image.name)
+
+
+@receiver(post_save, sender=Follow)
+def log_follow(sender, instance, created, raw=False, **kwargs):
+    """
+    Графы подписок в памяти процессов догонят изменение по журналу.
+    Запись в журнал — после коммита: откаченная подписка туда не попадёт.
+    """
+    if created and not raw:
+        user_id, author_id = instance.user_id, instance.author_id
+        transaction.on_commit(
+            lambda: follow_graph.record(user_id, author_id, True))
+
+
+@receiver(post_delete, sender=Follow)
+def log_unfollow(sender, instance, **kwargs):
+    user_id, author_id = instance.user_id, instance.author_id
+    transaction.on_commit(
+        lambda: follow_graph.record(user_id, author_id, False))
@@ -0,0 +1,370 @@
+"""
+Кеш Django в файле SQLite, общий для всех процессов на машине.
+
+LocMemCache живёт в памяти процесса: у каждого воркера gunicorn своя
+копия, попадания делятся на число воркеров, а сброс (поколение ленты,
+журнал графа подписок) до других процессов не доходит. Здесь записи
+лежат в одном файле в режиме WAL: читатели не ждут писателя, запись —
+одна короткая транзакция. Чтение идёт через mmap.
+
+Размер ограничен числом записей (MAX_ENTRIES) и байтами (MAX_SIZE).
+Итоги держат триггеры в таблице cache_usage, так что проверка после
+записи — чтение одной строки. При превышении сначала удаляются
+просроченные записи, затем давно не читанные, пока не освободится
+1/CULL_FREQUENCY лимита. Время чтения обновляется не чаще раза в
+TOUCH_INTERVAL секунд: иначе каждое чтение было бы записью, поэтому LRU
+приближённый.
+
+Целые числа хранятся как INTEGER, поэтому incr — один UPDATE, атомарный
+между процессами. Остальные значения — pickle. Нужен SQLite 3.24+
+(ON CONFLICT … DO UPDATE); с 3.35 add и incr обходятся одним
+оператором с RETURNING, на старых версиях — транзакцией BEGIN IMMEDIATE
+с проверкой rowcount.
+
+    CACHES = {
+        "default": {
+            "BACKEND": "posts.sqlite_cache.SQLiteCache",
+            "LOCATION": "/var/tmp/yatube-cache.sqlite3",
+            "OPTIONS": {"MAX_ENTRIES": 100000, "MAX_SIZE": 256 * 2 ** 20},
+        }
+    }
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.exceptions import ImproperlyConfigured
+
+
+SCHEMA = """
+BEGIN IMMEDIATE;
+CREATE TABLE IF NOT EXISTS cache_entry (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_entry_accessed ON cache_entry (accessed);
+CREATE INDEX IF NOT EXISTS cache_entry_expires ON cache_entry (expires)
+    WHERE expires IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS cache_usage (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    entries INTEGER NOT NULL,
+    bytes INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_usage VALUES (0, 0, 0);
+
+CREATE TRIGGER IF NOT EXISTS cache_entry_insert AFTER INSERT ON cache_entry
+BEGIN
+    UPDATE cache_usage SET entries = entries + 1, bytes = bytes + new.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entry_delete AFTER DELETE ON cache_entry
+BEGIN
+    UPDATE cache_usage SET entries = entries - 1, bytes = bytes - old.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entry_resize
+AFTER UPDATE OF size ON cache_entry WHEN new.size != old.size
+BEGIN
+    UPDATE cache_usage SET bytes = bytes - old.size + new.size;
+END;
+COMMIT;
+"""
+
+UPSERT = """
+INSERT INTO cache_entry (key, value, size, expires, accessed)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET value = excluded.value,
+    size = excluded.size, expires = excluded.expires,
+    accessed = excluded.accessed
+"""
+
+# «ещё живая» запись; параметр — текущее время
+ALIVE = "(expires IS NULL OR expires > ?)"
+
+# RETURNING есть в SQLite начиная с 3.35
+RETURNING = sqlite3.sqlite_version_info >= (3, 35)
+
+# INTEGER в SQLite — знаковые 64 бита
+INTEGER_RANGE = range(-2 ** 63, 2 ** 63)
+
+
+def _encode(value, protocol):
+    """ Целые храним как есть, чтобы их мог увеличить сам SQLite """
+    if type(value) is int and value in INTEGER_RANGE:
+        return value, 8
+    pickled = pickle.dumps(value, protocol)
+    return pickled, len(pickled)
+
+
+def _decode(value):
+    if isinstance(value, int):
+        return value
+    return pickle.loads(value)
+
+
+@contextmanager
+def write_transaction(connection):
+    """
+    BEGIN IMMEDIATE: блокировка на запись берётся сразу. Транзакция,
+    начатая чтением, не может дождаться писателя (SQLITE_BUSY), а эта
+    ждёт его по busy_timeout.
+    """
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        yield connection
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    connection.execute("COMMIT")
+
+
+class SQLiteCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    # схема создаётся один раз на файл и процесс
+    _ready = set()
+    _ready_lock = threading.Lock()
+
+    def __init__(self, location, params):
+        if sqlite3.sqlite_version_info < (3, 24):
+            raise ImproperlyConfigured(
+                f"SQLiteCache требует SQLite 3.24 или новее, "
+                f"установлен {sqlite3.sqlite_version}")
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._location = location
+        self._max_size = int(options.get("MAX_SIZE", 64 * 2 ** 20))
+        self._touch_interval = float(options.get("TOUCH_INTERVAL", 60))
+        self._mmap_size = int(options.get("MMAP_SIZE", 256 * 2 ** 20))
+        self._busy_timeout = float(options.get("BUSY_TIMEOUT", 5))
+        self._local = threading.local()
+
+    # соединения
+
+    def _connect(self):
+        directory = os.path.dirname(self._location)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self._location,
+                                     timeout=self._busy_timeout,
+                                     isolation_level=None)
+        connection.execute("PRAGMA journal_mode = WAL")
+        # в WAL так теряются лишь последние записи при сбое питания;
+        # для кеша это допустимо
+        connection.execute("PRAGMA synchronous = NORMAL")
+        connection.execute(f"PRAGMA mmap_size = {self._mmap_size}")
+        key = (os.getpid(), os.path.abspath(self._location))
+        with self._ready_lock:
+            if key not in self._ready:
+                connection.executescript(SCHEMA)
+                self._ready.add(key)
+        return connection
+
+    @property
+    def _db(self):
+        """
+        Соединение на поток. После fork процесс открывает своё: делить
+        соединение SQLite между процессами нельзя.
+        """
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            local.connection = self._connect()
+            local.pid = os.getpid()
+        return local.connection
+
+    # чтение
+
+    def _touch_stale(self, db, ids, now):
+        """ Отметить чтение у записей, которых давно не касались """
+        if ids:
+            db.execute(
+                f"UPDATE cache_entry SET accessed = ? "
+                f"WHERE id IN ({', '.join('?' * len(ids))})", (now, *ids))
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        now = time.time()
+        db = self._db
+        row = db.execute(
+            f"SELECT id, value, accessed FROM cache_entry "
+            f"WHERE key = ? AND {ALIVE}", (key, now)).fetchone()
+        if row is None:
+            return default
+        if row[2] < now - self._touch_interval:
+            self._touch_stale(db, [row[0]], now)
+        return _decode(row[1])
+
+    def get_many(self, keys, version=None):
+        keys = {self.make_key(key, version=version): key for key in keys}
+        for key in keys:
+            self.validate_key(key)
+        if not keys:
+            return {}
+        now = time.time()
+        db = self._db
+        rows = db.execute(
+            f"SELECT id, key, value, accessed FROM cache_entry "
+            f"WHERE key IN ({', '.join('?' * len(keys))}) AND {ALIVE}",
+            (*keys, now)).fetchall()
+        self._touch_stale(db, [row[0] for row in rows
+                               if row[3] < now - self._touch_interval], now)
+        return {keys[row[1]]: _decode(row[2]) for row in rows}
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._db.execute(
+            f"SELECT 1 FROM cache_entry WHERE key = ? AND {ALIVE}",
+            (key, time.time())).fetchone() is not None
+
+    # запись
+
+    def _row(self, key, value, timeout, now):
+        payload, size = _encode(value, self.pickle_protocol)
+        return (key, payload, size + len(key),
+                self.get_backend_timeout(timeout), now)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._set_rows([self._row(key, value, timeout, time.time())])
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        rows = []
+        for key, value in data.items():
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            rows.append(self._row(key, value, timeout, now))
+        self._set_rows(rows)
+        return []
+
+    def _set_rows(self, rows):
+        """ Записать строки одной транзакцией и уложиться в лимиты """
+        if not rows:
+            return
+        with write_transaction(self._db) as db:
+            db.executemany(UPSERT, rows)
+            self._cull(db, rows[0][-1])
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        now = time.time()
+        with write_transaction(self._db) as db:
+            # занять ключ можно, только если его нет или он просрочен
+            sql = UPSERT + "WHERE cache_entry.expires <= ?"
+            params = (*self._row(key, value, timeout, now), now)
+            if RETURNING:
+                added = db.execute(sql + " RETURNING id",
+                                   params).fetchone() is not None
+            else:
+                added = db.execute(sql, params).rowcount > 0
+            if added:
+                self._cull(db, now)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        now = time.time()
+        # одиночный UPDATE сам по себе транзакция, rowcount — его строки
+        return self._db.execute(
+            f"UPDATE cache_entry SET expires = ?, accessed = ? "
+            f"WHERE key = ? AND {ALIVE}",
+            (self.get_backend_timeout(timeout), now, key, now),
+        ).rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        now = time.time()
+        db = self._db
+        # сложение в самом UPDATE: между процессами ничего не теряется;
+        # при переполнении 64 бит SQLite перешёл бы на REAL
+        sql = (f"UPDATE cache_entry SET value = value + ?1, accessed = ?2 "
+               f"WHERE key = ?3 AND (expires IS NULL OR expires > ?2) "
+               f"AND typeof(value) = 'integer' "
+               f"AND value + ?1 BETWEEN {INTEGER_RANGE[0]} "
+               f"AND {INTEGER_RANGE[-1]}")
+        if RETURNING:
+            row = db.execute(sql + " RETURNING value",
+                             (delta, now, key)).fetchone()
+        else:
+            # новое значение читается в той же транзакции, что и UPDATE
+            with write_transaction(db):
+                row = None
+                if db.execute(sql, (delta, now, key)).rowcount:
+                    row = db.execute("SELECT value FROM cache_entry "
+                                     "WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            return row[0]
+        # не целое в INTEGER (bool, длинное число) или ключа нет
+        with write_transaction(db):
+            row = db.execute(
+                f"SELECT value, expires FROM cache_entry "
+                f"WHERE key = ? AND {ALIVE}", (key, now)).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = _decode(row[0]) + delta
+            payload, size = _encode(value, self.pickle_protocol)
+            db.execute(
+                "UPDATE cache_entry SET value = ?, size = ?, accessed = ? "
+                "WHERE key = ?", (payload, size + len(key), now, key))
+        return value
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._db.execute("DELETE FROM cache_entry WHERE key = ?", (key,))
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_key(key, version=version) for key in keys]
+        for key in keys:
+            self.validate_key(key)
+        if keys:
+            self._db.execute(
+                f"DELETE FROM cache_entry "
+                f"WHERE key IN ({', '.join('?' * len(keys))})", keys)
+
+    def clear(self):
+        self._db.execute("DELETE FROM cache_entry")
+
+    # вытеснение
+
+    def usage(self):
+        """ Число записей и их размер в байтах, включая просроченные """
+        return self._db.execute(
+            "SELECT entries, bytes FROM cache_usage").fetchone()
+
+    def _cull(self, db, now):
+        entries, size = db.execute(
+            "SELECT entries, bytes FROM cache_usage").fetchone()
+        if entries <= self._max_entries and size <= self._max_size:
+            return
+        db.execute("DELETE FROM cache_entry WHERE expires <= ?", (now,))
+        entries, size = db.execute(
+            "SELECT entries, bytes FROM cache_usage").fetchone()
+        if entries <= self._max_entries and size <= self._max_size:
+            return
+        # освобождаем с запасом, чтобы не вытеснять на каждой записи
+        keep_entries = self._max_entries - self._max_entries // self._cull_frequency
+        keep_size = self._max_size - self._max_size // self._cull_frequency
+        victims = []
+        for entry_id, entry_size in db.execute(
+                "SELECT id, size FROM cache_entry ORDER BY accessed"):
+            if entries <= keep_entries and size <= keep_size:
+                break
+            victims.append(entry_id)
+            entries -= 1
+            size -= entry_size
+        db.executemany("DELETE FROM cache_entry WHERE id = ?",
+                       ((entry_id,) for entry_id in victims))
@@ -0,0 +1,46 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentHashStorage(FileSystemStorage):
+    """
+    Файлы называются по SHA-256 содержимого: posts/ab/abcdef….jpg.
+    Повторная загрузка того же файла ничего не пишет на диск и получает
+    то же имя, а вместе с ним — уже нарезанные копии для srcset.
+    Сколько постов ссылается на файл, считает StoredFile; его строка
+    блокируется до проверки, есть ли файл, чтобы одновременное удаление
+    последней ссылки не стёрло файл после проверки.
+    """
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        hexdigest = digest.hexdigest()
+        return os.path.join(directory, hexdigest[:2], hexdigest + extension)
+
+    def save(self, name, content, max_length=None):
+        from .models import StoredFile
+
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        StoredFile.objects.reserve(name)
+        if self.exists(name):
+            return name
+        content.seek(0)
+        name = super().save(name, content, max_length=max_length)
+        if hasattr(content, "temporary_file_path"):
+            # временный файл перенесён на место; закрытие не даёт его
+            # деструктору удалять уже несуществующий путь
+            content.close()
+        return name
@@ -0,0 +1,263 @@
+"""
+«Кого почитать»: рекомендации авторов, которые считаются пакетно.
+
+Подписки загружаются в разреженную матрицу смежности A в формате CSR
+(indptr/indices на array): строка — читатель, столбцы — его авторы.
+Рядом хранится транспонированная матрица — подписчики автора. Оценки
+для читателя u — это строка A·A (друзья друзей) плюс выборка из
+A·Aᵀ·A: на кого ещё подписаны читатели тех же авторов. Строка
+накапливается в плотном аккумуляторе по алгоритму Густавсона, как
+в разреженном умножении матриц, затем из неё берутся лучшие N.
+
+Заново считаются только читатели, у которых изменился набор подписок:
+отпечаток строки A сравнивается с сохранённым в SuggestionState.
+Рекомендации тех, кто отписался от всех, удаляются. Если что-то
+изменилось, растёт поколение рекомендаций — по нему строится ETag
+страницы подписок с виджетом.
+"""
+import hashlib
+import heapq
+import math
+import time
+from array import array
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Follow, Suggestion, SuggestionState, User
+
+
+POPULAR_KEY = "suggestions:popular"
+GENERATION_KEY = "suggestions:generation"
+
+
+def suggestions_generation():
+    """ Поколение рекомендаций; начальное значение — время, как у лент """
+    return cache.get_or_set(GENERATION_KEY, int(time.time()), timeout=None)
+
+
+def bump_suggestions_generation():
+    try:
+        return cache.incr(GENERATION_KEY)
+    except ValueError:
+        return cache.get_or_set(GENERATION_KEY, int(time.time()),
+                                timeout=None)
+
+
+class FollowMatrix:
+    """
+    Матрица подписок в CSR. Пользователи пронумерованы плотно по
+    возрастанию id: ids[i] — id пользователя с номером i.
+    """
+
+    def __init__(self, ids, indptr, indices):
+        self.ids = ids
+        self.indptr = indptr
+        self.indices = indices
+        self.index = {user_id: i for i, user_id in enumerate(ids)}
+        self.t_indptr, self.t_indices = self.transpose()
+
+    @classmethod
+    def load(cls, chunk_size=10000):
+        """ Все подписки одним проходом по индексу (user, author) """
+        readers, authors = array("q"), array("q")
+        edges = (Follow.objects
+                 .order_by("user", "author")
+                 .values_list("user", "author")
+                 .iterator(chunk_size=chunk_size))
+        for user_id, author_id in edges:
+            readers.append(user_id)
+            authors.append(author_id)
+
+        ids = array("q", sorted(set(readers) | set(authors)))
+        index = {user_id: i for i, user_id in enumerate(ids)}
+        indptr = array("q", [0]) * (len(ids) + 1)
+        for user_id in readers:
+            indptr[index[user_id] + 1] += 1
+        for i in range(len(ids)):
+            indptr[i + 1] += indptr[i]
+        # рёбра уже отсортированы по читателю, а внутри — по автору
+        indices = array("q", (index[author_id] for author_id in authors))
+        return cls(ids, indptr, indices)
+
+    def transpose(self):
+        """ Подписчики авторов: сортировка подсчётом по столбцам """
+        size = len(self.ids)
+        t_indptr = array("q", [0]) * (size + 1)
+        for column in self.indices:
+            t_indptr[column + 1] += 1
+        for i in range(size):
+            t_indptr[i + 1] += t_indptr[i]
+        t_indices = array("q", [0]) * len(self.indices)
+        position = array("q", t_indptr[:size])
+        for row in range(size):
+            for column in self.row(row):
+                t_indices[position[column]] = row
+                position[column] += 1
+        return t_indptr, t_indices
+
+    @property
+    def edges(self):
+        return len(self.indices)
+
+    def row(self, i):
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def column(self, i):
+        return self.t_indices[self.t_indptr[i]:self.t_indptr[i + 1]]
+
+    def in_degree(self, i):
+        return self.t_indptr[i + 1] - self.t_indptr[i]
+
+    def digest(self, i):
+        """ Отпечаток набора подписок: по id авторов, а не номерам """
+        authors = array("q", (self.ids[j] for j in self.row(i)))
+        return hashlib.md5(authors.tobytes()).hexdigest()
+
+    def popular(self, count):
+        """ Номера самых читаемых авторов """
+        return heapq.nlargest(count, range(len(self.ids)), key=self.in_degree)
+
+
+class Scorer:
+    """
+    Строка оценок для одного читателя. Аккумулятор размером с матрицу
+    переиспользуется: после каждого читателя обнуляются только
+    затронутые ячейки.
+    """
+
+    def __init__(self, matrix):
+        self.matrix = matrix
+        self.scores = array("d", [0.0]) * len(matrix.ids)
+        self.touched = []
+
+    def add(self, column, weight):
+        if not self.scores[column]:
+            self.touched.append(column)
+        self.scores[column] += weight
+
+    def suggest(self, i, count):
+        """ Лучшие `count` пар (номер автора, оценка) для читателя i """
+        matrix = self.matrix
+        following = matrix.row(i)
+        sample = settings.SUGGESTIONS_COFOLLOW_SAMPLE
+        for author in following:
+            # друзья друзей: строка A·A
+            for candidate in matrix.row(author):
+                self.add(candidate, settings.SUGGESTIONS_FOF_WEIGHT)
+            # читатели того же автора: равномерная выборка из столбца,
+            # вес падает с популярностью автора
+            readers = matrix.column(author)
+            step = max(len(readers) // sample, 1)
+            weight = (settings.SUGGESTIONS_COFOLLOW_WEIGHT
+                      / math.sqrt(len(readers)))
+            for reader in readers[::step][:sample]:
+                if reader == i:
+                    continue
+                for candidate in matrix.row(reader):
+                    self.add(candidate, weight)
+
+        known = set(following)
+        known.add(i)
+        best = heapq.nlargest(
+            count,
+            (column for column in self.touched if column not in known),
+            key=lambda column: (self.scores[column],
+                                matrix.in_degree(column)))
+        result = [(column, self.scores[column]) for column in best]
+        for column in self.touched:
+            self.scores[column] = 0.0
+        self.touched.clear()
+        return result
+
+
+def compute_suggestions(full=False, count=None, batch_size=None,
+                        progress=None):
+    """
+    Пересчитать рекомендации. Без `full` — только для читателей, у
+    которых изменились подписки с прошлого запуска. Возвращает словарь
+    со статистикой запуска.
+    """
+    count = count or settings.SUGGESTIONS_COUNT
+    batch_size = batch_size or settings.SUGGESTIONS_BATCH_SIZE
+    started = time.monotonic()
+    matrix = FollowMatrix.load()
+    loaded = time.monotonic()
+    scorer = Scorer(matrix)
+
+    readers = [i for i in range(len(matrix.ids))
+               if matrix.indptr[i + 1] > matrix.indptr[i]]
+    computed = 0
+    for start in range(0, len(readers), batch_size):
+        batch = readers[start:start + batch_size]
+        user_ids = [matrix.ids[i] for i in batch]
+        known = {} if full else dict(
+            SuggestionState.objects.filter(user__in=user_ids)
+            .values_list("user", "digest"))
+        rows, states = [], []
+        for i, user_id in zip(batch, user_ids):
+            digest = matrix.digest(i)
+            if known.get(user_id) == digest:
+                continue
+            states.append(SuggestionState(user_id=user_id, digest=digest))
+            rows += [Suggestion(user_id=user_id, author_id=matrix.ids[column],
+                                score=score, rank=rank)
+                     for rank, (column, score)
+                     in enumerate(scorer.suggest(i, count))]
+        if states:
+            changed = [state.user_id for state in states]
+            with transaction.atomic():
+                Suggestion.objects.filter(user__in=changed).delete()
+                SuggestionState.objects.filter(user__in=changed).delete()
+                Suggestion.objects.bulk_create(rows)
+                SuggestionState.objects.bulk_create(states)
+            computed += len(states)
+        if progress is not None:
+            progress(start + len(batch), len(readers))
+
+    # отписавшиеся от всех: их строк в матрице нет, а старые рекомендации
+    # и отпечаток остались бы навсегда
+    reader_ids = {matrix.ids[i] for i in readers}
+    stale = [user_id for user_id in SuggestionState.objects
+             .values_list("user", flat=True).iterator()
+             if user_id not in reader_ids]
+    for start in range(0, len(stale), batch_size):
+        batch = stale[start:start + batch_size]
+        with transaction.atomic():
+            Suggestion.objects.filter(user__in=batch).delete()
+            SuggestionState.objects.filter(user__in=batch).delete()
+
+    # для тех, кто ещё ни на кого не подписан
+    popular = [matrix.ids[column] for column in matrix.popular(count)]
+    if computed or stale or cache.get(POPULAR_KEY) != popular:
+        cache.set(POPULAR_KEY, popular, None)
+        bump_suggestions_generation()
+    return {
+        "users": len(matrix.ids),
+        "edges": matrix.edges,
+        "readers": len(readers),
+        "computed": computed,
+        "cleared": len(stale),
+        "load_seconds": loaded - started,
+        "score_seconds": time.monotonic() - loaded,
+    }
+
+
+def suggestions_for(user, following=()):
+    """
+    Рекомендации для виджета: одна выборка по индексу (user, rank).
+    Авторы, на которых читатель подписался после расчёта, пропускаются.
+    Пока рекомендаций нет, показываются самые читаемые авторы.
+    """
+    following = set(following)
+    suggested = [suggestion.author for suggestion in
+                 Suggestion.objects.filter(user=user)
+                 .select_related("author").order_by("rank")]
+    if not suggested:
+        popular = cache.get(POPULAR_KEY) or []
+        authors = User.objects.in_bulk(popular)
+        suggested = [authors[author_id] for author_id in popular
+                     if author_id in authors]
+    return [author for author in suggested
+            if author.pk != user.pk and author.pk not in following]
@@ -0,0 +1,82 @@
+from django import template
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils.html import format_html
+
+from posts.images import FORMATS, display_size
+from posts.thumbnails import post_derivatives, schedule_thumbnails
+
+register = template.Library()
+
+PLACEHOLDER = ("data:image/svg+xml,%3Csvg xmlns='http://www.w3.org/2000/svg' "
+               "viewBox='0 0 {width} {height}'%3E%3Crect width='100%25' "
+               "height='100%25' fill='%23e9ecef'/%3E%3C/svg%3E")
+
+
+def srcset(derivatives):
+    return ", ".join(f"{default_storage.url(item.name)} {item.width}w"
+                     for item in derivatives)
+
+
+def preview_style(post):
+    """ Превью фоном под картинкой, пока та загружается """
+    if not post.image_placeholder:
+        return ""
+    return format_html("background: url({}) center / cover",
+                       post.image_placeholder)
+
+
+def box_size(post):
+    """ Размер карточки без обращения к файлу и копиям """
+    if post.image_width:
+        return display_size(post.image_width)
+    return settings.POST_IMAGE_ASPECT
+
+
+def picture(post, derivatives):
+    """
+    <picture> с WebP для браузеров, которые его понимают, и JPEG для
+    остальных; браузер выбирает ширину по srcset и sizes. Картинки
+    ниже первого экрана загружаются лениво, а место под ними занято
+    заранее: width и height заданы, превью видно сразу.
+    """
+    by_format = {image_format: [] for image_format in FORMATS}
+    for item in sorted(derivatives, key=lambda item: item.width):
+        by_format[item.format].append(item)
+    fallback = by_format["jpeg"]
+    largest = fallback[-1]
+    return format_html(
+        '<picture>'
+        '<source type="{}" srcset="{}" sizes="{}" />'
+        '<img class="card-img" src="{}" srcset="{}" sizes="{}" '
+        'width="{}" height="{}" loading="lazy" decoding="async" '
+        'style="{}" alt="" />'
+        '</picture>',
+        FORMATS["webp"][1], srcset(by_format["webp"]),
+        settings.POST_IMAGE_SIZES,
+        default_storage.url(largest.name), srcset(fallback),
+        settings.POST_IMAGE_SIZES, largest.width, largest.height,
+        preview_style(post))
+
+
+@register.simple_tag
+def post_image(post):
+    """
+    Картинка поста в нескольких ширинах и форматах, если копии уже
+    нарезаны, иначе превью того же размера и постановка нарезки
+    в очередь: рендеринг не ждёт Pillow. Копии берутся из пакета
+    страницы (prefetch_images), если пост пришёл из ленты.
+    """
+    if not post.image:
+        return ""
+    derivatives = post_derivatives(post)
+    if derivatives:
+        return picture(post, derivatives)
+
+    schedule_thumbnails(post)
+    width, height = box_size(post)
+    source = (post.image_placeholder
+              or PLACEHOLDER.format(width=width, height=height))
+    return format_html(
+        '<img class="card-img" src="{}" width="{}" height="{}" alt="" />',
+        source, width, height)
@@ -0,0 +1,175 @@
+import hashlib
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+
+from .feed_cache import bump_feed_generation
+from .images import build_derivatives, describe_image
+from .models import ImageDerivative, Post
+from .workers import submit
+
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = "thumbnail:pending:{id}:{version}"
+DERIVATIVES_KEY = "image:derivatives:{digest}"
+
+
+def derivatives_key(name):
+    digest = hashlib.md5(name.encode()).hexdigest()
+    return DERIVATIVES_KEY.format(digest=digest)
+
+
+def load_derivatives(names):
+    """
+    Имя файла -> копии для srcset для всех `names` сразу: один get_many
+    к кешу и один запрос к базе для промахов. Пустой результат (копии
+    ещё режутся) не кешируется, иначе заглушка продержалась бы до таймаута.
+    """
+    keys = {derivatives_key(name): name for name in set(names)}
+    found = {keys[key]: derivatives
+             for key, derivatives in cache.get_many(keys).items()}
+    missing = set(keys.values()) - set(found)
+    if missing:
+        loaded = defaultdict(list)
+        for derivative in ImageDerivative.objects.filter(source__in=missing):
+            loaded[derivative.source].append(derivative)
+        cache.set_many({derivatives_key(name): derivatives
+                        for name, derivatives in loaded.items()},
+                       settings.POST_IMAGE_CACHE_TIMEOUT)
+        found.update(loaded)
+    return found
+
+
+class PageImages:
+    """
+    Копии картинок всех постов страницы. Загружаются при первом
+    обращении одним пакетом, поэтому если все карточки взяты из кеша
+    фрагментов, обращений нет вовсе.
+    """
+
+    def __init__(self, posts):
+        self.names = [post.image.name for post in posts if post.image]
+        self.loaded = None
+
+    def get(self, name):
+        if self.loaded is None:
+            self.loaded = load_derivatives(self.names)
+        return self.loaded.get(name, [])
+
+
+def prefetch_images(posts):
+    """ Связать посты страницы с общим пакетом копий картинок """
+    posts = list(posts)
+    batch = PageImages(posts)
+    for post in posts:
+        post.page_images = batch
+    return posts
+
+
+def post_derivatives(post):
+    batch = getattr(post, "page_images", None)
+    if batch is None:
+        return load_derivatives([post.image.name]).get(post.image.name, [])
+    return batch.get(post.image.name)
+
+
+def generate_thumbnails(post_id, name):
+    """
+    Нарезать производные картинки для srcset. Выполняется в процессе
+    пула: Pillow занимает процессор, а не поток запроса. После успеха
+    версия поста растёт, и закешированная карточка с заглушкой устаревает.
+    Постам, сохранённым до появления превью, оно дописывается здесь же.
+    """
+    try:
+        if not ImageDerivative.objects.filter(source=name).exists():
+            derivatives = build_derivatives(name)
+            with transaction.atomic():
+                ImageDerivative.objects.filter(source=name).delete()
+                ImageDerivative.objects.bulk_create(derivatives)
+        describe_stored_image(name)
+    except Exception:
+        logger.exception("Не удалось нарезать копии картинки %s", name)
+        return False
+    Post.objects.filter(pk=post_id).bump_version()
+    return True
+
+
+def describe_stored_image(name):
+    """
+    Дописать размер и превью постам с картинкой `name`, сохранённым
+    до появления этих полей. Возвращает число обновлённых постов.
+    """
+    undescribed = Post.objects.filter(image=name, image_placeholder="")
+    if not undescribed.exists():
+        return 0
+    with default_storage.open(name) as original:
+        width, height, preview = describe_image(original)
+    return undescribed.update(image_width=width, image_height=height,
+                              image_placeholder=preview,
+                              version=F("version") + 1)
+
+
+def describe_stored_images():
+    """
+    Превью для всех старых постов. Возвращает (обновлено постов,
+    пропущено файлов): отсутствующий или битый файл не мешает остальным.
+    """
+    names = (Post.objects.filter(image_placeholder="")
+             .exclude(image="").exclude(image__isnull=True)
+             .order_by().values_list("image", flat=True).distinct())
+    updated = skipped = 0
+    for name in names.iterator():
+        try:
+            updated += describe_stored_image(name)
+        except (OSError, SuspiciousFileOperation):
+            logger.warning("Не удалось прочитать картинку %s", name)
+            skipped += 1
+    return updated, skipped
+
+
+def _finished(future):
+    if not future.cancelled() and future.exception() is None \
+            and future.result():
+        bump_feed_generation()
+
+
+def schedule_thumbnails(post):
+    """
+    Поставить нарезку копий картинки поста в очередь пула. Повторная
+    постановка той же версии поста откладывается на POST_THUMBNAIL_RETRY.
+    """
+    if not post.image:
+        return
+    key = PENDING_KEY.format(id=post.pk, version=post.version)
+    if not cache.add(key, True, settings.POST_THUMBNAIL_RETRY):
+        return
+    if not settings.POST_IMAGE_WORKERS:
+        if generate_thumbnails(post.pk, post.image.name):
+            bump_feed_generation()
+        return
+    future = submit("posts.thumbnails.generate_thumbnails",
+                    post.pk, post.image.name,
+                    workers=settings.POST_IMAGE_WORKERS)
+    future.add_done_callback(_finished)
+
+
+def delete_image_files(name):
+    """ Удалить картинку и её копии для srcset """
+    storage = Post._meta.get_field("image").storage
+    derivatives = ImageDerivative.objects.filter(source=name)
+    names = list(derivatives.values_list("name", flat=True)) + [name]
+    derivatives.delete()
+    cache.delete(derivatives_key(name))
+    for file_name in names:
+        try:
+            storage.delete(file_name)
+        except SuspiciousFileOperation:
+            # путь вне MEDIA_ROOT: такой файл хранилищу не принадлежит
+            pass
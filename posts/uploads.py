@@ -0,0 +1,127 @@
+"""
+Загрузка картинок с ограниченной памятью: тело запроса пишется во
+временный файл не дальше предела, а декодирование, поворот по EXIF и
+удаление метаданных идут в пуле процессов, а не в процессе запроса.
+"""
+import os
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import (StopUpload,
+                                             TemporaryFileUploadHandler)
+from PIL import Image, ImageOps
+
+from .images import placeholder
+from .workers import submit
+
+
+# расширение и параметры сохранения для форматов, которые остаются как есть
+SAVE_OPTIONS = {
+    "JPEG": (".jpg", {"quality": 90, "optimize": True}),
+    "PNG": (".png", {"optimize": True}),
+    "WEBP": (".webp", {"quality": 90}),
+}
+# остальные форматы (GIF, BMP, TIFF…) сохраняются как JPEG
+DEFAULT_FORMAT = "JPEG"
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """
+    Файл всегда пишется на диск, в памяти — только текущий кусок.
+    После POST_IMAGE_MAX_BYTES разбор тела прерывается: остаток не
+    читается, а имя поля попадает в rejected_uploads(request), чтобы
+    форма сообщила о превышении предела.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.written = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.written += len(raw_data)
+        if self.written > settings.POST_IMAGE_MAX_BYTES:
+            if self.request is not None:
+                rejected_uploads(self.request).add(self.field_name)
+            raise StopUpload(connection_reset=True)
+        self.file.write(raw_data)
+
+
+def rejected_uploads(request):
+    """ Поля, файлы которых отброшены LimitedUploadHandler """
+    if not hasattr(request, "rejected_uploads"):
+        request.rejected_uploads = set()
+    return request.rejected_uploads
+
+
+def reduced_size(size, max_side):
+    """ Размер со стороной не больше max_side и теми же пропорциями """
+    width, height = size
+    scale = min(max_side / max(width, height), 1)
+    return max(round(width * scale), 1), max(round(height * scale), 1)
+
+
+def normalize_image(source_path, target_path, max_side):
+    """
+    Повернуть по EXIF, уменьшить до max_side и пересохранить без
+    метаданных. JPEG декодируется сразу в уменьшенном масштабе (draft),
+    поэтому память процесса зависит от max_side, а не от исходника.
+    Выполняется в пуле. Возвращает (формат, ширина, высота, превью).
+    """
+    with Image.open(source_path) as image:
+        image_format = image.format if image.format in SAVE_OPTIONS \
+            else DEFAULT_FORMAT
+        # масштаб 1/2…1/8, при котором картинка не меньше нужной
+        image.draft(None, reduced_size(image.size, max_side))
+        # in_place не держит в памяти вторую копию несжатых пикселей
+        ImageOps.exif_transpose(image, in_place=True)
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        # без exif= и pnginfo= метаданные не переносятся
+        image.save(target_path, image_format, **SAVE_OPTIONS[image_format][1])
+        return image_format, image.width, image.height, placeholder(image)
+
+
+def normalize_upload(upload):
+    """
+    Обработать загруженный файл в пуле и вернуть новый временный файл.
+    Процесс запроса только копирует байты и ждёт результата.
+    """
+    source = None
+    if hasattr(upload, "temporary_file_path"):
+        source_path = upload.temporary_file_path()
+    else:
+        source = TemporaryUploadedFile(upload.name, upload.content_type,
+                                       upload.size, upload.charset)
+        for chunk in upload.chunks():
+            source.write(chunk)
+        source.flush()
+        source_path = source.temporary_file_path()
+
+    stem = os.path.splitext(upload.name)[0]
+    result = TemporaryUploadedFile(stem, None, 0, None)
+    args = (source_path, result.temporary_file_path(),
+            settings.POST_IMAGE_MAX_SIDE)
+    try:
+        if settings.POST_IMAGE_WORKERS:
+            image_format, width, height, preview = submit(
+                "posts.uploads.normalize_image", *args,
+                workers=settings.POST_IMAGE_WORKERS,
+            ).result(timeout=settings.POST_IMAGE_TIMEOUT)
+        else:
+            image_format, width, height, preview = normalize_image(*args)
+    except BaseException:
+        result.close()
+        raise
+    finally:
+        if source is not None:
+            source.close()
+
+    extension = SAVE_OPTIONS[image_format][0]
+    result.name = f"{stem}{extension}"
+    result.content_type = Image.MIME[image_format]
+    result.size = os.path.getsize(result.temporary_file_path())
+    result.image_size = (width, height)
+    result.placeholder = preview
+    result.seek(0)
+    return result
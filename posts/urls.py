@@ -7,7 +7,9 @@ urlpatterns = [
     path("", views.index, name="index"),
 
     path("follow/", views.follow_index, name="follow_index"),
+    path("follow/bulk/", views.follow_bulk, name="follow_bulk"),
     path("group/<slug:slug>/", views.group_posts, name="group"),
+    path("search/", views.search, name="search"),
 
     path("new/", views.new_post, name="new_post"),
     
@@ -15,8 +17,12 @@ urlpatterns = [
     path("<str:username>/<int:post_id>/", views.post_view, name='post'),
     path("<str:username>/<int:post_id>/edit/", views.post_edit, name="post_edit"),
 
+    path("<str:username>/<int:post_id>/comments/", views.post_comments,
+         name="post_comments"),
     path("<username>/<int:post_id>/comment", views.add_comment, name="add_comment"),  
 
+    path("<str:username>/followers/", views.followers, name="followers"),
+    path("<str:username>/following/", views.following, name="following"),
     path("<str:username>/follow/", views.profile_follow, name="profile_follow"), 
     path("<str:username>/unfollow/", views.profile_unfollow, name="profile_unfollow"), 
     
@@ -1,16 +1,106 @@
+from django.conf import settings
+from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.urls import reverse
+from django.views.decorators.http import require_POST
 from django.views.generic import CreateView
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
-from django.views.decorators.cache import cache_page
+from django.db import transaction
 
-from .models import Post, Group, Follow
+from .models import Post, Group, Follow, TimelineEntry, UserStats
 from .forms import PostForm, CommentForm
+from .conditional import (feed_condition, follow_condition,
+                          follow_list_condition, post_condition,
+                          profile_condition)
+from .feed_cache import cache_feed
+from .follow_graph import follow_graph
+from .paginator import CursorPaginator, MergedCursorPaginator
+from .search import search_posts
+from .suggestions import suggestions_for
+from .thumbnails import prefetch_images, schedule_thumbnails
+from .uploads import rejected_uploads
 
 from django.contrib.auth.models import User
 
 
+POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 50
+USERS_PER_PAGE = 50
+# стабильный порядок ленты: id различает посты с одинаковой датой
+FEED_ORDERING = ("-pub_date", "-id")
+# тот же порядок по копиям полей поста в материализованной ленте
+TIMELINE_ORDERING = ("-pub_date", "-post_id")
+# комментарии читаются от старых к новым, как переписка
+COMMENT_ORDERING = ("created", "id")
+
+
+def timeline_posts(rows):
+    """
+    Посты страницы ленты подписок одним запросом.
+    Строки — записи материализованной ленты или посты авторов,
+    которые читаются при выдаче.
+    """
+    ids = [row.post_id if isinstance(row, TimelineEntry) else row.pk
+           for row in rows]
+    # пост мог попасть в ленту до того, как автор стал популярным
+    ids = list(dict.fromkeys(ids))
+    posts = Post.objects.feed().in_bulk(ids)
+    return prefetch_images(posts[post_id] for post_id in ids
+                           if post_id in posts)
+
+
+def paginate(request, post_list):
+    """
+    Постраничный вывод ленты.
+    По умолчанию курсорный (?after=/?before=): без OFFSET и COUNT(*).
+    Номерной Paginator включается только явно параметром ?page=
+    """
+    if "page" in request.GET:
+        paginator = Paginator(post_list.order_by(*FEED_ORDERING),
+                              POSTS_PER_PAGE)
+        page = paginator.get_page(request.GET.get("page"))
+        page.object_list = prefetch_images(page.object_list)
+        return paginator, page
+
+    paginator = CursorPaginator(post_list, POSTS_PER_PAGE,
+                                ordering=FEED_ORDERING,
+                                transform=prefetch_images)
+    page = paginator.get_page(after=request.GET.get("after"),
+                              before=request.GET.get("before"))
+    return paginator, page
+
+
+def paginate_comments(request, comments):
+    """
+    Страница комментариев по курсору ?after=: автор в том же запросе,
+    поэтому число запросов не зависит ни от числа комментариев,
+    ни от глубины страницы
+    """
+    paginator = CursorPaginator(comments.select_related("author"),
+                                COMMENTS_PER_PAGE, ordering=COMMENT_ORDERING)
+    return paginator.get_page(after=request.GET.get("after"))
+
+
+def post_with_author(username, post_id):
+    return get_object_or_404(
+        Post.objects.feed().select_related("author__stats"),
+        pk=post_id, author__username=username)
+
+
+def post_context(request, post, form):
+    """
+    Контекст страницы поста: автор со статистикой приходит вместе
+    с постом (post_with_author), комментарии — первой страницей
+    """
+    comments = post.comments.all()
+    return {"user_name": post.author,
+            "stats": UserStats.objects.for_user(post.author),
+            "comments": comments,
+            "comment_page": paginate_comments(request, comments),
+            "form": form,
+            "post": post}
+
 
 def page_not_found(request, exception):
     """ Страница не найдена, ошибка 404 """
@@ -27,33 +117,28 @@ def server_error(request):
 
 
 
-@cache_page(20)
+@feed_condition
+@cache_feed
 def index(request):
     """ Главная страница сайта """
-    post_list = Post.objects.order_by("-pub_date").all()
-    paginator = Paginator(post_list, 10)
-
-    # переменная в URL с номером запрошенной страницы
-    page_number = request.GET.get("page")
-    # получить записи с нужным смещением
-    page = paginator.get_page(page_number)
+    post_list = Post.objects.feed()
+    paginator, page = paginate(request, post_list)
 
     return render(request, "index.html", 
             {"page": page, 
             "paginator": paginator})
 
 
+@feed_condition
+@cache_feed
 def group_posts(request, slug):
     """ Отображение групп """
     group = get_object_or_404(Group, slug=slug)  
     # функция get_object_or_404 получает по заданным критериям объект из БД
     # или возвращает сообщение об ошибке, если объект не найден
     
-    group_list = group.posts.order_by("-pub_date").all()
-    paginator = Paginator(group_list, 10)
-
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    group_list = Post.objects.feed().filter(group=group)
+    paginator, page = paginate(request, group_list)
 
     context = {"page": page, 
               "paginator": paginator,
@@ -62,18 +147,29 @@ def group_posts(request, slug):
     return render(request, "group.html", context)
 
 
+@feed_condition
+def search(request):
+    """ Поиск по тексту постов и названиям сообществ """
+    query = request.GET.get("q", "").strip()
+    page = search_posts(query, after=request.GET.get("after"),
+                        per_page=POSTS_PER_PAGE)
+    return render(request, "search.html", {"query": query, "page": page})
+
+
 @login_required
 def new_post(request):
     """ Добавить новую запись, если пользователь авторизован """
     if request.method == "POST":
         form = PostForm(request.POST or None, 
-                    files=request.FILES or None)
+                    files=request.FILES or None,
+                    rejected=rejected_uploads(request))
         
         if form.is_valid():
             post = form.save(commit=False)
             #  вернет объект, который еще не сохранен в БД.
             post.author = request.user
             post.save()
+            transaction.on_commit(lambda: schedule_thumbnails(post))
             return redirect("/")
         return render(request, "new_post.html", {"form": form})
     form = PostForm()
@@ -87,36 +183,91 @@ class PostView(CreateView):
     template_name = "new_post"
 
 
+@profile_condition
 def profile(request, username):
     """ Страница со всеми постами пользователя """
-    user_name = get_object_or_404(User, username=username)
-    user_posts =  user_name.posts.all()
-    following = Follow.objects.filter(user=request.user.id, author=user_name.id).all()
+    user_name = get_object_or_404(User.objects.select_related("stats"),
+                                  username=username)
+    stats = UserStats.objects.for_user(user_name)
+    user_posts = Post.objects.feed().filter(author=user_name)
+    following = follow_graph.is_following(request.user.id, user_name.id)
 
-    paginator = Paginator(user_posts, 10)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
+    paginator, page = paginate(request, user_posts)
 
     return render(request, 'profile.html',
             {"page": page, 
             "paginator": paginator, 
             "following": following,
+            "stats": stats,
             "user_name": user_name,
             "user_posts": user_posts})
  
 
 
+def follow_list(request, username, lookup, person):
+    """
+    Подписки по курсору ?after=/?before= на их id: новые сверху, порядок
+    стабилен, стоимость не зависит от глубины страницы. `lookup` — чьи
+    подписки (author — подписчики, user — подписки), `person` — кого
+    показывать; он приходит в том же запросе.
+    """
+    user_name = get_object_or_404(User.objects.select_related("stats"),
+                                  username=username)
+    rows = (Follow.objects
+            .filter(**{lookup: user_name})
+            .select_related(person))
+    paginator = CursorPaginator(
+        rows, USERS_PER_PAGE, ordering=("-id",),
+        transform=lambda page: [getattr(row, person) for row in page])
+    page = paginator.get_page(after=request.GET.get("after"),
+                              before=request.GET.get("before"))
+    return render(request, "follow_list.html",
+                  {"user_name": user_name,
+                   "stats": UserStats.objects.for_user(user_name),
+                   "paginator": paginator,
+                   "page": page,
+                   "followers": lookup == "author"})
+
+
+@follow_list_condition
+def followers(request, username):
+    """ Кто подписан на пользователя """
+    return follow_list(request, username, lookup="author", person="user")
+
+
+@follow_list_condition
+def following(request, username):
+    """ На кого подписан пользователь """
+    return follow_list(request, username, lookup="user", person="author")
+
+
+@post_condition
 def post_view(request, username, post_id):
     """ Страница просмотра отдельного поста """
-    user_name = get_object_or_404(User, username=username)
-    post =  get_object_or_404(Post, pk=post_id)
-    comments = post.comments.all()
-    form = CommentForm()
-    return render(request, 'post.html', 
-            {"user_name": user_name, 
-            "comments": comments,
-            "form" : form,
-            "post": post})
+    post = post_with_author(username, post_id)
+    return render(request, "post.html",
+                  post_context(request, post, CommentForm()))
+
+
+def post_comments(request, username, post_id):
+    """
+    Следующая страница комментариев для подгрузки: HTML-фрагмент
+    или JSON при ?format=json
+    """
+    post = get_object_or_404(Post.objects.select_related("author"),
+                             pk=post_id, author__username=username)
+    page = paginate_comments(request, post.comments.all())
+    if request.GET.get("format") == "json":
+        return JsonResponse({
+            "comments": [{"id": comment.id,
+                          "author": comment.author.username,
+                          "text": comment.text,
+                          "created": comment.created}
+                         for comment in page],
+            "next": page.next_cursor,
+        })
+    return render(request, "comment_list.html",
+                  {"post": post, "comment_page": page})
 
 
 @login_required
@@ -131,11 +282,14 @@ def post_edit(request, username, post_id):
     
     form = PostForm(request.POST or None, 
                     files=request.FILES or None, 
-                    instance=edited_post)
+                    instance=edited_post,
+                    rejected=rejected_uploads(request))
     
     if request.method == "POST":
         if form.is_valid():
-            form.save()
+            post = form.save()
+            Post.objects.filter(pk=edited_post.pk).bump_version()
+            transaction.on_commit(lambda: schedule_thumbnails(post))
             return redirect("post", username, post_id)
     
     return render(request, "new_post.html",
@@ -148,74 +302,90 @@ def post_edit(request, username, post_id):
 @login_required
 def add_comment(request, username, post_id):
     """ Добавить комментарий """
-    user = get_object_or_404(User, username=username)
-    post = get_object_or_404(Post, id = post_id)
-    comments = post.comments.all()
-    
-    if request.method == "POST":
-        form = CommentForm(request.POST or None)
-        
-        if form.is_valid():
-            comment = form.save(commit=False)
-            comment.author = request.user
-            comment.post = post
-            form.save()
-            return redirect("post", username, post_id)
-        
-        return render(request, "post.html",
-                {"form": form,
-                "user": user,
-                "post": post,
-                "comments": comments})
-    
-    form = CommentForm()
-    return render(request, "post.html",
-                {"form": form,
-                "user": user,
-                "post": post,
-                "comments": comments})            
+    post = post_with_author(username, post_id)
+    form = CommentForm(request.POST or None)
+
+    if request.method == "POST" and form.is_valid():
+        comment = form.save(commit=False)
+        comment.author = request.user
+        comment.post = post
+        form.save()
+        return redirect("post", username, post_id)
+
+    return render(request, "post.html", post_context(request, post, form))
 
 
 @login_required
+@follow_condition
 def follow_index(request):
     """ Страница со всеми подписками пользователя """
-    follow = User.objects.get(id=request.user.id).follower.all().values_list("author")
-    post_list = Post.objects.filter(author__in=follow).order_by("-pub_date")
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
-    
-    return render(request, "follow.html", 
-                {"paginator": paginator, 
+    pull_authors = TimelineEntry.objects.pull_authors(request.user)
+
+    if "page" in request.GET:
+        post_list = TimelineEntry.objects.posts_for(request.user, pull_authors)
+        paginator, page = paginate(request, post_list)
+    else:
+        # материализованная лента — проход по индексу (user, -pub_date),
+        # посты популярных авторов — по индексу (author, -pub_date)
+        sources = [(TimelineEntry.objects
+                     .filter(user=request.user)
+                     .only("pub_date", "post"), TIMELINE_ORDERING)]
+        sources += [(Post.objects.filter(author=author_id)
+                     .only("pub_date", "id"), FEED_ORDERING)
+                    for author_id in pull_authors]
+        paginator = MergedCursorPaginator(sources, POSTS_PER_PAGE,
+                                          transform=timeline_posts)
+        page = paginator.get_page(after=request.GET.get("after"),
+                                  before=request.GET.get("before"))
+
+    suggestions = suggestions_for(request.user,
+                                  follow_graph.following(request.user.pk))
+    return render(request, "follow.html",
+                {"paginator": paginator,
                 "page": page,
-                "post_list": post_list}) 
+                "suggestions": suggestions})
 
 
 @login_required
 def profile_follow(request, username):
-    """ Подписаться на автора """
-    user = get_object_or_404(User, username=request.user)
+    """ Подписаться на автора; повторная подписка ничего не меняет """
     author = get_object_or_404(User, username=username)
-    
-    if user == author:
-        return redirect("profile", username)
-    
-    follow = Follow.objects.filter(user=user, author=author)
-    if len(follow) > 0:
-        return redirect("profile", username)
-    
-    Follow.objects.create(user=user, author=author)
-    
-    return redirect("profile", username)        
+    Follow.objects.follow(request.user.pk, [author.pk])
+    return redirect("profile", username)
 
 
 @login_required
 def profile_unfollow(request, username):
     """ Отписаться от автора """
-    user = get_object_or_404(User, username=request.user)
     author = get_object_or_404(User, username=username)
-    follow = Follow.objects.filter(user=user, author=author)
+    Follow.objects.unfollow(request.user.pk, [author.pk])
+    return redirect("profile", username)
 
-    follow.delete()
 
-    return redirect("profile", username)  
\ No newline at end of file
+@login_required
+@require_POST
+def follow_bulk(request):
+    """
+    Подписаться или отписаться от многих авторов одним запросом, например
+    при импорте подписок: username повторяется, action — follow или unfollow.
+    Отвечает JSON со списками изменившихся и ненайденных имён.
+    """
+    usernames = list(dict.fromkeys(request.POST.getlist("username")))
+    action = request.POST.get("action", "follow")
+    if action not in ("follow", "unfollow"):
+        return JsonResponse({"error": "action: follow или unfollow"},
+                            status=400)
+    if len(usernames) > settings.FOLLOW_BULK_LIMIT:
+        return JsonResponse(
+            {"error": f"Не больше {settings.FOLLOW_BULK_LIMIT} авторов"},
+            status=400)
+
+    authors = dict(User.objects.filter(username__in=usernames)
+                   .values_list("pk", "username"))
+    write = getattr(Follow.objects, action)
+    changed = write(request.user.pk, list(authors))
+    found = set(authors.values())
+    return JsonResponse({
+        "changed": [authors[author_id] for author_id in changed],
+        "unknown": [name for name in usernames if name not in found],
+    })
@@ -0,0 +1,54 @@
+"""
+Пул процессов для работы, которая занимает процессор (Pillow и т. п.).
+
+Процессы запускаются через spawn: fork скопировал бы открытые соединения
+с базой родителя. Поэтому этот модуль не импортирует модели — дочерний
+процесс импортирует его до django.setup(), а задачу находит по пути.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+
+_executors = {}
+
+
+def _setup(settings_module):
+    import django
+
+    os.environ["DJANGO_SETTINGS_MODULE"] = settings_module
+    django.setup()
+
+
+def _call(path, args):
+    from django.utils.module_loading import import_string
+
+    return import_string(path)(*args)
+
+
+def get_executor(max_workers):
+    """ Пул создаётся при первой задаче и живёт до конца процесса """
+    if max_workers not in _executors:
+        _executors[max_workers] = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=get_context("spawn"),
+            initializer=_setup,
+            initargs=(os.environ["DJANGO_SETTINGS_MODULE"],))
+    return _executors[max_workers]
+
+
+def submit(path, *args, workers):
+    """ Выполнить функцию по пути `path` в пуле из `workers` процессов """
+    return get_executor(workers).submit(_call, path, args)
+
+
+def run_isolated(path, *args, timeout=None):
+    """
+    Выполнить функцию в новом процессе и дождаться результата:
+    нужно, чтобы замеры пиковой памяти не смешивались между запусками
+    """
+    with ProcessPoolExecutor(
+            max_workers=1, mp_context=get_context("spawn"),
+            initializer=_setup,
+            initargs=(os.environ["DJANGO_SETTINGS_MODULE"],)) as executor:
+        return executor.submit(_call, path, args).result(timeout=timeout)
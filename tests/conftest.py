@@ -1,4 +1,37 @@
+import pytest
+
 pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+@pytest.fixture(autouse=True)
+def inline_image_workers(settings):
+    """ Картинки обрабатываются в потоке теста: тестовая база не видна пулу """
+    settings.POST_IMAGE_WORKERS = 0
+
+
+@pytest.fixture(autouse=True)
+def fresh_follow_graph():
+    """ Граф подписок живёт в процессе, а база откатывается после теста """
+    from posts.follow_graph import follow_graph
+
+    follow_graph.clear()
+    yield
+    follow_graph.clear()
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(settings, tmp_path_factory):
+    """ Файл кеша на каждый тест: общий кеш проекта не трогается """
+    settings.CACHES = {
+        'default': dict(settings.CACHES['default'],
+                        LOCATION=str(tmp_path_factory.mktemp('cache') / 'cache.sqlite3')),
+    }
+
+
+@pytest.fixture(autouse=True)
+def isolated_media(settings, tmp_path_factory):
+    """ Загруженные в тестах картинки не попадают в media/ проекта """
+    settings.MEDIA_ROOT = str(tmp_path_factory.mktemp('media'))
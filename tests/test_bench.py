@@ -0,0 +1,60 @@
+import json
+from io import StringIO
+
+import pytest
+
+from django.core.management import call_command
+
+
+class TestBenchCommand:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_bench_reports_every_view(self):
+        from posts.models import Post, TimelineEntry, UserStats
+
+        output = StringIO()
+        call_command('bench', users=15, posts=60, comments=30, groups=3,
+                     follows_per_user=5, requests=3, in_place=True,
+                     json='-', stdout=output)
+        report = json.loads(output.getvalue())
+
+        assert report['dataset']['posts'] == 60 == \
+            Post.objects.exclude(text__startswith='Пост bench').count(), \
+            'Проверьте, что команда bench создаёт заданное число постов'
+        assert {'index', 'index_deep_cursor', 'index_deep_page', 'group',
+                'profile', 'followers', 'following', 'post', 'post_comments',
+                'post_comments_json', 'follow', 'search'} <= set(report['views']), \
+            'Проверьте, что bench прогоняет все страницы приложения'
+        assert {'new_post', 'post_edit', 'add_comment', 'profile_follow',
+                'profile_unfollow', 'follow_bulk'} <= set(report['views']), \
+            'Проверьте, что bench прогоняет и изменяющие представления'
+        assert Post.objects.filter(text__startswith='Пост bench').exists()
+        for name, row in report['views'].items():
+            assert row['p50_ms'] <= row['p95_ms'] <= row['p99_ms'], \
+                f'Проверьте порядок процентилей для {name}'
+            assert row['queries_max'] > 0 and row['peak_kb'] > 0
+        assert UserStats.objects.count() == 15, \
+            'Проверьте, что после наполнения пересчитываются счётчики'
+        assert TimelineEntry.objects.exists(), \
+            'Проверьте, что после наполнения перестраиваются ленты подписок'
+
+
+class TestBenchCacheCommand:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_bench_cache_compares_backends(self):
+        output = StringIO()
+        call_command('bench_cache', operations=50, processes=2, keys=20,
+                     json='-', stdout=output)
+        report = json.loads(output.getvalue())
+
+        assert set(report['backends']) == {'locmem', 'db', 'sqlite'}, \
+            'Проверьте, что bench_cache сравнивает LocMem, базу и SQLite'
+        for name, rows in report['backends'].items():
+            assert {'get_int', 'set_page_32kb', 'get_miss', 'incr'} <= set(rows)
+            for operation, row in rows.items():
+                assert 0 < row['p50_us'] <= row['p95_us'] <= row['p99_us'], \
+                    f'Проверьте порядок процентилей для {name}.{operation}'
+        assert report['shared']['processes'] == 2
+        assert report['shared']['hit_rate'] > 0, \
+            'Проверьте, что процессы видят записи друг друга'
@@ -0,0 +1,67 @@
+import pytest
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+def add_comments(post, count):
+    from posts.models import Comment
+
+    authors = [get_user_model().objects.get_or_create(username=f'Reader{i}')[0]
+               for i in range(3)]
+    Comment.objects.bulk_create(
+        [Comment(post=post, author=authors[i % 3], text=f'Комментарий {i}')
+         for i in range(count)])
+
+
+def post_queries(client, url):
+    cache.clear()
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+    assert response.status_code == 200
+    return response, len(queries.captured_queries)
+
+
+class TestCommentPages:
+
+    @pytest.mark.django_db
+    def test_constant_queries(self, client, post, settings):
+        url = f'/{post.author.username}/{post.id}/'
+        add_comments(post, 3)
+        _, small = post_queries(client, url)
+        add_comments(post, 120)
+        response, large = post_queries(client, url)
+        assert large == small, \
+            'Проверьте, что число запросов не зависит от числа комментариев'
+        assert len(response.context['comment_page']) == 50, \
+            'Проверьте, что на странице поста только первая страница комментариев'
+        assert 'comments-more' in response.content.decode()
+
+    @pytest.mark.django_db
+    def test_fragment_pages(self, client, post):
+        add_comments(post, 120)
+        url = f'/{post.author.username}/{post.id}/comments/'
+        seen, after = [], ''
+        while after is not None:
+            response = client.get(url, {'after': after, 'format': 'json'})
+            data = response.json()
+            seen += [comment['text'] for comment in data['comments']]
+            after = data['next']
+        assert seen == [f'Комментарий {i}' for i in range(120)], \
+            'Проверьте, что страницы комментариев идут по порядку без пропусков'
+
+        response, queries = post_queries(client, url)
+        assert queries == 2, \
+            'Проверьте, что фрагмент строится двумя запросами: пост и страница'
+        content = response.content.decode()
+        assert content.count('class="media mb-4"') == 50
+        assert '<html' not in content, \
+            'Проверьте, что без format=json отдаётся HTML-фрагмент'
+
+    @pytest.mark.django_db
+    def test_wrong_author(self, client, post):
+        other = get_user_model().objects.create_user(username='Other')
+        response = client.get(f'/{other.username}/{post.id}/comments/')
+        assert response.status_code == 404
@@ -0,0 +1,79 @@
+import pytest
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+
+def author_client(user):
+    client = Client()
+    client.force_login(user)
+    return client
+
+
+def revalidate(client, url, etag):
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    return response, len(queries.captured_queries)
+
+
+class TestConditionalGet:
+
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        cache.clear()
+
+    # поколение лент меняется после коммита
+    @pytest.mark.django_db(transaction=True)
+    def test_index(self, client, user, post):
+        response = client.get('/')
+        assert response.has_header('ETag') and response.has_header('Last-Modified'), \
+            'Проверьте, что лента отдаёт ETag и Last-Modified'
+
+        not_modified, queries = revalidate(client, '/', response['ETag'])
+        assert not_modified.status_code == 304, \
+            'Проверьте, что неизменившаяся лента отвечает 304'
+        assert queries == 0, \
+            'Проверьте, что ETag ленты считается без запросов к базе'
+        not_modified = client.get(
+            '/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        assert not_modified.status_code == 304
+
+        author_client(user).post('/new/', data={'text': 'Новый пост'})
+        assert client.get('/', HTTP_IF_NONE_MATCH=response['ETag']) \
+            .status_code == 200, 'Проверьте, что после нового поста ETag меняется'
+
+        assert not author_client(user).get('/').has_header('Last-Modified'), \
+            'Проверьте, что авторизованным Last-Modified не отдаётся'
+
+    @pytest.mark.django_db
+    def test_post_page(self, client, user, post):
+        url = f'/{post.author.username}/{post.id}/'
+        etag = client.get(url)['ETag']
+
+        response, queries = revalidate(client, url, etag)
+        assert response.status_code == 304 and queries == 1, \
+            'Проверьте, что ETag поста считается одним запросом'
+
+        author_client(user).post(f'{url}comment', data={'text': 'Комментарий'})
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200, \
+            'Проверьте, что новый комментарий меняет ETag поста'
+        assert client.get(f'/Nobody/{post.id}/').status_code == 404
+
+    # журнал подписок пишется после коммита
+    @pytest.mark.django_db(transaction=True)
+    def test_follow_changes_etag(self, client, user):
+        reader = get_user_model().objects.create_user(username='Reader')
+        client.force_login(reader)
+        profile = client.get(f'/{user.username}/')['ETag']
+        timeline = client.get('/follow/')['ETag']
+        assert client.get('/follow/', HTTP_IF_NONE_MATCH=timeline) \
+            .status_code == 304
+
+        client.get(f'/{user.username}/follow/')
+        assert client.get(f'/{user.username}/', HTTP_IF_NONE_MATCH=profile) \
+            .status_code == 200, 'Проверьте, что подписка меняет ETag профиля'
+        assert client.get('/follow/', HTTP_IF_NONE_MATCH=timeline) \
+            .status_code == 200, 'Проверьте, что подписка меняет ETag ленты подписок'
@@ -0,0 +1,60 @@
+import pytest
+
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+
+
+class TestBulkFactories:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_bulk_dataset(self):
+        from posts import factories
+        from posts.models import Comment, Follow, Post
+
+        user_ids = factories.bulk_users(50)
+        group_ids = factories.bulk_groups(3)
+        with CaptureQueriesContext(connection) as captured:
+            created = factories.bulk_posts(3000, user_ids, group_ids, days=30)
+        assert created == Post.objects.count() == 3000
+        assert len(captured) < 100, \
+            'Проверьте, что посты вставляются пачками, а не по одному'
+
+        post_ids = factories.new_ids(Post, 0)
+        assert factories.bulk_comments(500, post_ids, user_ids) == 500
+        assert Comment.objects.count() == 500
+        follows = factories.bulk_follows(user_ids, mean=10)
+        assert follows == Follow.objects.count() > 0
+
+        per_author = list(Post.objects.values('author')
+                          .annotate(total=Count('id'))
+                          .order_by('-total')
+                          .values_list('total', flat=True))
+        assert per_author[0] > 5 * per_author[len(per_author) // 2], \
+            'Проверьте, что активность авторов распределена по Ципфу'
+        dates = Post.objects.order_by('pub_date').values_list('pub_date', flat=True)
+        assert (dates.last() - dates.first()).days >= 20, \
+            'Проверьте, что даты публикации разбросаны по времени'
+        assert not Follow.objects.extra(where=['user_id = author_id']).exists(), \
+            'Проверьте, что пользователь не подписывается на себя'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_rebuild_derived(self):
+        from posts import factories
+        from posts.bulk import rebuild_derived
+        from posts.models import TimelineEntry, UserStats
+
+        user_ids = factories.bulk_users(10)
+        factories.bulk_posts(100, user_ids)
+        factories.bulk_follows(user_ids, mean=3)
+        rebuild_derived()
+        assert UserStats.objects.count() == 10
+        assert TimelineEntry.objects.exists(), \
+            'Проверьте, что после пакетной вставки строятся ленты подписок'
+
+    @pytest.mark.django_db
+    def test_single_factories(self):
+        from posts.factories import CommentFactory
+
+        comment = CommentFactory()
+        assert comment.pk and comment.post.pk and comment.author.pk
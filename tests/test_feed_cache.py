@@ -0,0 +1,79 @@
+import pytest
+
+from django.core.cache import cache
+from django.test import Client
+
+
+class TestFeedCache:
+
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        cache.clear()
+
+    @pytest.mark.django_db(transaction=True)
+    def test_auth_and_anonymous_pages_separated(self, user_client, post):
+        assert 'Редактировать' in user_client.get('/').content.decode()
+        assert 'Редактировать' not in Client().get('/').content.decode(), \
+            'Проверьте, что страница автора не отдаётся анонимным пользователям из кеша'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_new_post_invalidates_index(self, user_client, user):
+        from posts.models import Post
+
+        anonymous = Client()
+        anonymous.get('/')
+        user_client.post('/new/', data={'text': 'Свежий пост'})
+        assert 'Свежий пост' in anonymous.get('/').content.decode(), \
+            'Проверьте, что новый пост сразу виден на закешированной главной странице'
+
+        Post.objects.create(text='Из скрипта', author=user)
+        assert 'Из скрипта' in anonymous.get('/').content.decode(), \
+            'Проверьте, что пост, созданный в обход представлений, тоже сбрасывает кеш'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_model_writes_invalidate_feeds(self, post_with_group):
+        from posts.models import Comment
+
+        anonymous = Client()
+        group = post_with_group.group
+        anonymous.get(f'/group/{group.slug}/')
+        group.title = 'Новое название'
+        group.save()
+        assert 'Новое название' in anonymous.get(f'/group/{group.slug}/').content.decode(), \
+            'Проверьте, что переименование сообщества сбрасывает кеш его страницы'
+
+        comment = Comment.objects.create(post=post_with_group, author=post_with_group.author,
+                                         text='Комментарий')
+        etag = anonymous.get('/')['ETag']
+        comment.delete()
+        assert anonymous.get('/', HTTP_IF_NONE_MATCH=etag).status_code == 200, \
+            'Проверьте, что удаление комментария меняет ETag ленты'
+
+        anonymous.get('/')
+        post_with_group.delete()
+        assert post_with_group.text not in anonymous.get('/').content.decode(), \
+            'Проверьте, что удалённый в обход представлений пост пропадает из ленты'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_bump_once_after_commit(self, post):
+        from django.db import transaction
+        from posts.feed_cache import feed_generation
+        from posts.models import Comment
+
+        generation = feed_generation()
+        with transaction.atomic():
+            for i in range(5):
+                Comment.objects.create(post=post, author=post.author, text=f'К {i}')
+            assert feed_generation() == generation, \
+                'Проверьте, что поколение меняется только после коммита'
+        assert feed_generation() == generation + 1, \
+            'Проверьте, что транзакция меняет поколение один раз'
+
+        try:
+            with transaction.atomic():
+                Comment.objects.create(post=post, author=post.author, text='Откат')
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        assert feed_generation() == generation + 1, \
+            'Проверьте, что откаченная запись не сбрасывает кеш'
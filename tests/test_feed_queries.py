@@ -0,0 +1,114 @@
+from io import StringIO
+
+import pytest
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+def count_queries(client, url):
+    cache.clear()
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+    assert response.status_code == 200
+    return len(queries.captured_queries)
+
+
+class TestFeedQueries:
+
+    def add_posts(self, author, group, count):
+        from posts.models import Comment, Post
+        for i in range(count):
+            post = Post.objects.create(text=f'Пост {i}', author=author, group=group)
+            Comment.objects.create(post=post, author=author, text='Комментарий')
+
+    @pytest.mark.django_db(transaction=True)
+    def test_feeds_constant_queries(self, user_client, user, group):
+        reader = get_user_model().objects.create_user(username='Reader')
+        user_client.force_login(reader)
+        user_client.get(f'/{user.username}/follow/')
+
+        urls = ['/', f'/group/{group.slug}/', f'/{user.username}/', '/follow/']
+        self.add_posts(user, group, 2)
+        small = {url: count_queries(user_client, url) for url in urls}
+        self.add_posts(user, group, 8)
+        for url in urls:
+            assert count_queries(user_client, url) == small[url], \
+                f'Проверьте, что число запросов на странице `{url}` не зависит от числа постов'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_comment_count_annotation(self, client, post):
+        from posts.models import Comment
+        Comment.objects.create(post=post, author=post.author, text='Комментарий')
+        Comment.objects.create(post=post, author=post.author, text='Ещё один')
+        cache.clear()
+        response = client.get('/')
+        assert response.context['page'][0].comment_count == 2
+        assert '2 комментариев' in response.content.decode()
+
+
+class TestStoredCommentCount:
+
+    @pytest.mark.django_db
+    def test_maintained_on_write(self, user_client, post):
+        from posts.models import Comment
+
+        user_client.post(f'/{post.author.username}/{post.id}/comment',
+                         data={'text': 'Комментарий'})
+        comment = Comment.objects.create(post=post, author=post.author,
+                                         text='Ещё один')
+        post.refresh_from_db()
+        assert post.comment_count == 2, \
+            'Проверьте, что счётчик комментариев растёт при добавлении'
+        comment.delete()
+        post.refresh_from_db()
+        assert post.comment_count == 1, \
+            'Проверьте, что счётчик комментариев уменьшается при удалении'
+
+    @pytest.mark.django_db
+    def test_feed_skips_comment_table(self, client, post):
+        from posts.models import Comment
+
+        Comment.objects.create(post=post, author=post.author, text='Комментарий')
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/')
+        assert '1 комментариев' in response.content.decode()
+        assert not any('posts_comment' in query['sql']
+                       for query in queries.captured_queries), \
+            'Проверьте, что лента не обращается к таблице комментариев'
+
+    @pytest.mark.django_db
+    def test_reconcile(self, post):
+        from django.core.management import call_command
+        from posts.models import Comment, Post
+
+        Comment.objects.bulk_create(
+            [Comment(post=post, author=post.author, text='Из импорта')] * 3)
+        call_command('reconcile_counters', stdout=StringIO())
+        assert Post.objects.get(pk=post.pk).comment_count == 3, \
+            'Проверьте, что reconcile_counters пересчитывает комментарии'
+
+    @pytest.mark.django_db
+    def test_post_delete_skips_comment_counts(self, post):
+        from posts.models import Comment
+
+        Comment.objects.bulk_create(
+            [Comment(post=post, author=post.author, text='Комментарий')] * 3)
+        with CaptureQueriesContext(connection) as queries:
+            post.delete()
+        assert not any(query['sql'].startswith('UPDATE "posts_post"')
+                       for query in queries.captured_queries), \
+            'Проверьте, что при удалении поста его комментарии не уменьшают счётчик по одному'
+
+    @pytest.mark.django_db
+    def test_count_not_negative(self, post):
+        from posts.models import Comment, Post
+
+        Comment.objects.bulk_create(
+            [Comment(post=post, author=post.author, text='Из импорта')])
+        Comment.objects.get().delete()
+        assert Post.objects.get(pk=post.pk).comment_count == 0, \
+            'Проверьте, что счётчик комментариев не уходит ниже нуля'
@@ -0,0 +1,137 @@
+import pytest
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+@pytest.fixture
+def users(django_user_model):
+    return [django_user_model.objects.create_user(username=f'Graph{i}')
+            for i in range(4)]
+
+
+class TestFollowGraph:
+
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        cache.clear()
+
+    @pytest.mark.django_db
+    def test_membership(self, users):
+        from posts.follow_graph import FollowGraph
+        from posts.models import Follow
+
+        reader, *authors = users
+        for author in reversed(authors):
+            Follow.objects.create(user=reader, author=author)
+        graph = FollowGraph()
+        assert list(graph.following(reader.pk)) == [a.pk for a in authors], \
+            'Проверьте, что подписки хранятся отсортированным массивом'
+        assert graph.is_following(reader.pk, authors[1].pk)
+        assert not graph.is_following(authors[1].pk, reader.pk)
+        assert not graph.is_following(None, reader.pk)
+        assert list(graph.followers(authors[0].pk)) == [reader.pk]
+        assert graph.followers_count(reader.pk) == 0
+
+    # журнал подписок пишется после коммита
+    @pytest.mark.django_db(transaction=True)
+    def test_follows_log_between_processes(self, users, monkeypatch):
+        from posts.follow_graph import FollowGraph
+        from posts.models import Follow
+
+        reader, author, other, _ = users
+        graph = FollowGraph()
+        graph.following(reader.pk)
+        loads = []
+        monkeypatch.setattr(graph, 'load', lambda: loads.append(True))
+
+        follow = Follow.objects.create(user=reader, author=author)
+        Follow.objects.create(user=other, author=author)
+        follow.delete()
+        Follow.objects.create(user=reader, author=other)
+        with CaptureQueriesContext(connection) as queries:
+            assert list(graph.following(reader.pk)) == [other.pk]
+            assert list(graph.followers(author.pk)) == [other.pk]
+        assert loads == [] and not queries.captured_queries, \
+            'Проверьте, что граф догоняет изменения по журналу без запросов к базе'
+
+    # журнал подписок пишется после коммита
+    @pytest.mark.django_db(transaction=True)
+    def test_reload_when_log_lost(self, users):
+        from posts.follow_graph import FollowGraph, CLOCK_KEY, change_key
+        from posts.models import Follow
+
+        reader, author, _, _ = users
+        graph = FollowGraph()
+        graph.following(reader.pk)
+        Follow.objects.create(user=reader, author=author)
+        cache.delete(change_key(cache.get(CLOCK_KEY)))
+        assert graph.is_following(reader.pk, author.pk), \
+            'Проверьте, что без записей журнала граф загружается заново'
+
+        Follow.objects.filter(user=reader).delete()
+        cache.delete(CLOCK_KEY)
+        assert not graph.is_following(reader.pk, author.pk)
+
+    @pytest.mark.django_db(transaction=True)
+    def test_one_process_reloads(self, users):
+        from posts.follow_graph import CLOCK_KEY, RELOAD_KEY, FollowGraph
+        from posts.models import Follow
+
+        reader, author, _, _ = users
+        graph = FollowGraph()
+        graph.following(reader.pk)
+        Follow.objects.create(user=reader, author=author)
+        cache.delete(CLOCK_KEY)
+        # граф сейчас загружает другой процесс
+        cache.add(RELOAD_KEY, True)
+        with CaptureQueriesContext(connection) as queries:
+            assert not graph.is_following(reader.pk, author.pk)
+        assert not queries.captured_queries, \
+            'Проверьте, что граф загружает заново только один процесс, ' \
+            'а остальные отвечают по старому графу'
+
+        cache.delete(RELOAD_KEY)
+        assert graph.is_following(reader.pk, author.pk)
+        assert cache.get(RELOAD_KEY) is None, \
+            'Проверьте, что после загрузки блокировка снимается'
+
+    @pytest.mark.django_db
+    def test_views_skip_follow_table(self, client, users):
+        reader, author, _, _ = users
+        client.force_login(reader)
+        client.get(f'/{author.username}/follow/')
+        cache.clear()
+        client.get(f'/{author.username}/')
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(f'/{author.username}/')
+            client.get('/follow/')
+        assert response.context['following'] is True
+        assert not any('posts_follow' in query['sql']
+                       for query in queries.captured_queries), \
+            'Проверьте, что профиль и лента подписок не читают posts_follow'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_rolled_back_follow_not_logged(self, users):
+        from django.db import transaction
+        from posts.follow_graph import follow_graph
+        from posts.models import Follow
+
+        reader, author = users[0], users[1]
+        follow_graph.load()
+        try:
+            with transaction.atomic():
+                Follow.objects.follow(reader.id, [author.id])
+                Follow.objects.create(user=author, author=reader)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        follow_graph.sync()
+        assert not follow_graph.is_following(reader.id, author.id), \
+            'Проверьте, что откаченная подписка не попадает в журнал'
+        assert not follow_graph.is_following(author.id, reader.id)
+
+        Follow.objects.follow(reader.id, [author.id])
+        assert follow_graph.is_following(reader.id, author.id), \
+            'Проверьте, что после коммита подписка видна в графе'
@@ -0,0 +1,107 @@
+import pytest
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+def run(client, url):
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+    return response, [query['sql'] for query in queries.captured_queries
+                      if not query['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+
+
+def make_followers(django_user_model, author, count, prefix):
+    from posts.models import Follow
+    django_user_model.objects.bulk_create(
+        [django_user_model(username=f'{prefix}{i}') for i in range(count)])
+    readers = list(django_user_model.objects.filter(username__startswith=prefix))
+    Follow.objects.bulk_create([Follow(user=reader, author=author) for reader in readers])
+    Follow.objects.bulk_create([Follow(user=author, author=reader) for reader in readers])
+    return readers
+
+
+class TestFollowLists:
+
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        cache.clear()
+
+    @pytest.mark.django_db
+    def test_pages_walk(self, client, user, django_user_model):
+        from posts.views import USERS_PER_PAGE
+        readers = make_followers(django_user_model, user, USERS_PER_PAGE * 2 + 5, 'Reader')
+
+        for name in ['followers', 'following']:
+            url = f'/{user.username}/{name}/'
+            seen, query = [], ''
+            while True:
+                response, _ = run(client, url + query)
+                assert response.status_code == 200, f'Страница `{url}` недоступна'
+                page = response.context['page']
+                seen += [person.username for person in page]
+                if not page.has_next():
+                    break
+                query = f'?after={page.next_cursor}'
+            assert len(seen) == len(set(seen)) == len(readers), \
+                f'Проверьте, что `{url}` по курсору показывает всех без повторов и пропусков'
+            assert seen == [reader.username for reader in reversed(readers)], \
+                f'Проверьте, что `{url}` сначала показывает последние подписки'
+
+            response, _ = run(client, f'{url}?before={page.previous_cursor}')
+            assert len(response.context['page']) == USERS_PER_PAGE, \
+                f'Проверьте, что `{url}` умеет листать назад'
+
+    @pytest.mark.django_db
+    def test_constant_queries(self, client, user, django_user_model):
+        from posts.views import USERS_PER_PAGE
+        small = django_user_model.objects.create_user(username='SmallAuthor')
+        make_followers(django_user_model, small, 3, 'Few')
+        make_followers(django_user_model, user, USERS_PER_PAGE * 3, 'Many')
+
+        for name in ['followers', 'following']:
+            # прогрев: граф подписок и счётчики из bulk_create
+            client.get(f'/{small.username}/{name}/')
+            client.get(f'/{user.username}/{name}/')
+            _, few = run(client, f'/{small.username}/{name}/')
+            response, many = run(client, f'/{user.username}/{name}/')
+            page = response.context['page']
+            _, deep = run(client, f'/{user.username}/{name}/?after={page.next_cursor}')
+            assert len(few) == len(many) == len(deep), \
+                'Проверьте, что число запросов не зависит от размера списка и страницы'
+
+    @pytest.mark.django_db
+    def test_unknown_user(self, client):
+        for name in ['followers', 'following']:
+            response = client.get(f'/nobody-here/{name}/')
+            assert response.status_code == 404, \
+                'Проверьте, что для несуществующего пользователя возвращается 404'
+
+    @pytest.mark.django_db
+    def test_not_modified(self, client, user, django_user_model):
+        make_followers(django_user_model, user, 3, 'Cached')
+        url = f'/{user.username}/followers/'
+        # прогрев: счётчики из bulk_create создаются при первом показе
+        client.get(url)
+        etag = client.get(url)['ETag']
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304, \
+            'Проверьте, что неизменившийся список отдаётся как 304'
+        other = django_user_model.objects.create_user(username='LateReader')
+        client.force_login(other)
+        client.get(f'/{user.username}/follow/')
+        client.force_login(user)
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200, \
+            'Проверьте, что после новой подписки список отдаётся заново'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_rename_changes_etag(self, client, user, django_user_model):
+        reader, *_ = make_followers(django_user_model, user, 3, 'Named')
+        url = f'/{user.username}/followers/'
+        client.get(url)
+        etag = client.get(url)['ETag']
+        reader.first_name = 'Новое имя'
+        reader.save()
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200 and 'Новое имя' in response.content.decode(), \
+            'Проверьте, что после смены имени подписчика список отдаётся заново'
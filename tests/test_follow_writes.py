@@ -0,0 +1,99 @@
+import pytest
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+def run(client, method, url, data=None):
+    with CaptureQueriesContext(connection) as queries:
+        response = getattr(client, method)(url, data)
+    # точки сохранения добавляет транзакция теста, а не представление
+    return response, [query['sql'] for query in queries.captured_queries
+                      if not query['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+
+
+def stats(user):
+    """ Счётчики заново из базы: user.stats мог закешироваться раньше """
+    from posts.models import UserStats
+    return UserStats.objects.for_user(type(user).objects.get(pk=user.pk))
+
+
+@pytest.fixture
+def authors(django_user_model):
+    return [django_user_model.objects.create_user(username=f'Author{i}')
+            for i in range(25)]
+
+
+class TestFollowWrites:
+
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        cache.clear()
+
+    @pytest.mark.django_db
+    def test_follow_is_idempotent(self, user_client, user, authors):
+        from posts.models import Follow
+
+        author = authors[0]
+        url = f'/{author.username}/follow/'
+        _, first = run(user_client, 'get', url)
+        _, repeated = run(user_client, 'get', url)
+        assert Follow.objects.filter(user=user, author=author).count() == 1
+        assert stats(author).followers_count == 1, \
+            'Проверьте, что повторная подписка не меняет счётчики'
+        writes = [sql for sql in repeated if sql.startswith('INSERT')]
+        assert len(writes) == 1 and len(repeated) <= 4, \
+            'Проверьте, что повторная подписка — один INSERT без проверки существования'
+        assert not any(sql.startswith('SELECT') and 'posts_follow' in sql
+                       for sql in first), \
+            'Проверьте, что подписка не читает posts_follow перед записью'
+
+        run(user_client, 'get', f'/{user.username}/follow/')
+        assert not Follow.objects.filter(user=user, author=user).exists(), \
+            'Проверьте, что на себя подписаться нельзя'
+
+        _, unfollow = run(user_client, 'get', f'/{author.username}/unfollow/')
+        _, again = run(user_client, 'get', f'/{author.username}/unfollow/')
+        assert not Follow.objects.filter(user=user).exists()
+        assert stats(author).followers_count == 0
+        assert len(again) < len(unfollow), \
+            'Проверьте, что повторная отписка не трогает счётчики и ленты'
+
+    @pytest.mark.django_db
+    def test_bulk_follow(self, user_client, user, authors):
+        from posts.follow_graph import follow_graph
+        from posts.models import Follow, Post, TimelineEntry
+
+        for author in authors:
+            Post.objects.create(text=f'Пост {author.username}', author=author)
+        names = [author.username for author in authors]
+
+        _, small = run(user_client, 'post', '/follow/bulk/',
+                       {'username': names[:3]})
+        response, large = run(user_client, 'post', '/follow/bulk/',
+                              {'username': names + ['Nobody']})
+        assert len(large) == len(small), \
+            'Проверьте, что число запросов не зависит от числа авторов'
+        assert response.json() == {'changed': names[3:], 'unknown': ['Nobody']}
+        assert Follow.objects.filter(user=user).count() == 25
+        assert stats(user).following_count == 25
+        assert TimelineEntry.objects.filter(user=user).count() == 25
+        assert len(follow_graph.following(user.pk)) == 25
+
+        response = user_client.post('/follow/bulk/', {'username': names[:10],
+                                                      'action': 'unfollow'})
+        assert response.json()['changed'] == names[:10]
+        assert Follow.objects.filter(user=user).count() == 15
+        assert TimelineEntry.objects.filter(user=user).count() == 15
+        assert stats(authors[0]).followers_count == 0
+
+    @pytest.mark.django_db
+    def test_bulk_limits(self, client, user_client, settings):
+        settings.FOLLOW_BULK_LIMIT = 2
+        response = user_client.post('/follow/bulk/',
+                                    {'username': ['a', 'b', 'c']})
+        assert response.status_code == 400
+        assert user_client.get('/follow/bulk/').status_code == 405
+        client.logout()
+        assert client.post('/follow/bulk/').status_code == 302
@@ -12,7 +12,7 @@ class TestGroupPaginatorView:
         except Exception as e:
             assert False, f'''Страница `/group/<slug>/` работает неправильно. Ошибка: `{e}`'''
         if response.status_code in (301, 302):
-            response = client.get(f'/group/{post_with_group.group.slug}/')
+            response = client.get(f'/group/{post_with_group.group.slug}/?page=1')
         assert response.status_code != 404, 'Страница `/group/<slug>/` не найдена, проверьте этот адрес в *urls.py*'
 
         assert 'paginator' in response.context, \
@@ -26,7 +26,7 @@ class TestGroupPaginatorView:
 
     @pytest.mark.django_db(transaction=True)
     def test_index_paginator_view_get(self, client, post_with_group):
-        response = client.get(f'/')
+        response = client.get(f'/?page=1')
         assert response.status_code != 404, 'Страница `/` не найдена, проверьте этот адрес в *urls.py*'
         assert 'paginator' in response.context, \
             'Проверьте, что передали переменную `paginator` в контекст страницы `/`'
@@ -36,3 +36,46 @@ class TestGroupPaginatorView:
             'Проверьте, что передали переменную `page` в контекст страницы `/`'
         assert type(response.context['page']) == Page, \
             'Проверьте, что переменная `page` на странице `/` типа `Page`'
+
+
+class TestCursorPaginatorView:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_profile_cursor_pages(self, client, user):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from posts.models import Post
+        from posts.paginator import CursorPaginator
+
+        for i in range(25):
+            Post.objects.create(text=f'Тестовый пост {i}', author=user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(f'/{user.username}/')
+        assert type(response.context['paginator']) == CursorPaginator, \
+            'Проверьте, что по умолчанию лента выводится курсорным паджинатором'
+        assert not any('OFFSET' in q['sql'] for q in queries.captured_queries), \
+            'Проверьте, что курсорный паджинатор не использует OFFSET'
+
+        seen = []
+        page = response.context['page']
+        while True:
+            seen.extend(post.id for post in page)
+            if not page.has_next():
+                break
+            response = client.get(f'/{user.username}/?after={page.next_cursor}')
+            page = response.context['page']
+        expected = list(Post.objects.order_by('-pub_date', '-id').values_list('id', flat=True))
+        assert seen == expected, \
+            'Проверьте, что курсорные страницы обходят все посты без пропусков и повторов'
+
+        back = client.get(f'/{user.username}/?before={page.previous_cursor}')
+        assert [post.id for post in back.context['page']] == expected[10:20], \
+            'Проверьте, что ссылка «Предыдущая» ведёт на предыдущую страницу'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_broken_cursor(self, client, post):
+        response = client.get(f'/{post.author.username}/?after=not-a-cursor')
+        assert response.status_code == 200, \
+            'Проверьте, что испорченный курсор не приводит к ошибке'
+        assert list(response.context['page']) == [post]
@@ -0,0 +1,74 @@
+import pytest
+
+from django.core.cache import cache
+
+
+class TestPostCards:
+
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        cache.clear()
+
+    @pytest.mark.django_db(transaction=True)
+    def test_card_rendered_once(self, client, post_with_group, settings):
+        from posts.cards import card_stats
+
+        settings.POST_CARD_CACHE_STATS = True
+        client.get(f'/{post_with_group.author.username}/')
+        client.get(f'/group/{post_with_group.group.slug}/')
+        stats = card_stats()
+        assert (stats['hits'], stats['misses']) == (1, 1), \
+            'Проверьте, что карточка поста рендерится один раз для всех лент'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_stats_off_by_default(self, client, post):
+        from posts.cards import card_stats
+
+        client.get(f'/{post.author.username}/')
+        client.get(f'/{post.author.username}/')
+        assert (card_stats()['hits'], card_stats()['misses']) == (0, 0), \
+            'Проверьте, что без POST_CARD_CACHE_STATS карточки не пишут счётчики в кеш'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_version_bumps(self, user_client, post_with_group):
+        from posts.models import Comment, Post
+
+        def version():
+            return Post.objects.get(pk=post_with_group.pk).version
+
+        start = version()
+        Comment.objects.create(post=post_with_group, author=post_with_group.author, text='Комментарий')
+        assert version() == start + 1, 'Проверьте, что новый комментарий меняет версию поста'
+
+        group = post_with_group.group
+        group.title = 'Новое название'
+        group.save()
+        assert version() == start + 2, 'Проверьте, что изменение сообщества меняет версию поста'
+
+        user_client.post(f'/{post_with_group.author.username}/{post_with_group.id}/edit/',
+                         data={'text': 'Исправленный текст', 'group': group.id})
+        assert version() == start + 3, 'Проверьте, что редактирование меняет версию поста'
+
+        response = user_client.get(f'/{post_with_group.author.username}/')
+        content = response.content.decode()
+        assert 'Исправленный текст' in content and 'Новое название' in content
+        assert 'Редактировать' in content, 'Проверьте, что автор видит ссылку на редактирование'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_edit_link_not_shared(self, user_client, post):
+        from django.test import Client
+
+        user_client.get(f'/{post.author.username}/')
+        response = Client().get(f'/{post.author.username}/')
+        assert 'Редактировать' not in response.content.decode(), \
+            'Проверьте, что ссылка на редактирование не попадает в кеш для других пользователей'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_rename_refreshes_cards(self, client, post):
+        author = post.author
+        client.get(f'/{author.username}/')
+        author.username = 'Renamed'
+        author.save()
+        content = client.get('/Renamed/').content.decode()
+        assert '@Renamed' in content and '/Renamed/' in content, \
+            'Проверьте, что после переименования автора карточки его постов обновляются'
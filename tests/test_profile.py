@@ -20,7 +20,7 @@ class TestProfileView:
         except Exception as e:
             assert False, f'''Страница `/<username>/` работает неправильно. Ошибка: `{e}`'''
         if response.status_code in (301, 302):
-            response = client.get(f'/{post_with_group.author.username}/')
+            response = client.get(f'/{post_with_group.author.username}/?page=1')
         assert response.status_code != 404, 'Страница `/<username>/` не найдена, проверьте этот адрес в *urls.py*'
 
         profile_context = get_field_context(response.context, get_user_model())
@@ -43,7 +43,7 @@ class TestProfileView:
         except Exception as e:
             assert False, f'''Страница `/<username>/` работает неправильно. Ошибка: `{e}`'''
         if new_response.status_code in (301, 302):
-            new_response = client.get(f'/{new_user.username}/')
+            new_response = client.get(f'/{new_user.username}/?page=1')
 
         page_context = get_field_context(new_response.context, Page)
         assert page_context is not None, \
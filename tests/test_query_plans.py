@@ -0,0 +1,86 @@
+import re
+
+import pytest
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+# полный проход по таблице без индекса: «SCAN posts_post» без «USING ...»
+TABLE_SCAN = re.compile(r'^SCAN (TABLE )?\w+( AS \w+)?$')
+
+
+def query_plan(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def view_plans(client, url):
+    """ Планы всех SELECT-запросов, выполненных при открытии страницы """
+    cache.clear()
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+    assert response.status_code == 200, f'Страница `{url}` недоступна'
+    return {query['sql']: query_plan(query['sql'])
+            for query in queries.captured_queries
+            if query['sql'].startswith('SELECT')}
+
+
+def assert_indexed(client, url):
+    for sql, plan in view_plans(client, url).items():
+        for step in plan:
+            assert not TABLE_SCAN.match(step), \
+                f'Страница `{url}`: полный просмотр таблицы «{step}» в запросе\n{sql}'
+            assert 'USE TEMP B-TREE' not in step, \
+                f'Страница `{url}`: сортировка во временном B-дереве «{step}» в запросе\n{sql}'
+
+
+@pytest.mark.skipif(connection.vendor != 'sqlite', reason='EXPLAIN QUERY PLAN есть только в SQLite')
+class TestQueryPlans:
+
+    @pytest.fixture
+    def feed(self, user, post_with_group):
+        from posts.models import Comment, Post
+        reader = get_user_model().objects.create_user(username='PlanReader')
+        posts = [Post.objects.create(text=f'Пост {i}', author=user, group=post_with_group.group)
+                 for i in range(15)]
+        Comment.objects.create(post=post_with_group, author=reader, text='Комментарий')
+        return reader, posts
+
+    @pytest.mark.django_db(transaction=True)
+    def test_public_views(self, client, user, post_with_group, feed):
+        for url in ['/', f'/group/{post_with_group.group.slug}/',
+                    f'/{user.username}/', f'/{user.username}/{post_with_group.id}/']:
+            assert_indexed(client, url)
+            cache.clear()
+            page = client.get(url).context.get('page')
+            if page is not None and page.has_next():
+                assert_indexed(client, f'{url}?after={page.next_cursor}')
+
+    @pytest.mark.django_db(transaction=True)
+    def test_follow_views(self, client, user, feed, settings):
+        reader, _ = feed
+        client.force_login(reader)
+        client.get(f'/{user.username}/follow/')
+        assert_indexed(client, '/follow/')
+        assert_indexed(client, f'/{user.username}/')
+
+        settings.TIMELINE_FANOUT_LIMIT = 0
+        assert_indexed(client, '/follow/')
+
+    @pytest.mark.django_db(transaction=True)
+    def test_follow_lists(self, client, user):
+        from posts.models import Follow
+        get_user_model().objects.bulk_create(
+            [get_user_model()(username=f'PlanFollower{i}') for i in range(60)])
+        readers = get_user_model().objects.filter(username__startswith='PlanFollower')
+        Follow.objects.bulk_create([Follow(user=reader, author=user) for reader in readers])
+        Follow.objects.bulk_create([Follow(user=user, author=reader) for reader in readers])
+        for url in [f'/{user.username}/followers/', f'/{user.username}/following/']:
+            assert_indexed(client, url)
+            cache.clear()
+            page = client.get(url).context['page']
+            assert_indexed(client, f'{url}?after={page.next_cursor}')
@@ -0,0 +1,79 @@
+import pytest
+
+
+@pytest.fixture
+def posts(user, group):
+    from posts.models import Post
+    from posts.search import get_backend
+
+    get_backend().clear()
+    return [
+        Post.objects.create(text='Котики правят миром', author=user),
+        Post.objects.create(text='Котики и собаки, котики и кошки', author=user),
+        Post.objects.create(text='Про собак', author=user, group=group),
+        Post.objects.create(text='Ни о чём', author=user),
+    ]
+
+
+class TestSearchBackends:
+
+    @pytest.mark.parametrize('backend_name', ['SQLiteFTSBackend', 'InvertedIndexBackend'])
+    @pytest.mark.django_db(transaction=True)
+    def test_ranked_cursor_search(self, user, backend_name):
+        from posts import search
+        from posts.models import Post
+
+        backend = getattr(search, backend_name)()
+        backend.clear()
+        expected = [Post.objects.create(text=f'котики {i}', author=user) for i in range(5)]
+        backend.rebuild()
+
+        page = search.search_posts('Котики', per_page=2, backend=backend)
+        seen = list(page)
+        while page.has_next():
+            page = search.search_posts('котики', after=page.next_cursor, per_page=2, backend=backend)
+            seen.extend(page)
+        assert sorted(post.id for post in seen) == sorted(post.id for post in expected), \
+            f'Проверьте, что {backend_name} выдаёт все результаты постранично без повторов'
+
+        post = expected[0]
+        post.delete()
+        backend.remove(post.pk)
+        assert post not in search.search_posts('котики', backend=backend)
+
+    @pytest.mark.parametrize('backend_name', ['SQLiteFTSBackend', 'InvertedIndexBackend'])
+    @pytest.mark.django_db(transaction=True)
+    def test_ranking_and_groups(self, posts, group, backend_name):
+        from posts import search
+
+        backend = getattr(search, backend_name)()
+        backend.rebuild()
+        found = list(search.search_posts('котики', backend=backend))
+        assert found == [posts[1], posts[0]], \
+            'Проверьте, что более релевантные посты выводятся первыми'
+
+        group.title = 'Любители жирафов'
+        group.save()
+        backend.reindex_group(group)
+        assert list(search.search_posts('жирафов', backend=backend)) == [posts[2]], \
+            'Проверьте, что поиск учитывает название сообщества'
+
+
+class TestSearchView:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_search_view(self, client, posts):
+        from posts.models import Post
+
+        response = client.get('/search/', {'q': 'собаки'})
+        assert response.status_code == 200
+        assert list(response.context['page']) == [posts[1]], \
+            'Проверьте, что страница `/search/` выводит найденные посты'
+
+        post = Post.objects.create(text='Новые собаки', author=posts[0].author)
+        response = client.get('/search/', {'q': 'собаки'})
+        assert post in response.context['page'], \
+            'Проверьте, что новые посты сразу попадают в поисковый индекс'
+
+        response = client.get('/search/', {'q': ''})
+        assert response.status_code == 200 and len(response.context['page']) == 0
@@ -0,0 +1,126 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import pytest
+
+from posts.sqlite_cache import SQLiteCache
+
+
+def make_cache(path, **options):
+    return SQLiteCache(str(path / 'cache.sqlite3'), {'OPTIONS': options})
+
+
+def bump(location, times):
+    """ Выполняется в отдельном процессе """
+    cache = SQLiteCache(location, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class TestSQLiteCache:
+
+    def test_values_round_trip(self, tmp_path):
+        cache = make_cache(tmp_path)
+        values = {'int': 7, 'flag': True, 'big': 2 ** 70, 'text': 'Привет',
+                  'page': {'rows': [1, 2, 3]}, 'none': None}
+        for key, value in values.items():
+            cache.set(key, value)
+        for key, value in values.items():
+            assert cache.get(key) == value and type(cache.get(key)) is type(value), \
+                f'Проверьте, что значение `{key}` читается без изменений'
+        assert cache.get_many(['int', 'text', 'missing']) == {'int': 7, 'text': 'Привет'}
+        assert cache.get('missing', 'default') == 'default'
+
+        cache.delete('int')
+        cache.delete_many(['text', 'page'])
+        assert not cache.has_key('int') and cache.get('text') is None
+        cache.clear()
+        assert cache.usage() == (0, 0), \
+            'Проверьте, что clear() обнуляет счётчики размера'
+
+    def test_shared_between_instances(self, tmp_path):
+        writer, reader = make_cache(tmp_path), make_cache(tmp_path)
+        writer.set('generation', 1)
+        writer.incr('generation')
+        assert reader.get('generation') == 2, \
+            'Проверьте, что запись одного экземпляра видна другому'
+        reader.delete('generation')
+        assert writer.get('generation') is None
+
+    def test_expiry_and_add(self, tmp_path):
+        cache = make_cache(tmp_path)
+        cache.set('short', 1, timeout=0.05)
+        cache.set('forever', 1, timeout=None)
+        assert not cache.add('short', 2), \
+            'Проверьте, что add() не перезаписывает живой ключ'
+        time.sleep(0.1)
+        assert cache.get('short') is None and cache.has_key('forever')
+        assert cache.add('short', 3), \
+            'Проверьте, что add() занимает просроченный ключ'
+        assert cache.get('short') == 3
+        assert cache.touch('short', None) and cache.get('short') == 3
+        assert not cache.touch('missing')
+        assert cache.get_or_set('lazy', lambda: 'value') == 'value'
+
+    def test_incr(self, tmp_path):
+        cache = make_cache(tmp_path)
+        with pytest.raises(ValueError):
+            cache.incr('missing')
+        cache.set('count', 1)
+        assert cache.incr('count', 10) == 11
+        assert cache.decr('count') == 10
+        cache.set('huge', 2 ** 63 - 1)
+        assert cache.incr('huge') == 2 ** 63, \
+            'Проверьте, что incr не теряет точность за пределами 64 бит'
+        cache.set('expired', 1, timeout=-1)
+        with pytest.raises(ValueError):
+            cache.incr('expired')
+
+    def test_without_returning(self, tmp_path, monkeypatch):
+        import posts.sqlite_cache
+
+        # SQLite до 3.35: add и incr без RETURNING
+        monkeypatch.setattr(posts.sqlite_cache, 'RETURNING', False)
+        self.test_expiry_and_add(tmp_path / 'add')
+        self.test_incr(tmp_path / 'incr')
+
+    def test_incr_is_atomic_across_processes(self, tmp_path):
+        cache = make_cache(tmp_path)
+        cache.set('counter', 0)
+        location = str(tmp_path / 'cache.sqlite3')
+        with ProcessPoolExecutor(max_workers=4,
+                                 mp_context=get_context('spawn')) as executor:
+            for result in [executor.submit(bump, location, 200) for _ in range(4)]:
+                result.result(timeout=60)
+        assert cache.get('counter') == 800, \
+            'Проверьте, что incr из разных процессов не теряет приращений'
+
+    def test_evicts_least_recently_read(self, tmp_path):
+        cache = make_cache(tmp_path, MAX_ENTRIES=10, CULL_FREQUENCY=2,
+                           TOUCH_INTERVAL=0)
+        for i in range(10):
+            cache.set(f'key{i}', i)
+            time.sleep(0.002)
+        cache.get('key0')
+        cache.set('key10', 10)
+        entries, _ = cache.usage()
+        assert entries <= 5, \
+            'Проверьте, что при переполнении освобождается 1/CULL_FREQUENCY записей'
+        assert cache.get('key0') == 0 and cache.get('key10') == 10, \
+            'Проверьте, что недавно прочитанные записи остаются'
+        assert cache.get('key1') is None, \
+            'Проверьте, что вытесняются давно не читанные записи'
+
+    def test_size_limit(self, tmp_path):
+        cache = make_cache(tmp_path, MAX_SIZE=64 * 1024)
+        cache.set('expired', 'x' * 1000, timeout=-1)
+        for i in range(40):
+            cache.set(f'page{i}', 'x' * 4096)
+        entries, size = cache.usage()
+        assert size <= 64 * 1024, 'Проверьте, что кеш не превышает MAX_SIZE'
+        assert cache.get('page39') is not None
+        assert not cache.has_key('expired')
+        cache.set('page39', 'x')
+        assert cache.usage()[1] < size, \
+            'Проверьте, что перезапись учитывается в размере'
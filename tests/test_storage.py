@@ -0,0 +1,132 @@
+import os
+
+import pytest
+from django.core.cache import cache
+
+from tests.test_thumbnails import image_file
+
+
+class TestContentHashStorage:
+
+    @pytest.fixture(autouse=True)
+    def media(self, settings, tmp_path):
+        settings.MEDIA_ROOT = str(tmp_path)
+        cache.clear()
+
+    def files(self, root):
+        return sorted(os.path.relpath(os.path.join(path, name), root)
+                      for path, _, names in os.walk(root) for name in names)
+
+    @pytest.mark.django_db(transaction=True)
+    def test_duplicate_upload_shares_file(self, user_client, tmp_path):
+        from posts.models import ImageDerivative, Post, StoredFile
+
+        for text in ('Первый', 'Второй'):
+            user_client.post('/new/', data={'text': text,
+                                            'image': image_file('meme.JPG')})
+        first, second = Post.objects.order_by('id')
+        assert first.image.name == second.image.name, \
+            'Проверьте, что одинаковые файлы получают одно имя'
+        assert first.image.name.startswith('posts/') and \
+            first.image.name.endswith('.jpg')
+        assert StoredFile.objects.get(name=first.image.name).refcount == 2
+        assert ImageDerivative.objects.filter(source=first.image.name).count() == 8, \
+            'Проверьте, что копии для одинаковых файлов нарезаются один раз'
+        files = self.files(tmp_path)
+        assert files.count(first.image.name) == 1 and len(files) == 9, \
+            'Проверьте, что одинаковый файл хранится на диске один раз'
+
+        first.delete()
+        assert os.path.exists(tmp_path / second.image.name), \
+            'Проверьте, что файл не удаляется, пока на него ссылается пост'
+        second.delete()
+        assert self.files(tmp_path) == [], \
+            'Проверьте, что файл и его копии удаляются вместе с последним постом'
+        assert not ImageDerivative.objects.exists()
+        assert not StoredFile.objects.exists()
+
+    @pytest.mark.django_db(transaction=True)
+    def test_replaced_image_released(self, user_client, user, tmp_path):
+        from posts.models import Post, StoredFile
+
+        user_client.post('/new/', data={'text': 'Пост', 'image': image_file()})
+        post = Post.objects.get()
+        old_name = post.image.name
+        user_client.post(f'/{user.username}/{post.id}/edit/',
+                         data={'text': 'Пост',
+                               'image': image_file(size=(640, 480))})
+        post.refresh_from_db()
+        assert post.image.name != old_name
+        assert list(StoredFile.objects.values_list('name', flat=True)) == \
+            [post.image.name], \
+            'Проверьте, что замена картинки отпускает ссылку на прежний файл'
+        assert not os.path.exists(tmp_path / old_name)
+
+    @pytest.mark.django_db
+    def test_reconcile(self, user):
+        from posts.models import Post, StoredFile
+
+        Post.objects.bulk_create([Post(text='Пост', author=user,
+                                       image='posts/shared.jpg')] * 3)
+        StoredFile.objects.create(name='posts/gone.jpg', refcount=1)
+        assert StoredFile.objects.reconcile() == (1, 1)
+        assert list(StoredFile.objects.values_list('name', 'refcount')) == \
+            [('posts/shared.jpg', 3)]
+
+    @pytest.mark.django_db(transaction=True)
+    def test_reacquired_file_kept(self, user_client, tmp_path):
+        from django.db import transaction
+        from posts.models import Post, StoredFile
+
+        user_client.post('/new/', data={'text': 'Пост', 'image': image_file()})
+        post = Post.objects.get()
+        name = post.image.name
+        with transaction.atomic():
+            post.delete()
+            # тот же файл загрузили снова до того, как удаление сработало
+            StoredFile.objects.acquire(name)
+        assert StoredFile.objects.get(name=name).refcount == 1
+        assert os.path.exists(tmp_path / name), \
+            'Проверьте, что перед удалением файла счётчик ссылок проверяется ещё раз'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_release_during_upload(self, user_client, tmp_path, monkeypatch):
+        import threading
+
+        from django.db import connection
+        from posts.models import Post, StoredFile
+        from posts.storage import ContentHashStorage
+
+        user_client.post('/new/', data={'text': 'Первый', 'image': image_file()})
+        name = Post.objects.get().image.name
+        # последний пост с файлом удалён, удаление ждёт своей очереди
+        Post.objects.all().update(image=None)
+        StoredFile.objects.filter(name=name).update(refcount=0)
+
+        def release():
+            try:
+                StoredFile.objects._delete_orphan(name)
+            except Exception:
+                pass
+            finally:
+                connection.close()
+
+        exists = ContentHashStorage.exists
+
+        def racing_exists(storage, checked):
+            # удаление сироты приходится между проверкой и ссылкой поста
+            found = exists(storage, checked)
+            if checked == name:
+                thread = threading.Thread(target=release)
+                thread.start()
+                thread.join()
+            return found
+
+        monkeypatch.setattr(ContentHashStorage, 'exists', racing_exists)
+        user_client.post('/new/', data={'text': 'Второй', 'image': image_file()})
+        post = Post.objects.get(text='Второй')
+        assert post.image.name == name
+        assert os.path.exists(tmp_path / name), \
+            'Проверьте, что удаление последней ссылки не стирает файл, ' \
+            'который в это время получает новый пост'
+        assert StoredFile.objects.get(name=name).refcount == 1
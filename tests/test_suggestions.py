@@ -0,0 +1,118 @@
+from io import StringIO
+
+import pytest
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+@pytest.fixture
+def people(django_user_model):
+    names = ['Reader', 'Friend', 'FriendOfFriend', 'Neighbour', 'Cofollowed',
+             'Newcomer']
+    return {name: django_user_model.objects.create_user(username=name)
+            for name in names}
+
+
+def follow(*pairs):
+    from posts.models import Follow
+    for user, author in pairs:
+        Follow.objects.follow(user.pk, [author.pk])
+
+
+class TestSuggestions:
+
+    @pytest.fixture(autouse=True)
+    def graph(self, people):
+        cache.clear()
+        p = people
+        follow((p['Reader'], p['Friend']),
+               (p['Friend'], p['FriendOfFriend']),
+               (p['Neighbour'], p['Friend']),
+               (p['Neighbour'], p['Cofollowed']))
+
+    def suggested(self, user):
+        from posts.models import Suggestion
+        return list(Suggestion.objects.filter(user=user).order_by('rank')
+                    .values_list('author__username', flat=True))
+
+    @pytest.mark.django_db
+    def test_scores(self, people):
+        from posts.suggestions import compute_suggestions
+
+        stats = compute_suggestions()
+        assert stats['edges'] == 4 and stats['computed'] == 3
+        assert self.suggested(people['Reader']) == ['FriendOfFriend', 'Cofollowed'], \
+            'Проверьте, что друзья друзей оцениваются выше общих подписок'
+        assert 'Friend' not in self.suggested(people['Neighbour']), \
+            'Проверьте, что авторы из подписок не рекомендуются'
+
+    @pytest.mark.django_db
+    def test_incremental(self, people):
+        from posts.suggestions import compute_suggestions
+
+        compute_suggestions()
+        assert compute_suggestions()['computed'] == 0, \
+            'Проверьте, что без изменений подписок ничего не пересчитывается'
+        follow((people['Reader'], people['Neighbour']))
+        assert compute_suggestions()['computed'] == 1
+        assert 'Cofollowed' in self.suggested(people['Reader'])
+        assert compute_suggestions(full=True)['computed'] == 3
+
+    # журнал подписок пишется после коммита
+    @pytest.mark.django_db(transaction=True)
+    def test_widget(self, client, people):
+        output = StringIO()
+        call_command('suggest_follows', stdout=output)
+        assert 'пересчитано 3 из 3' in output.getvalue()
+
+        client.force_login(people['Reader'])
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/follow/')
+        assert [author.username for author in response.context['suggestions']] == \
+            ['FriendOfFriend', 'Cofollowed']
+        assert len([query for query in queries.captured_queries
+                    if 'posts_suggestion' in query['sql']]) == 1, \
+            'Проверьте, что рекомендации читаются одним запросом'
+
+        client.get('/FriendOfFriend/follow/')
+        response = client.get('/follow/')
+        assert [author.username for author in response.context['suggestions']] == \
+            ['Cofollowed'], 'Проверьте, что новые подписки не рекомендуются'
+
+        client.force_login(people['Newcomer'])
+        response = client.get('/follow/')
+        assert response.context['suggestions'][0].username == 'Friend', \
+            'Проверьте, что без подписок показываются самые читаемые авторы'
+
+    @pytest.mark.django_db
+    def test_unfollowed_all_cleared(self, people):
+        from posts.models import Follow, Suggestion, SuggestionState
+        from posts.suggestions import compute_suggestions
+
+        compute_suggestions()
+        Follow.objects.unfollow(people['Reader'].pk, [people['Friend'].pk])
+        assert compute_suggestions()['cleared'] == 1
+        assert not Suggestion.objects.filter(user=people['Reader']).exists() \
+            and not SuggestionState.objects.filter(user=people['Reader']).exists(), \
+            'Проверьте, что рекомендации отписавшихся от всех удаляются'
+
+    # журнал подписок пишется после коммита
+    @pytest.mark.django_db(transaction=True)
+    def test_widget_etag(self, client, people):
+        from posts.feed_cache import feed_generation
+
+        client.force_login(people['Reader'])
+        etag = client.get('/follow/')['ETag']
+        generation = feed_generation()
+        call_command('suggest_follows', stdout=StringIO())
+        assert feed_generation() == generation, \
+            'Проверьте, что пересчёт рекомендаций не сбрасывает кеш лент'
+        assert client.get('/follow/')['ETag'] != etag, \
+            'Проверьте, что ETag страницы подписок меняется с рекомендациями'
+        etag = client.get('/follow/')['ETag']
+        call_command('suggest_follows', stdout=StringIO())
+        assert client.get('/follow/')['ETag'] == etag, \
+            'Проверьте, что пересчёт без изменений не меняет ETag'
@@ -0,0 +1,187 @@
+import json
+from io import BytesIO, StringIO
+
+import pytest
+from PIL import Image
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+
+
+def image_file(name='image.jpg', size=(1200, 800)):
+    buffer = BytesIO()
+    Image.new('RGB', size, color=(200, 30, 30)).save(buffer, 'JPEG')
+    return ContentFile(buffer.getvalue(), name=name)
+
+
+class TestThumbnails:
+
+    @pytest.fixture(autouse=True)
+    def media(self, settings, tmp_path):
+        settings.MEDIA_ROOT = str(tmp_path)
+        cache.clear()
+
+    @pytest.mark.django_db(transaction=True)
+    def test_generated_on_upload(self, user_client, settings):
+        from posts.models import ImageDerivative, Post
+
+        user_client.post('/new/', data={'text': 'С картинкой',
+                                        'image': image_file()})
+        post = Post.objects.get()
+        derivatives = ImageDerivative.objects.filter(source=post.image.name)
+        assert sorted(derivatives.values_list('format', 'width')) == \
+            [('jpeg', 320), ('jpeg', 480), ('jpeg', 640), ('jpeg', 960),
+             ('webp', 320), ('webp', 480), ('webp', 640), ('webp', 960)], \
+            'Проверьте, что при публикации нарезаются копии всех ширин в WebP и JPEG'
+        for derivative in derivatives:
+            assert default_storage.size(derivative.name) == derivative.size
+            assert derivative.height == round(derivative.width * 339 / 960)
+        assert post.version == 2, \
+            'Проверьте, что после нарезки устаревает кеш карточки поста'
+
+        content = user_client.get('/').content.decode()
+        assert 'type="image/webp"' in content and ' 320w, ' in content, \
+            'Проверьте, что в ленте картинка выводится через srcset с WebP'
+        assert f'sizes="{settings.POST_IMAGE_SIZES}"' in content
+
+    @pytest.mark.django_db(transaction=True)
+    def test_small_image_not_upscaled(self, user):
+        from posts.models import ImageDerivative, Post
+        from posts.thumbnails import generate_thumbnails
+
+        post = Post.objects.create(text='Пост', author=user,
+                                   image=image_file(size=(500, 400)))
+        assert generate_thumbnails(post.pk, post.image.name)
+        widths = set(ImageDerivative.objects.values_list('width', flat=True))
+        assert widths == {320, 480}, \
+            'Проверьте, что копии не бывают шире оригинала'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_placeholder_does_not_block(self, client, user, monkeypatch):
+        from posts.models import Post
+        from posts.templatetags import post_images
+
+        scheduled = []
+        monkeypatch.setattr(post_images, 'schedule_thumbnails',
+                            scheduled.append)
+        post = Post.objects.create(text='Пост', author=user,
+                                   image=image_file())
+
+        content = client.get('/').content.decode()
+        assert 'data:image/jpeg;base64,' in content, \
+            'Проверьте, что до нарезки копий показывается превью из поста'
+        assert scheduled == [post], \
+            'Проверьте, что шаблон ставит нарезку в очередь, а не режет сам'
+
+
+def test_bench_images_reports_savings():
+    output = StringIO()
+    call_command('bench_images', per_page=2, source_size='1200x800',
+                 viewports='360', dpr='1', json='-', stdout=output)
+    row, = json.loads(output.getvalue())['pages']
+    assert row['webp'] < row['legacy_jpeg'], \
+        'Проверьте, что srcset с WebP весит меньше прежней карточки'
+
+
+class TestPageImages:
+
+    def derivative_queries(self, client, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as captured:
+            response = client.get(url)
+        assert response.status_code == 200
+        return [query for query in captured.captured_queries
+                if 'posts_imagederivative' in query['sql']]
+
+    @pytest.mark.django_db
+    def test_one_lookup_per_page(self, client, user):
+        from posts.feed_cache import bump_feed_generation
+        from posts.models import ImageDerivative, Post
+
+        cache.clear()
+        for number in range(5):
+            post = Post.objects.create(text=f'Пост {number}', author=user,
+                                       image=f'posts/{number}.jpg')
+            ImageDerivative.objects.bulk_create(
+                [ImageDerivative(source=post.image.name, format=image_format,
+                                 width=320, height=113, size=1,
+                                 name=f'posts/{number}_320w.{image_format}')
+                 for image_format in ('webp', 'jpeg')])
+
+        queries = self.derivative_queries(client, '/?page=1')
+        assert len(queries) == 1, \
+            'Проверьте, что копии картинок страницы загружаются одним запросом'
+
+        # карточки и страница устарели, список копий остался в кеше
+        Post.objects.bump_version()
+        bump_feed_generation()
+        assert self.derivative_queries(client, '/') == [], \
+            'Проверьте, что список копий картинок берётся из кеша'
+        assert client.get('/').content.decode().count('<picture>') == 5
+
+
+class TestPlaceholders:
+
+    @pytest.fixture(autouse=True)
+    def media(self, settings, tmp_path):
+        settings.MEDIA_ROOT = str(tmp_path)
+        cache.clear()
+
+    @pytest.mark.django_db
+    def test_computed_on_upload(self, user_client, settings):
+        from posts.models import Post
+
+        user_client.post('/new/', data={'text': 'С картинкой',
+                                        'image': image_file()})
+        post = Post.objects.get()
+        assert (post.image_width, post.image_height) == (1200, 800), \
+            'Проверьте, что размер картинки сохраняется в посте'
+        assert post.image_placeholder.startswith('data:image/jpeg;base64,')
+        assert len(post.image_placeholder) < 1000, \
+            'Проверьте, что превью занимает не больше нескольких сотен байт'
+
+        post.text = 'Без картинки'
+        post.image = None
+        post.save()
+        post.refresh_from_db()
+        assert (post.image_width, post.image_placeholder) == (None, ''), \
+            'Проверьте, что без картинки превью сбрасывается'
+
+    @pytest.mark.django_db
+    def test_card_reserves_space(self, client, user):
+        from posts.models import Post
+        from posts.thumbnails import generate_thumbnails
+
+        post = Post.objects.create(text='Пост', author=user,
+                                   image=image_file(size=(500, 400)))
+        assert post.image_width == 500, \
+            'Проверьте, что размер считается и без PostForm'
+        generate_thumbnails(post.pk, post.image.name)
+
+        content = client.get('/').content.decode()
+        assert 'loading="lazy"' in content, \
+            'Проверьте, что картинки в ленте загружаются лениво'
+        assert 'width="480" height="170"' in content, \
+            'Проверьте, что место под картинкой задано заранее'
+        assert f'url({post.image_placeholder})' in content, \
+            'Проверьте, что превью показывается фоном до загрузки'
+
+    @pytest.mark.django_db
+    def test_describe_stored_images(self, user):
+        from posts.models import Post
+
+        default_storage.save('posts/old.jpg', image_file())
+        old = Post.objects.create(text='Старый', author=user)
+        Post.objects.filter(pk=old.pk).update(image='posts/old.jpg')
+        Post.objects.create(text='Пропал', author=user)
+        Post.objects.filter(text='Пропал').update(image='posts/missing.jpg')
+
+        output = StringIO()
+        call_command('describe_images', stdout=output)
+        old.refresh_from_db()
+        assert old.image_width == 1200 and old.image_placeholder, \
+            'Проверьте, что превью дописывается старым постам'
+        assert 'обновлено: 1, файлов пропущено: 1' in output.getvalue()
@@ -0,0 +1,118 @@
+import pytest
+
+from django.contrib.auth import get_user_model
+
+
+class TestTimeline:
+
+    @pytest.fixture
+    def author(self):
+        return get_user_model().objects.create_user(username='TimelineAuthor')
+
+    @pytest.mark.django_db(transaction=True)
+    def test_fan_out_and_follow(self, user_client, user, author):
+        from posts.models import Post, TimelineEntry
+
+        old_post = Post.objects.create(text='Старый пост', author=author)
+        user_client.get(f'/{author.username}/follow/')
+        assert TimelineEntry.objects.filter(user=user, post=old_post).exists(), \
+            'Проверьте, что при подписке лента заполняется постами автора'
+
+        new_post = Post.objects.create(text='Новый пост', author=author)
+        assert TimelineEntry.objects.filter(user=user, post=new_post).exists(), \
+            'Проверьте, что новый пост раскладывается по лентам подписчиков'
+
+        response = user_client.get('/follow/')
+        assert [post.id for post in response.context['page']] == [new_post.id, old_post.id]
+
+        user_client.get(f'/{author.username}/unfollow/')
+        assert not TimelineEntry.objects.filter(user=user).exists(), \
+            'Проверьте, что при отписке посты автора удаляются из ленты'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_follow_races_fan_out(self, user, author):
+        from posts.models import Follow, Post, TimelineEntry
+
+        post = Post.objects.create(text='Пост', author=author)
+        # подписка успела попасть в fan_out, а backfill видит тот же пост
+        Follow.objects.create(user=user, author=author)
+        TimelineEntry.objects.fan_out(post)
+        TimelineEntry.objects.backfill(user.id, [author.id])
+        TimelineEntry.objects.fan_out(post)
+        assert TimelineEntry.objects.filter(user=user, post=post).count() == 1, \
+            'Проверьте, что fan_out и backfill пропускают уже разложенные посты'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_pull_authors(self, user_client, user, author, settings):
+        from posts.models import Post, TimelineEntry
+
+        settings.TIMELINE_FANOUT_LIMIT = 0
+        user_client.get(f'/{author.username}/follow/')
+        post = Post.objects.create(text='Пост популярного автора', author=author)
+        assert not TimelineEntry.objects.exists(), \
+            'Проверьте, что посты популярных авторов не раскладываются по лентам'
+
+        response = user_client.get('/follow/')
+        assert list(response.context['page']) == [post], \
+            'Проверьте, что посты популярных авторов читаются при выдаче ленты'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_merged_feed(self, user_client, user, author, settings):
+        from posts.models import Post, UserStats
+
+        popular = get_user_model().objects.create_user(username='PopularAuthor')
+        user_client.get(f'/{author.username}/follow/')
+        user_client.get(f'/{popular.username}/follow/')
+        settings.TIMELINE_FANOUT_LIMIT = 5
+        UserStats.objects.filter(user=popular).update(followers_count=100)
+
+        posts = [Post.objects.create(text=f'Пост {i}', author=(author, popular)[i % 3 == 0])
+                 for i in range(25)]
+        seen = []
+        response = user_client.get('/follow/')
+        while True:
+            page = response.context['page']
+            seen.extend(post.id for post in page)
+            if not page.has_next():
+                break
+            response = user_client.get(f'/follow/?after={page.next_cursor}')
+        assert seen == [post.id for post in reversed(posts)], \
+            'Проверьте, что лента подписок сливает материализованные посты и посты популярных авторов'
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize('over_clause', [True, False],
+                             ids=['window', 'subquery'])
+    def test_rebuild(self, user, author, settings, monkeypatch, over_clause):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from posts.models import Follow, Post, TimelineEntry, UserStats
+
+        monkeypatch.setattr(connection.features, 'supports_over_clause',
+                            over_clause)
+        settings.TIMELINE_BACKFILL_LIMIT = 2
+        popular = get_user_model().objects.create_user(username='Popular')
+        posts = [Post.objects.create(text=f'Пост {i}', author=author)
+                 for i in range(3)]
+        Post.objects.create(text='Популярный', author=popular)
+        readers = [get_user_model().objects.create_user(username=f'Reader{i}')
+                   for i in range(3)]
+        Follow.objects.bulk_create(
+            [Follow(user=reader, author=followed)
+             for reader in readers + [user] for followed in (author, popular)])
+        UserStats.objects.filter(user=popular).update(
+            followers_count=settings.TIMELINE_FANOUT_LIMIT + 1)
+        TimelineEntry.objects.all().delete()
+
+        with CaptureQueriesContext(connection) as queries:
+            TimelineEntry.objects.rebuild()
+        expected = {(reader.pk, post.pk) for reader in readers + [user]
+                    for post in posts[1:]}
+        assert set(TimelineEntry.objects.values_list('user', 'post')) == expected, \
+            'Проверьте, что в ленту попадают последние посты авторов, кроме популярных'
+        assert len([query for query in queries.captured_queries
+                    if 'posts_post' in query['sql']]) == 1, \
+            'Проверьте, что ленты перестраиваются одним запросом, а не на каждую подписку'
+
+        TimelineEntry.objects.filter(user=user).delete()
+        TimelineEntry.objects.rebuild(users=[user.pk, readers[0].pk])
+        assert set(TimelineEntry.objects.values_list('user', 'post')) == expected
@@ -0,0 +1,116 @@
+import json
+
+import pytest
+
+from django.core.management import call_command
+
+
+def export(path, **options):
+    call_command('export_posts', str(path), **options)
+    with open(path) as source:
+        return [json.loads(line) for line in source]
+
+
+class TestExportImport:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_round_trip(self, tmp_path, post_with_group, user):
+        from posts.models import Comment, Follow, Group, Post, TimelineEntry
+
+        author = post_with_group.author
+        Comment.objects.create(post=post_with_group, author=user, text='Ок')
+        reader = type(user).objects.create_user(username='Reader')
+        Follow.objects.create(user=reader, author=author)
+
+        records = export(tmp_path / 'dump.ndjson', chunk_size=1)
+        assert [record['type'] for record in records] == \
+            ['group', 'post', 'comment', 'follow'], \
+            'Проверьте, что выгрузка идёт в порядке group, post, comment, follow'
+        assert records[1]['author'] == author.username
+        assert records[1]['group'] == post_with_group.group.slug
+
+        pub_date = post_with_group.pub_date
+        Group.objects.all().delete()
+        type(user).objects.all().delete()
+        assert not Post.objects.exists()
+
+        call_command('import_posts', str(tmp_path / 'dump.ndjson'),
+                     batch_size=2)
+        post = Post.objects.get()
+        assert (post.id, post.text, post.pub_date, post.author.username,
+                post.group.slug) == \
+            (post_with_group.id, post_with_group.text, pub_date,
+             author.username, 'test-link'), \
+            'Проверьте, что import_posts восстанавливает посты с датами'
+        assert Comment.objects.get().post_id == post.id
+        assert Follow.objects.filter(user__username='Reader',
+                                     author=post.author).exists()
+        assert TimelineEntry.objects.filter(user__username='Reader').exists(), \
+            'Проверьте, что после загрузки перестраиваются ленты'
+
+        call_command('import_posts', str(tmp_path / 'dump.ndjson'))
+        assert (Post.objects.count(), Comment.objects.count(),
+                Follow.objects.count()) == (1, 1, 1), \
+            'Проверьте, что повторная загрузка не дублирует строки'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_resume_from_checkpoint(self, tmp_path, user):
+        from posts.models import Post
+
+        for number in range(5):
+            Post.objects.create(text=f'Пост {number}', author=user)
+        first, *rest = Post.objects.order_by('id')
+
+        path = tmp_path / 'dump.ndjson'
+        checkpoint = tmp_path / 'export.json'
+        checkpoint.write_text(json.dumps({'type': 'post', 'after': first.id}))
+        path.write_text('')
+        records = export(path, checkpoint=str(checkpoint), chunk_size=2)
+        assert [record['id'] for record in records] == \
+            [post.id for post in rest], \
+            'Проверьте, что выгрузка продолжается после контрольной точки'
+        assert not checkpoint.exists()
+
+        Post.objects.all().delete()
+        checkpoint = tmp_path / 'import.json'
+        checkpoint.write_text(json.dumps({'line': 2}))
+        call_command('import_posts', str(path), checkpoint=str(checkpoint))
+        assert list(Post.objects.order_by('id').values_list('id', flat=True)) \
+            == [post.id for post in rest[2:]], \
+            'Проверьте, что загрузка пропускает строки до контрольной точки'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_taken_ids_refused(self, tmp_path, post, user):
+        from django.core.management.base import CommandError
+        from posts.models import Post
+
+        export(tmp_path / 'dump.ndjson')
+        post.text = 'Другой пост с тем же id'
+        post.save()
+        with pytest.raises(CommandError, match='уже есть в базе'):
+            call_command('import_posts', str(tmp_path / 'dump.ndjson'))
+        assert Post.objects.get().text == 'Другой пост с тем же id', \
+            'Проверьте, что загрузка не подменяет и не теряет чужие посты'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_rebuild_only_imported(self, tmp_path, user, post):
+        from posts.models import Follow, Post, TimelineEntry
+
+        author = type(user).objects.create_user(username='Imported')
+        Post.objects.create(text='Импортируемый', author=author)
+        Follow.objects.create(user=user, author=author)
+        export(tmp_path / 'dump.ndjson')
+        Post.objects.filter(author=author).delete()
+        author.delete()
+
+        # строка ленты без подписки: полная перестройка её удалила бы
+        bystander = type(user).objects.create_user(username='Bystander')
+        TimelineEntry.objects.create(user=bystander, post=post, author=post.author,
+                                     pub_date=post.pub_date)
+        call_command('import_posts', str(tmp_path / 'dump.ndjson'))
+
+        assert TimelineEntry.objects.filter(user=bystander).exists(), \
+            'Проверьте, что после загрузки перестраиваются только затронутые ленты'
+        assert TimelineEntry.objects.filter(
+            user=user, post__text='Импортируемый').exists(), \
+            'Проверьте, что ленты подписчиков загруженных авторов перестраиваются'
@@ -0,0 +1,118 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+
+
+def jpeg(size, orientation=None):
+    buffer = BytesIO()
+    image = Image.new('RGB', size, color=(10, 120, 200))
+    exif = Image.Exif()
+    exif[0x010f] = 'Камера'.encode()
+    if orientation:
+        exif[0x0112] = orientation
+    image.save(buffer, 'JPEG', exif=exif.tobytes())
+    return ContentFile(buffer.getvalue(), name='photo.jpeg')
+
+
+class TestUploads:
+
+    @pytest.fixture(autouse=True)
+    def media(self, settings, tmp_path):
+        settings.MEDIA_ROOT = str(tmp_path)
+        cache.clear()
+
+    def upload(self, client, image):
+        return client.post('/new/', data={'text': 'Фото', 'image': image})
+
+    @pytest.mark.django_db(transaction=True)
+    def test_orientation_and_metadata(self, user_client):
+        from posts.models import Post
+
+        self.upload(user_client, jpeg((200, 100), orientation=6))
+        post = Post.objects.get()
+        assert post.image.name.endswith('.jpg')
+        with Image.open(post.image.path) as image:
+            assert image.size == (100, 200), \
+                'Проверьте, что картинка поворачивается по EXIF'
+            assert not image.getexif(), \
+                'Проверьте, что метаданные EXIF удаляются при загрузке'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_original_downscaled(self, user_client, settings):
+        from posts.models import Post
+
+        settings.POST_IMAGE_MAX_SIDE = 500
+        self.upload(user_client, jpeg((2000, 1000)))
+        with Image.open(Post.objects.get().image.path) as image:
+            assert image.size == (500, 250), \
+                'Проверьте, что оригинал уменьшается до POST_IMAGE_MAX_SIDE'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_byte_limit(self, user_client, settings):
+        from posts.models import Post
+
+        settings.POST_IMAGE_MAX_BYTES = 1000
+        response = self.upload(user_client, jpeg((400, 400)))
+        assert not Post.objects.exists()
+        assert 'Файл больше' in str(response.context['form'].errors['image']), \
+            'Проверьте, что слишком большой файл отклоняется с понятной ошибкой'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_byte_limit_readable_header(self, user_client, settings):
+        from posts.models import Post
+
+        buffer = BytesIO()
+        Image.effect_noise((400, 400), 80).convert('RGB').save(buffer, 'JPEG')
+        content = buffer.getvalue()
+        # обрезка в конце данных: заголовок цел, verify() проходит
+        settings.POST_IMAGE_MAX_BYTES = len(content) - 2000
+        response = self.upload(user_client, ContentFile(content, name='noise.jpeg'))
+        assert response.status_code == 200 and not Post.objects.exists()
+        assert 'Файл больше' in str(response.context['form'].errors['image']), \
+            'Проверьте, что файл чуть больше предела отклоняется ошибкой формы'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_broken_image(self, user_client, monkeypatch):
+        from posts import forms
+        from posts.models import Post
+
+        def broken(upload):
+            raise OSError('image file is truncated')
+
+        monkeypatch.setattr(forms, 'normalize_upload', broken)
+        response = self.upload(user_client, jpeg((200, 100)))
+        assert response.status_code == 200 and not Post.objects.exists()
+        assert 'Не удалось обработать' in str(response.context['form'].errors['image']), \
+            'Проверьте, что ошибка обработки картинки становится ошибкой формы'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_pixel_limit(self, user_client, settings):
+        from posts.models import Post
+
+        settings.POST_IMAGE_MAX_PIXELS = 100000
+        response = self.upload(user_client, jpeg((400, 400)))
+        assert not Post.objects.exists()
+        assert '0.1 мегапикселей' in str(response.context['form'].errors['image']), \
+            'Проверьте, что картинка с большим числом пикселей отклоняется'
+
+    def test_upload_handler_stops(self, settings, rf):
+        from django.core.files.uploadhandler import StopUpload
+        from posts.uploads import LimitedUploadHandler, rejected_uploads
+
+        settings.POST_IMAGE_MAX_BYTES = 10
+        request = rf.post('/new/')
+        handler = LimitedUploadHandler(request)
+        handler.new_file('image', 'big.png', 'image/png', 0)
+        handler.receive_data_chunk(b'x' * 8, 0)
+        with pytest.raises(StopUpload) as stop:
+            handler.receive_data_chunk(b'x' * 8, 8)
+        assert stop.value.connection_reset, \
+            'Проверьте, что после предела остаток тела запроса не читается'
+        handler.file.seek(0)
+        assert len(handler.file.read()) == 8, \
+            'Проверьте, что на диск пишется не больше предела'
+        assert rejected_uploads(request) == {'image'}
+        handler.file.close()
@@ -0,0 +1,54 @@
+import pytest
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class TestUserStats:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_counters_maintained(self, user_client, user):
+        from posts.models import Post, UserStats
+
+        author = get_user_model().objects.create_user(username='StatsAuthor')
+        UserStats.objects.for_user(author)
+        post = Post.objects.create(text='Пост', author=author)
+        Post.objects.create(text='Ещё пост', author=author)
+        user_client.get(f'/{author.username}/follow/')
+
+        author.stats.refresh_from_db()
+        assert (author.stats.posts_count, author.stats.followers_count) == (2, 1), \
+            'Проверьте, что счётчики постов и подписчиков обновляются при записи'
+        assert UserStats.objects.for_user(user).following_count == 1
+
+        post.delete()
+        user_client.get(f'/{author.username}/unfollow/')
+        author.stats.refresh_from_db()
+        assert (author.stats.posts_count, author.stats.followers_count) == (1, 0), \
+            'Проверьте, что счётчики уменьшаются при удалении поста и отписке'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_profile_reads_counters(self, client, post):
+        from posts.models import UserStats
+        UserStats.objects.for_user(post.author)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(f'/{post.author.username}/')
+        assert 'Записей: 1' in response.content.decode()
+        assert not any(query['sql'].startswith('SELECT COUNT(*)')
+                       for query in queries.captured_queries), \
+            'Проверьте, что профиль не считает COUNT(*) при каждом открытии'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_reconcile_counters(self, post):
+        from posts.models import UserStats
+
+        UserStats.objects.filter(user=post.author).update(posts_count=42)
+        other = get_user_model().objects.create_user(username='NoStats')
+        call_command('reconcile_counters')
+        assert UserStats.objects.get(user=post.author).posts_count == 1, \
+            'Проверьте, что команда исправляет расхождения счётчиков'
+        assert UserStats.objects.filter(user=other).exists(), \
+            'Проверьте, что команда создаёт недостающие записи'
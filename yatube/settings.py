@@ -105,9 +105,16 @@ DATABASES = {
 }
 
 
+# общий для всех воркеров кеш в файле SQLite (posts/sqlite_cache.py):
+# сбросы поколений и журнал подписок видят все процессы
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'posts.sqlite_cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'MAX_SIZE': 256 * 2 ** 20,
+        },
     }
 }
 
@@ -171,3 +178,67 @@ STATIC_ROOT = os.path.join(BASE_DIR, "static")
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
+
+
+# Ленты подписок
+# авторы с большим числом подписчиков читаются при выдаче (fan-out-on-read)
+TIMELINE_FANOUT_LIMIT = 1000
+# сколько последних постов автора попадает в ленту при подписке
+TIMELINE_BACKFILL_LIMIT = 500
+TIMELINE_BATCH_SIZE = 1000
+
+# Граф подписок в памяти процесса (posts.follow_graph): сколько записей
+# журнала догонять по одной, прежде чем загрузить граф заново, сколько
+# секунд хранить записи журнала в кеше и сколько держать блокировку
+# загрузки, если загружавший процесс упал
+FOLLOW_GRAPH_MAX_LAG = 1000
+FOLLOW_GRAPH_LOG_TIMEOUT = 60 * 60
+FOLLOW_GRAPH_RELOAD_TIMEOUT = 60
+FOLLOW_GRAPH_CHUNK_SIZE = 10000
+# Рекомендации «кого почитать» (posts.suggestions): сколько хранить на
+# читателя, веса друзей друзей и общих подписок, сколько читателей того же
+# автора просматривать и сколько читателей записывать за одну транзакцию
+SUGGESTIONS_COUNT = 10
+SUGGESTIONS_FOF_WEIGHT = 1.0
+SUGGESTIONS_COFOLLOW_WEIGHT = 0.5
+SUGGESTIONS_COFOLLOW_SAMPLE = 5
+SUGGESTIONS_BATCH_SIZE = 500
+# авторов в одном запросе массовой подписки: по два параметра SQL на автора
+FOLLOW_BULK_LIMIT = 400
+
+# Кеш карточек постов; ключ содержит версию поста, поэтому срок большой
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+# Счётчики попаданий для card_cache_stats: по две записи в кеш на карточку,
+# поэтому включаются только на время замеров
+POST_CARD_CACHE_STATS = False
+
+# Кеш страниц лент; устаревает при смене поколения, а не по таймеру
+FEED_CACHE_TIMEOUT = 60 * 15
+
+# Размер пачки при перестроении поискового индекса
+SEARCH_BATCH_SIZE = 1000
+
+# Картинки постов: копии для srcset в WebP и JPEG
+POST_IMAGE_WIDTHS = (320, 480, 640, 960)
+# пропорции карточки, копии кадрируются по центру
+POST_IMAGE_ASPECT = (960, 339)
+POST_IMAGE_QUALITY = 80
+# ширина размытого превью, которое хранится в посте и встраивается в страницу
+POST_IMAGE_PLACEHOLDER_WIDTH = 24
+# ширина карточки в вёрстке: во всю ширину экрана на узких, иначе 960px
+POST_IMAGE_SIZES = "(max-width: 992px) 100vw, 960px"
+# кеш списка копий картинки; имя файла — хеш содержимого, копии не меняются
+POST_IMAGE_CACHE_TIMEOUT = 60 * 60 * 24
+# процессов для обработки картинок; 0 — в потоке запроса
+POST_IMAGE_WORKERS = 2
+# пределы загрузки: байты, пиксели исходника и сторона хранимого оригинала
+POST_IMAGE_MAX_BYTES = 20 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 50 * 1000 * 1000
+POST_IMAGE_MAX_SIDE = 4096
+# сколько секунд запрос ждёт обработки загруженной картинки в пуле
+POST_IMAGE_TIMEOUT = 30
+
+# загрузки всегда пишутся во временный файл и обрезаются по пределу
+FILE_UPLOAD_HANDLERS = ["posts.uploads.LimitedUploadHandler"]
+# через сколько секунд повторить неудавшуюся нарезку
+POST_THUMBNAIL_RETRY = 60 * 5
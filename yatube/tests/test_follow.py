@@ -108,7 +108,7 @@ class TestFollow:
         Post.objects.create(text='Тестовый пост 9789', author=user_2, image=image)
         Post.objects.create(text='Тестовый пост 4574', author=user_2, image=image)
 
-        response = self.check_url(user_client, f'/follow', '/follow/')
+        response = self.check_url(user_client, f'/follow/?page=1', '/follow/')
         assert 'paginator' in response.context, \
             'Проверьте, что передали переменную `paginator` в контекст страницы `/follow/`'
         assert type(response.context['paginator']) == Paginator, \
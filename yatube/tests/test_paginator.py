@@ -12,7 +12,7 @@ class TestGroupPaginatorView:
         except Exception as e:
             assert False, f'''Страница `/group/<slug>/` работает неправильно. Ошибка: `{e}`'''
         if response.status_code in (301, 302):
-            response = client.get(f'/group/{post_with_group.group.slug}/')
+            response = client.get(f'/group/{post_with_group.group.slug}/?page=1')
         assert response.status_code != 404, 'Страница `/group/<slug>/` не найдена, проверьте этот адрес в *urls.py*'
 
         assert 'paginator' in response.context, \
@@ -26,7 +26,7 @@ class TestGroupPaginatorView:
 
     @pytest.mark.django_db(transaction=True)
     def test_index_paginator_view_get(self, client, post_with_group):
-        response = client.get(f'/')
+        response = client.get(f'/?page=1')
         assert response.status_code != 404, 'Страница `/` не найдена, проверьте этот адрес в *urls.py*'
         assert 'paginator' in response.context, \
             'Проверьте, что передали переменную `paginator` в контекст страницы `/`'